@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+'''
+Runs create, update, retrieve-config, config and create-logging-bucket against synthetic
+fleets of buckets served by the in-process S3/STS stand-in in s3util/LocalAws.py, so no
+network or AWS account is needed. Latency and throttling are injected by the stand-in.
+
+For every fleet size and action it reports wall time, buckets per second, API calls per
+bucket and peak memory (traced Python allocations on python 3, peak RSS otherwise).
+--json saves the results; --baseline compares them with a saved run and exits 1 when calls
+per bucket or throughput moved by more than --call-tolerance or --tolerance.
+
+usage: python benchmarks/bench_fleet.py [--buckets 10,100,1000] [--latency 0.005]
+                                        [--throttle-rate 0.01] [--sustained-rate 200]
+                                        [--json results.json] [--baseline results.json]
+'''
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import yaml
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from s3util.LocalAws import LocalAws
+from s3util.Manager import S3Manager
+from s3util.Session import MemoryTransport
+from utilities.RateLimiter import AdaptiveRateLimiter
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+ACTIONS = ('create', 'update', 'retrieve-config', 'config', 'create-logging-bucket')
+REGIONS = ('us-east-1', 'us-west-2', 'eu-west-1')
+
+
+def _write_fleet(config_dir, buckets):
+    for i in range(buckets):
+        parameters = {'bucket-name': 'bench-{:05d}'.format(i), 'region': REGIONS[i % len(REGIONS)],
+                      'bucket-tags': {'TagSet': [{'Key': 'Owner', 'Value': 'bench'},
+                                                 {'Key': 'Stack', 'Value': 'bench-{}'.format(i % 10)}]}}
+        with open(os.path.join(config_dir, 'bench-{:05d}.yml'.format(i)), 'w') as config_file:
+            yaml.safe_dump(parameters, config_file, default_flow_style=False)
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def _measure(fake, buckets, func):
+    calls = fake.call_count()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    ok = func()
+    elapsed = time.time() - start
+    if tracemalloc is not None:
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+        tracemalloc.stop()
+    else:
+        peak_mb = _peak_rss_mb()
+    api_calls = fake.call_count() - calls
+    return {'ok': ok is not False, 'seconds': round(elapsed, 4), 'buckets_per_second': round(buckets / elapsed, 2),
+            'api_calls': api_calls, 'calls_per_bucket': round(api_calls / float(buckets), 3),
+            'peak_mb': round(peak_mb, 2)}
+
+
+def run_size(buckets, args, standardparameters, logger):
+    '''
+    Runs every action once against a fresh stand-in holding a fleet of the given size
+    :return dict: action -> measurements
+    '''
+    fake = LocalAws(latency=args.latency, throttle_rate=args.throttle_rate,
+                    sustained_rate=args.sustained_rate, seed=buckets)
+    pool = MemoryTransport(fake, max_pool_connections=max(10, args.workers * 7),
+                           rate_limiter=AdaptiveRateLimiter(args.max_rate) if args.max_rate else None)
+    work_dir = tempfile.mkdtemp(prefix='s3util-bench-')
+    try:
+        config_dir = os.path.join(work_dir, 'configs')
+        os.makedirs(config_dir)
+        _write_fleet(config_dir, buckets)
+        if 'create' not in args.actions:
+            # Later actions need the buckets to exist
+            for i in range(buckets):
+                fake.add_bucket('bench-{:05d}'.format(i), REGIONS[i % len(REGIONS)])
+        manager = S3Manager(standardparameters=standardparameters, output=os.path.join(work_dir, 'out'),
+                            workers=args.workers, logger=logger, pool=pool)
+        os.makedirs(manager.output)
+        config_files = sorted(os.path.join(config_dir, name) for name in os.listdir(config_dir))
+
+        def config():
+            for config_file in config_files:
+                with open(config_file, 'r') as yaml_file:
+                    manager.apply_standard_config(yaml.safe_load(yaml_file), manager.standardparameters)
+
+        steps = {
+            'create': lambda: manager.run_fleet('create', config_dir),
+            'update': lambda: manager.run_fleet('update', config_dir),
+            'retrieve-config': manager.retrieve_all,
+            'config': config,
+            'create-logging-bucket': lambda: manager.create_logging_buckets(list(REGIONS)),
+        }
+        results = {}
+        for action in args.actions:
+            results[action] = _measure(fake, buckets, steps[action])
+            _print_row(buckets, action, results[action])
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _print_row(buckets, action, result):
+    print("{:>7} {:<22} {:>9.3f}s {:>10.1f} {:>9} {:>10.2f} {:>9.1f}{}".format(
+        buckets, action, result['seconds'], result['buckets_per_second'], result['api_calls'],
+        result['calls_per_bucket'], result['peak_mb'], '' if result['ok'] else '  FAILED'))
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance, call_tolerance):
+    '''
+    :return list: regressions found against a saved run
+    '''
+    regressions = []
+    for size, actions in sorted(results.items()):
+        for action, result in sorted(actions.items()):
+            before = baseline.get(size, {}).get(action)
+            if before is None:
+                continue
+            # Fleet workers racing to create a missing logging bucket add a few HEADs
+            if result['calls_per_bucket'] > before['calls_per_bucket'] * (1 + call_tolerance):
+                regressions.append("{} buckets {}: calls per bucket {} -> {}".format(
+                    size, action, before['calls_per_bucket'], result['calls_per_bucket']))
+            if result['buckets_per_second'] < before['buckets_per_second'] * (1 - tolerance):
+                regressions.append("{} buckets {}: buckets per second {} -> {}".format(
+                    size, action, before['buckets_per_second'], result['buckets_per_second']))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Offline fleet benchmark")
+    parser.add_argument("--buckets", default="10,100,1000",
+                        help="Comma separated fleet sizes (default 10,100,1000; up to 10000)")
+    parser.add_argument("--actions", default=','.join(ACTIONS),
+                        help="Comma separated actions to run (default all, in order: {})".format(', '.join(ACTIONS)))
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the stand-in waits per request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="Probability of a request being answered with SlowDown")
+    parser.add_argument("--sustained-rate", type=float, default=0,
+                        help="Requests per second the stand-in answers before throttling (0 for no limit)")
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--max-rate", type=float, default=0,
+                        help="Client side rate limit in requests per second (0 for none)")
+    parser.add_argument("--standardconfig", default=os.path.join(os.path.dirname(__file__), '..', 'standard-config.yml'))
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Throughput drop against --baseline tolerated before failing (default 0.25)")
+    parser.add_argument("--call-tolerance", type=float, default=0.05,
+                        help="Growth in calls per bucket against --baseline tolerated before failing (default 0.05)")
+    args = parser.parse_args()
+    args.actions = [action for action in args.actions.split(',') if action]
+    for action in args.actions:
+        if action not in ACTIONS:
+            parser.error("unknown action: {}".format(action))
+
+    logger = logging.getLogger('bench')
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.ERROR)
+    with open(args.standardconfig, 'r') as standard_file:
+        standardparameters = yaml.safe_load(standard_file)
+
+    print("{:>7} {:<22} {:>10} {:>10} {:>9} {:>10} {:>9}".format(
+        'buckets', 'action', 'wall', 'bkt/s', 'calls', 'calls/bkt',
+        'peak MB' if tracemalloc is not None else 'rss MB'))
+    results = {}
+    for size in [int(size) for size in args.buckets.split(',')]:
+        results[str(size)] = run_size(size, args, standardparameters, logger)
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance,
+                                  args.call_tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+Renders the standard config for a synthetic fleet of buckets, comparing the compiled
+templates in stdconfig/Template.py against the json dump/replace/load round trip they
+replaced, and timing a full Evaluation.evaluate_config per bucket.
+
+usage: python benchmarks/bench_template.py [--buckets 10000] [--standardconfig standard-config.yml]
+'''
+import json
+import os
+import sys
+import time
+import yaml
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import stdconfig.Evaluation as Evaluation
+import stdconfig.Template as Template
+
+
+class StaticAccount(object):
+    '''Stands in for AccountContext without calling STS'''
+    account_id = '123456789012'
+
+    def logging_bucket_name(self, region):
+        return self.account_id + '-bucket-logs-' + region
+
+
+def _render_round_trip(section, values):
+    # What each evaluation step did before templates were compiled
+    value = json.dumps(section)
+    for placeholder, name in Template.PLACEHOLDERS.items():
+        if name in values:
+            value = value.replace(placeholder, values[name])
+    return json.loads(value)
+
+
+def _time(label, buckets, func):
+    start = time.time()
+    for i in range(buckets):
+        func('bench-bucket-{}'.format(i))
+    elapsed = time.time() - start
+    print("{:<32} {:>8.3f}s {:>10.1f} us/bucket".format(label, elapsed, elapsed / buckets * 1e6))
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(description="Standard config rendering benchmark")
+    parser.add_argument("--buckets", type=int, default=10000)
+    parser.add_argument("--standardconfig", default=os.path.join(os.path.dirname(__file__), '..', 'standard-config.yml'))
+    args = parser.parse_args()
+
+    with open(args.standardconfig, 'r') as standard_file:
+        standardparameters = yaml.safe_load(standard_file)
+    sections = [section for section in standardparameters if isinstance(standardparameters[section], (dict, list))]
+    account = StaticAccount()
+
+    def values(bucket_name):
+        return {'bucket_name': bucket_name, 'account_id': account.account_id,
+                'logging_bucket_name': account.logging_bucket_name('us-east-1')}
+
+    def round_trip(bucket_name):
+        for section in sections:
+            _render_round_trip(standardparameters[section], values(bucket_name))
+
+    start = time.time()
+    compiled = Template.compile_standard(standardparameters)
+    print("{:<32} {:>8.3f}s".format("compile", time.time() - start))
+
+    def render(bucket_name):
+        for section in sections:
+            compiled.render(section, **values(bucket_name))
+
+    def evaluate(bucket_name):
+        Evaluation.evaluate_config({'bucket-name': bucket_name, 'region': 'us-east-1'}, compiled, account)
+
+    print("Rendering {} sections for {} buckets".format(len(sections), args.buckets))
+    before = _time("json round trip", args.buckets, round_trip)
+    after = _time("compiled template", args.buckets, render)
+    print("{:<32} {:>8.1f}x".format("speedup", before / after))
+    _time("evaluate_config (compiled)", args.buckets, evaluate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+'''
+Runs create, update, fetch and evaluate through AsyncS3Manager on the in-memory transport
+and checks each bucket ends up with the standard configuration. Python 3 only.
+
+usage: python3 benchmarks/check_async.py [--buckets 20] [--standardconfig standard-config.yml]
+'''
+import asyncio
+import copy
+import logging
+import os
+import sys
+import yaml
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from s3util.AsyncManager import AsyncS3Manager
+from s3util.LocalAws import LocalAws
+from s3util.Session import MemoryTransport
+
+
+async def check(bucket_count, standardparameters):
+    fake = LocalAws()
+    manager = AsyncS3Manager(standardparameters=standardparameters, pool=MemoryTransport(fake), concurrency=5,
+                             logger=logging.getLogger('check'))
+    configs = [{'bucket-name': 'async-check-{:04d}'.format(i), 'region': 'us-west-2'} for i in range(bucket_count)]
+    given = copy.deepcopy(configs)
+    try:
+        created = await asyncio.gather(*(manager.create(config) for config in configs))
+        assert all(created), created
+        # create also makes the region's logging bucket when the standard config logs
+        missing = set(config['bucket-name'] for config in configs) - set(fake.buckets)
+        assert not missing, missing
+
+        updated = await asyncio.gather(*(manager.update(config) for config in configs))
+        assert all(updated), updated
+
+        fetched = await asyncio.gather(*(manager.fetch(config['bucket-name']) for config in configs))
+        evaluated = await asyncio.gather(*(manager.evaluate(config) for config in configs))
+        for config, live, evaluated_config in zip(configs, fetched, evaluated):
+            assert live['bucket-name'] == config['bucket-name'], live
+            assert live['region'] == 'us-west-2', live
+            # Every standard section create applied reads back from the bucket
+            for section in standardparameters:
+                assert section in evaluated_config, (section, evaluated_config)
+            for section in ('life-cycle-rules', 'bucket-security-policy', 'bucket-tags'):
+                if section in standardparameters:
+                    assert live.get(section), (section, live)
+        # The caller's configs are left as they were given
+        assert configs == given
+    finally:
+        subresource_threads = list(manager.manager._subresource_executor._threads)
+        manager.close()
+    # No sub-resource thread outlives the manager
+    assert subresource_threads and not any(thread.is_alive() for thread in subresource_threads)
+
+
+async def check_without_standard():
+    fake = LocalAws()
+    manager = AsyncS3Manager(pool=MemoryTransport(fake), logger=logging.getLogger('check'))
+    try:
+        config = {'bucket-name': 'async-check-plain', 'region': 'us-west-2'}
+        # With no standard configuration the config comes back as given, without calling AWS
+        assert await manager.evaluate(config) == config
+        assert fake.call_count() == 0
+    finally:
+        manager.close()
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--buckets', type=int, default=20)
+    parser.add_argument('--standardconfig', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                                 'standard-config.yml'))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    with open(args.standardconfig) as standard_file:
+        standardparameters = yaml.safe_load(standard_file)
+    asyncio.run(check(args.buckets, standardparameters))
+    asyncio.run(check_without_standard())
+    print("ok")
+
+
+if __name__ == '__main__':
+    main()
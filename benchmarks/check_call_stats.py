@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+'''
+Checks that CallStats records calls that fail without a response, such as an endpoint
+that cannot be connected to, and lets the original error reach the caller.
+
+usage: python benchmarks/check_call_stats.py
+'''
+import os
+import sys
+import botocore.exceptions
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import utilities.CallStats as CallStats
+from s3util.LocalAws import LocalAws
+from s3util.Session import MemoryTransport
+
+
+def main():
+    fake = LocalAws(unreachable=True)
+    stats = CallStats.CallStats()
+    pool = MemoryTransport(fake, stats=stats, max_attempts=1)
+    client = pool.client('s3', region='us-east-1')
+    try:
+        client.list_buckets()
+    except botocore.exceptions.EndpointConnectionError:
+        pass
+    else:
+        raise AssertionError("list_buckets succeeded against an unreachable endpoint")
+    operation = stats.operations[('s3', 'ListBuckets')]
+    assert operation.calls == 1, operation.to_dict()
+    assert operation.errors == {'EndpointConnectionError': 1}, operation.to_dict()
+    print(stats.to_table())
+    print("ok")
+
+
+if __name__ == '__main__':
+    main()
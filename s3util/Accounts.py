@@ -0,0 +1,121 @@
+import copy
+import logging
+import os
+import sys
+import tempfile
+import time
+import utilities.Fleet as Fleet
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# label names the account in output, logs and per account files; a run uses profile, or
+# role_arn assumed with profile's credentials
+AccountTarget = namedtuple('AccountTarget', ['label', 'profile', 'role_arn'])
+
+# Options naming files a run keeps state in; each account gets its own, so worker
+# processes never overwrite each other's
+PER_ACCOUNT_FILES = ('fingerprints', 'journal', 'tag_index', 'output_file', 'snapshot')
+
+# Accounts run at once unless --account-workers says otherwise
+MAX_ACCOUNT_WORKERS = 32
+
+
+def account_targets(profiles=None, roles=None, accounts=None, base_profile=None):
+    '''
+    :param profiles: profile names, one account each
+    :param roles: role ARNs to assume, or with accounts a role name to assume in each of them
+    :param accounts: account IDs
+    :param base_profile: profile whose credentials assume the roles
+    :return list: AccountTarget
+    '''
+    targets = [AccountTarget(profile, profile, None) for profile in profiles or []]
+    roles = roles or []
+    if accounts:
+        role_names = roles or ['OrganizationAccountAccessRole']
+        roles = ['arn:aws:iam::{}:role/{}'.format(account, role_name)
+                 for account in accounts for role_name in role_names]
+    for role_arn in roles:
+        # arn:aws:iam::123456789012:role/path/name -> 123456789012-name
+        label = '{}-{}'.format(role_arn.split(':')[4], role_arn.rsplit('/', 1)[-1])
+        targets.append(AccountTarget(label, base_profile, role_arn))
+    return targets
+
+
+def _per_account_path(path, label):
+    root, extension = os.path.splitext(path)
+    return '{}-{}{}'.format(root, label, extension)
+
+
+def _account_args(args, target):
+    args = copy.copy(args)
+    args.profile = target.profile
+    args.role_arn = target.role_arn
+    args.profiles = args.assume_role = args.accounts = None
+    for name in PER_ACCOUNT_FILES:
+        if getattr(args, name, None):
+            setattr(args, name, _per_account_path(getattr(args, name), target.label))
+    if args.output and args.output != '-':
+        args.output = os.path.join(args.output, target.label)
+    return args
+
+
+def _run_account(args, target):
+    '''
+    Runs the action for one account in a worker process. Log lines go straight to stderr
+    tagged with the account; stdout is captured and handed back whole so accounts never
+    interleave.
+    :return tuple: (label, ok, stdout text, CallStats.to_dict() or None)
+    '''
+    import s3util.Cli as Cli
+    logger = logging.getLogger()
+    if not logger.handlers:
+        # Started fresh rather than forked from the parent
+        Cli._setup_logging()
+    for handler in logger.handlers:
+        handler.setFormatter(logging.Formatter(fmt='%(levelname)s: [' + target.label + '] %(message)s'))
+
+    stats = None
+    if args.stats:
+        import utilities.CallStats as CallStats
+        stats = CallStats.CallStats()
+    captured = tempfile.TemporaryFile(mode='w+')
+    sys.stdout = captured
+    try:
+        ok = Cli.run(_account_args(args, target), stats)
+    except Exception as e:
+        logger.error("{}".format(e))
+        ok = False
+    finally:
+        sys.stdout = sys.__stdout__
+    captured.seek(0)
+    output = captured.read()
+    captured.close()
+    return target.label, ok is not False, output, stats.to_dict() if stats is not None else None
+
+
+def run_accounts(args, targets, workers, logger):
+    '''
+    Runs the action for every account, each in its own process with its own sessions.
+    Each account's output is written as one block headed by the account as it finishes.
+    :return tuple: (True if every account succeeded, account label -> CallStats dict or None)
+    '''
+    logger.info("Running {} in {} accounts with {} processes".format(args.action[0], len(targets), workers))
+    start = time.time()
+    results = []
+    stats = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = dict((executor.submit(_run_account, args, target), target) for target in targets)
+        for future in as_completed(futures):
+            target = futures[future]
+            error = future.exception()
+            if error is not None:
+                logger.error("{}: {}".format(target.label, error))
+                results.append(Fleet.FleetResult(target.label, False, str(error), 0.0))
+                continue
+            label, ok, output, account_stats = future.result()
+            if output:
+                sys.stdout.write('# account: {}\n{}'.format(label, output))
+                sys.stdout.flush()
+            stats[label] = account_stats
+            results.append(Fleet.FleetResult(label, ok, None if ok else 'failed, see log above', 0.0))
+    return Fleet.log_summary(results, time.time() - start, logger), stats
@@ -0,0 +1,115 @@
+'''
+asyncio front end to S3Manager, for services that run their own event loop. Python 3 only;
+nothing else in the package imports it.
+
+    manager = AsyncS3Manager(standardparameters=standard, concurrency=50)
+    results = await asyncio.gather(*(manager.update(config) for config in configs))
+
+The transport is the ClientPool the manager's clients come from: boto3 by default, or
+s3util.Session.MemoryTransport to run in memory in tests.
+'''
+import asyncio
+import copy
+import functools
+import stdconfig.Evaluation as Evaluation
+from concurrent.futures import ThreadPoolExecutor
+from s3util.Manager import S3Manager, merge_tags
+
+# Bucket operations in flight at once unless concurrency says otherwise
+DEFAULT_CONCURRENCY = 50
+
+
+class _NoOutput(object):
+    # Evaluated configs stay in memory rather than being written to the working directory
+    destination = None
+
+    def write(self, parameters):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncS3Manager(object):
+    '''
+    Coroutines creating, updating, fetching and evaluating buckets. Any number of them may
+    be awaited at once; a semaphore lets concurrency operations run at a time and the rest
+    wait on the event loop. boto3 blocks, so each operation runs the manager's code on a
+    thread pool of the same size and the loop is never blocked. Rate limiting, retries,
+    stats, fingerprints and the journal behave as in the command line tool.
+
+    :param manager: S3Manager to run the operations with; by default one is created from the
+                    keyword arguments, with pool as the transport, that keeps evaluated configs
+                    in memory
+    :param concurrency: bucket operations in flight at once
+    '''
+
+    def __init__(self, manager=None, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+        if manager is None:
+            kwargs.setdefault('config_output', _NoOutput())
+            manager = S3Manager(workers=concurrency, **kwargs)
+        self.manager = manager
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+
+    async def _call(self, func, *args, **kwargs):
+        if self._semaphore is None:
+            # Created on first use, inside the loop that awaits it
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _prepare(self, parameters):
+        # The caller's config is left as it was given
+        parameters = copy.deepcopy(parameters)
+        merge_tags(parameters, self.manager.tags)
+        return parameters
+
+    async def create(self, parameters):
+        '''
+        Creates a bucket from a loaded config and applies its configuration
+        :return boolean: False if the bucket exists or could not be configured
+        '''
+        result = await self._call(self.manager.create, self._prepare(parameters))
+        return result is not False
+
+    async def update(self, parameters, diff=True):
+        '''
+        Applies a loaded config to an existing bucket, only the sections that differ from
+        the live bucket unless diff is False
+        :return boolean: False if the bucket could not be updated
+        '''
+        result = await self._call(self.manager.update, self._prepare(parameters), diff)
+        return result is not False
+
+    async def fetch(self, bucket_name, region=None):
+        '''
+        :return dict: the live configuration of the bucket, as retrieve-config writes it
+        '''
+        return await self._call(self._fetch, bucket_name, region)
+
+    def _fetch(self, bucket_name, region):
+        if region is None:
+            region = self.manager.get_bucket_region(bucket_name)
+        return self.manager.fetch(bucket_name, region, self.manager.regional_client(region))
+
+    async def evaluate(self, parameters, standardparameters=None):
+        '''
+        Evaluates a loaded config against the standard configuration in memory, nothing is
+        written to AWS or disk
+        :param standardparameters: by default the manager's standard configuration
+        :return dict: the evaluated config, or the config as given when there is no standard
+                      configuration
+        '''
+        parameters = self._prepare(parameters)
+        standardparameters = standardparameters or self.manager.standardparameters
+        if standardparameters is None:
+            return parameters
+        # Resolving the account ID may call STS once
+        return await self._call(Evaluation.evaluate_config, parameters, standardparameters, self.manager.account)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.manager.close()
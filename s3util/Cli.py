@@ -0,0 +1,609 @@
+import logging
+import os
+import sys
+import utilities.ConfigCache as ConfigCache
+import utilities.FileUtils as FileUtils
+import utilities.Fingerprints as Fingerprints
+import utilities.Fleet as Fleet
+import utilities.Journal as Journal
+import utilities.Snapshot as Snapshot
+import utilities.TagUtils as TagUtils
+from argparse import ArgumentParser
+from argparse import RawTextHelpFormatter
+
+logger = logging.getLogger()
+
+# S3 requests per second a run starts at and never exceeds
+DEFAULT_MAX_RATE = 100
+
+# Kept in step with utilities.CallStats.STATS_FORMATS, which is only imported when --stats is given
+STATS_FORMATS = ('table', 'json', 'prometheus')
+
+
+def bucket_tags(tag_string):
+    """Parses the string passed into the tag argument
+    and returns it as a tag."""
+    if ':' not in tag_string:
+        raise Exception("Malformed tag: {}. Proper form is key:value".format(tag_string))
+    key, value = tag_string.split(":", 1)
+    return {'Key': key, 'Value': value}
+
+
+def build_parser():
+    '''
+    Builds the s3-util argument parser
+    :return ArgumentParser:
+    '''
+    parser = ArgumentParser(description="S3 Util Args", formatter_class=RawTextHelpFormatter)
+    parser.add_argument("action", nargs=1, choices=['create', 'create-logging-bucket','update', 'plan', 'delete', 'config','retrieve-config','tags','estimate-lifecycle','analytics-report','log-report','audit','watch','refresh','query','validate','test'],
+                        help="Action on S3 Bucket - \n"
+                             " create                 -  Create a new bucket supplied config file [--config] REQUIRED\n"
+                             " create-logging-bucket  -  Creates the Logging bucket of each [--region] or of [--all-regions]\n"
+                             " update                 -  Updates a bucket based on supplied config file [--config] REQUIRED\n"
+                             " plan                   -  Shows what update would change on the live bucket [--config] REQUIRED\n"
+                             "                           create, update and plan accept a directory or glob of config files\n"
+                             " delete                 -  NOT ENABLED\n"
+                             " retrieve-config        -  Retrieves the s3 configuration of a specified S3 Bucket [--bucketname] REQUIRED\n"
+                             "                           or of every bucket in the account [--all]\n"
+                             " config                 -  Only Evaluates against a standard configuration file [--standardconfig] REQUIRED\n"
+                             " tags                   -  Indexes the tags of every bucket in bulk and lists the buckets matching\n"
+                             "                           [--has-tag] and [--missing-tag]\n"
+                             " estimate-lifecycle     -  Estimates the objects and bytes each lifecycle rule transitions or expires\n"
+                             "                           Rules come from [--config] or the live bucket [--bucketname]; objects from\n"
+                             "                           [--inventory] files or by listing the bucket\n"
+                             " analytics-report       -  Recommends Transition Days from the Storage Class Analysis exports in\n"
+                             "                           [--analytics-dir] or the logging buckets of [--region]\n"
+                             " log-report             -  Request rates, errors, bytes sent, busiest prefixes and hot keys from the\n"
+                             "                           server access logs in [--log-dir] REQUIRED, first downloading new logs\n"
+                             "                           from the logging buckets of [--region] if given\n"
+                             " audit                  -  Checks the live configuration of [--bucketname] or of every bucket against\n"
+                             "                           [--standardconfig] REQUIRED without changing anything; writes one line\n"
+                             "                           of json per bucket with its violations\n"
+                             " watch                  -  Updates every bucket of [--config] REQUIRED, then keeps running and updates\n"
+                             "                           the buckets whose config files change, reusing its sessions and clients.\n"
+                             "                           A change to [--standardconfig] updates every bucket\n"
+                             " refresh                -  Fetches the configuration of every bucket into the [--snapshot] database,\n"
+                             "                           only the sections older than [--max-age]\n"
+                             " query                  -  Lists the buckets in the [--snapshot] matching [--has-tag], [--missing-tag],\n"
+                             "                           [--has-sid], [--missing-sid], [--missing-section] and [--region], or runs\n"
+                             "                           [--sql] against it, without calling AWS\n"
+                             " validate               -  Checks config files against the schema without calling AWS [--config] REQUIRED\n"
+                             " test                   -  FOR DEBUG PURPOSES ONLY\n")
+    parser.add_argument("-c", "--config", required=False,
+                        help="Specify config file to use for Action\n"
+                             "A directory or quoted glob (e.g. 'configs/*.yml') applies CREATE, UPDATE and PLAN to every bucket")
+    parser.add_argument("-p", "--profile", required=False,
+                        help="AWS Profile as Stored in ~/.aws/credentials; by default boto3's credential chain\n"
+                             "(environment variables, AWS_PROFILE, instance or task role) is used")
+    parser.add_argument("--profiles", required=False,
+                        help="Comma separated profiles; runs the action in every profile's account at once, each in its\n"
+                             "own process. Output is written per account and --output gets a directory per account")
+    parser.add_argument("--assume-role", required=False,
+                        help="Comma separated role ARNs to assume with --profile and run the action in, like --profiles;\n"
+                             "with --accounts, the name of the role to assume in each account\n"
+                             "(default OrganizationAccountAccessRole)")
+    parser.add_argument("--accounts", required=False,
+                        help="Comma separated account IDs to run the action in through --assume-role")
+    parser.add_argument("--account-workers", required=False, type=int,
+                        help="Accounts run at once with --profiles, --assume-role or --accounts\n"
+                             "(default every account, at most 32)")
+    parser.add_argument("-r", "--region", required=False,
+                        help="For use when Creating Logging Buckets; comma separated for several regions\n"
+                             "With TAGS, comma separated regions to index (default every region)\n"
+                             "With ANALYTICS-REPORT and LOG-REPORT, comma separated regions whose logging buckets hold\n"
+                             "the exports or logs\n"
+                             "With QUERY, comma separated regions the buckets are in")
+    parser.add_argument("--all-regions", required=False, action='store_true',
+                        help="With CREATE-LOGGING-BUCKET, every region enabled for the account")
+    parser.add_argument("-V", "--validate", required=False,
+                        help="Validates specified config file, directory or glob against schema before the action runs")
+    parser.add_argument("-b", "--bucketname", required=False,
+                        help="Specify Bucketname; to be used with CONFIG\n"
+                             "With AUDIT, comma separated buckets to audit (default every bucket)")
+    parser.add_argument("-s", "--standardconfig", required=False,
+                        help="Standard Configuration to apply to bucket; to be used with CREATE and UPDATE")
+    parser.add_argument("-l", "--standardlogconfig", required=False,
+                        help="Standard Configuration to apply to logging bucket; to be used with CREATE-LOGGING-BUCKET")
+    parser.add_argument("-t", "--tag", required=False, type=bucket_tags, action='append', default=[],
+                        help="Tags to apply to the bucket; to be used with CREATE and UPDATE\n"
+                            "Required Tags (for compliance): Owner, Stack, Stage, App, orbProjectId\n"
+                            "Exception Tags: exception-https, exception-encryption\n"
+                            "Example: -t stack:test -t stage:test -t owner:test -t app:test -t orbProjectId:1")
+    parser.add_argument("-o", "--output", required=False,
+                        help="Directory to write evaluated and retrieved configs to (default: current directory)\n"
+                             "or - to write them to stdout as yaml documents")
+    parser.add_argument("--output-file", required=False,
+                        help="File to write every evaluated and retrieved config to, each added as soon as it is\n"
+                             "complete, instead of one file per bucket; kept and added to with --resume")
+    parser.add_argument("--output-format", required=False, choices=FileUtils.OUTPUT_FORMATS, default='yaml',
+                        help="Format of evaluated and retrieved configs: yaml documents (default) or json, one\n"
+                             "config per line when written to stdout or --output-file")
+    parser.add_argument("-a", "--all", required=False, action='store_true',
+                        help="Retrieve the configuration of every bucket in the account; to be used with RETRIEVE-CONFIG")
+    parser.add_argument("--identity-cache-ttl", required=False, type=int, default=0,
+                        help="Seconds to reuse the profile's account ID from ~/.s3-util/identity-cache.json\n"
+                             "instead of calling STS (default 0, always call STS once per run)")
+    parser.add_argument("-w", "--workers", required=False, type=int, default=10,
+                        help="Number of buckets processed concurrently when --config is a directory or glob (default 10)")
+    parser.add_argument("--max-pool-connections", required=False, type=int,
+                        help="HTTP connections each S3 client keeps open (default workers * 7, at least 10)")
+    parser.add_argument("--max-rate", required=False, type=float, default=DEFAULT_MAX_RATE,
+                        help="S3 requests per second shared by all workers (default {}, 0 for no limit)\n"
+                             "The rate is halved whenever S3 throttles and recovers as calls succeed".format(DEFAULT_MAX_RATE))
+    parser.add_argument("--has-tag", required=False, action='append', default=[],
+                        help="KEY or KEY=VALUE; with TAGS and QUERY, list buckets carrying the tag (may be repeated)")
+    parser.add_argument("--missing-tag", required=False, action='append', default=[],
+                        help="KEY; with TAGS and QUERY, list buckets without the tag (may be repeated)")
+    parser.add_argument("--tag-index", required=False, default=TagUtils.DEFAULT_INDEX_FILE,
+                        help="File TAGS saves its index to (default ~/.s3-util/tag-index.json)")
+    parser.add_argument("--cached", required=False, action='store_true',
+                        help="With TAGS, query the saved index instead of calling AWS")
+    parser.add_argument("--inventory", required=False, action='append', default=[],
+                        help="With ESTIMATE-LIFECYCLE, S3 Inventory manifest.json, CSV (.csv, .csv.gz) or Parquet file\n"
+                             "to read objects from instead of listing the bucket (may be repeated)")
+    parser.add_argument("--inventory-schema", required=False,
+                        help="Columns of inventory CSV files given without a manifest\n"
+                             "(default 'Bucket, Key, Size, LastModifiedDate, StorageClass')")
+    parser.add_argument("--analytics-dir", required=False,
+                        help="With ANALYTICS-REPORT, local copy of the logging bucket's _analytics/ exports")
+    parser.add_argument("--max-retrieval-ratio", required=False, type=float, default=0.5,
+                        help="With ANALYTICS-REPORT, GB retrieved per GB stored each month below which an object\n"
+                             "age counts as infrequently accessed (default 0.5)")
+    parser.add_argument("--log-dir", required=False,
+                        help="With LOG-REPORT, directory of server access logs laid out like the logging bucket\n"
+                             "(one folder per bucket); logs downloaded with --region are written here")
+    parser.add_argument("--log-state", required=False,
+                        help="With LOG-REPORT, file keeping the totals and the last log read per bucket; logs read\n"
+                             "by an earlier run are skipped and the report covers every run so far")
+    parser.add_argument("--prefix-depth", required=False, type=int, default=1,
+                        help="With LOG-REPORT, number of key path components grouped as a prefix (default 1)")
+    parser.add_argument("--top", required=False, type=int, default=10,
+                        help="With LOG-REPORT, prefixes and hot keys listed per bucket (default 10)")
+    parser.add_argument("--fingerprints", required=False, default=Fingerprints.DEFAULT_FINGERPRINT_FILE,
+                        help="File keeping a hash of the config last applied to each bucket; UPDATE skips buckets\n"
+                             "whose evaluated config is unchanged without calling AWS (default ~/.s3-util/fingerprints.json)")
+    parser.add_argument("--force", required=False, action='store_true',
+                        help="With UPDATE, apply every bucket even if its config is unchanged since the last run")
+    parser.add_argument("--resume", required=False, action='store_true',
+                        help="Continue an interrupted CREATE, UPDATE or RETRIEVE-CONFIG --all run from its journal,\n"
+                             "skipping buckets and steps it finished")
+    parser.add_argument("--journal", required=False,
+                        help="File CREATE, UPDATE and RETRIEVE-CONFIG record each finished step in; it is started\n"
+                             "afresh unless --resume is given (default one per action, config and account\n"
+                             "under ~/.s3-util/journals/)")
+    parser.add_argument("--config-cache", required=False, default=ConfigCache.DEFAULT_CONFIG_CACHE_FILE,
+                        help="File keeping parsed and validated config files, so config files unchanged since an\n"
+                             "earlier run are not parsed again (default ~/.s3-util/config-cache.json)")
+    parser.add_argument("--no-config-cache", required=False, action='store_true',
+                        help="Parse every config file instead of using --config-cache")
+    parser.add_argument("--snapshot", required=False, default=Snapshot.DEFAULT_SNAPSHOT_FILE,
+                        help="SQLite database REFRESH keeps bucket configurations in and QUERY reads\n"
+                             "(default ~/.s3-util/snapshot.db)")
+    parser.add_argument("--max-age", required=False, type=float, default=0,
+                        help="With REFRESH, seconds a fetched section stays fresh and is not fetched again\n"
+                             "(default 0, fetch everything)")
+    parser.add_argument("--has-sid", required=False, action='append', default=[],
+                        help="With QUERY, list buckets whose policy has a statement with the Sid (may be repeated)")
+    parser.add_argument("--missing-sid", required=False, action='append', default=[],
+                        help="With QUERY, list buckets whose policy has no statement with the Sid (may be repeated)")
+    parser.add_argument("--missing-section", required=False, action='append', default=[], choices=Snapshot.SECTIONS,
+                        help="With QUERY, list buckets without the section, e.g. life-cycle-rules (may be repeated)")
+    parser.add_argument("--sql", required=False,
+                        help="With QUERY, read-only SQL to run against the snapshot; rows are written as json lines\n"
+                             "Tables: buckets(name, region), sections(bucket, section, document, fetched),\n"
+                             "tags(bucket, key, value), policy_sids(bucket, sid)")
+    parser.add_argument("--interval", required=False, type=float, default=2.0,
+                        help="With WATCH, seconds between scans of the config files where inotify is not available\n"
+                             "(default 2)")
+    parser.add_argument("--debounce", required=False, type=float, default=1.0,
+                        help="With WATCH, seconds the config files must stay unchanged before they are applied (default 1)")
+    parser.add_argument("--stats", required=False, nargs='?', const='table', choices=STATS_FORMATS,
+                        help="Report the AWS calls made per operation at exit: count, retries, error codes, latency\n"
+                             "as a table (default), json or prometheus text")
+    parser.add_argument("--stats-file", required=False,
+                        help="File to write the --stats report to (default stderr)")
+    # Set per account when --profiles, --assume-role or --accounts fan out
+    parser.set_defaults(role_arn=None)
+    return parser
+
+
+def _setup_logging():
+    myhandler = logging.StreamHandler()  # writes to stderr
+    myformatter = logging.Formatter(fmt='%(levelname)s: %(message)s')
+    myhandler.setFormatter(myformatter)
+
+    # Set up Logging
+    logger.setLevel(logging.INFO)
+    logging.getLogger('boto3').setLevel(logging.WARN)
+    logger.addHandler(myhandler)
+
+
+def main(argv=None):
+    _setup_logging()
+    args = build_parser().parse_args(argv)
+    if args.profiles or args.assume_role or args.accounts:
+        ok = run_accounts(args)
+        if not ok:
+            sys.exit(1)
+        return
+    stats = None
+    if args.stats:
+        import utilities.CallStats as CallStats
+        stats = CallStats.CallStats()
+    try:
+        ok = run(args, stats)
+    finally:
+        if stats is not None:
+            _write_stats(stats.render(args.stats), args.stats_file)
+    if not ok:
+        sys.exit(1)
+
+
+def run_accounts(args):
+    '''
+    Runs the action in every account given with --profiles, --assume-role or --accounts,
+    concurrently, and reports the stats of each account and their total
+    :return boolean: False if the action failed in any account
+    '''
+    import s3util.Accounts as Accounts
+    split = lambda value: [item for item in value.split(',') if item] if value else []
+    targets = Accounts.account_targets(split(args.profiles), split(args.assume_role), split(args.accounts),
+                                       args.profile)
+    workers = args.account_workers or min(len(targets), Accounts.MAX_ACCOUNT_WORKERS)
+    ok, stats = Accounts.run_accounts(args, targets, workers, logger)
+    if args.stats:
+        import utilities.CallStats as CallStats
+        _write_stats(CallStats.render_accounts(dict((label, CallStats.CallStats.from_dict(account_stats))
+                                                    for label, account_stats in stats.items()), args.stats),
+                     args.stats_file)
+    return ok
+
+
+def _write_stats(report, stats_file):
+    report = report + '\n'
+    if stats_file:
+        with open(stats_file, 'w') as report_file:
+            report_file.write(report)
+    else:
+        sys.stderr.write(report)
+
+
+def run(args, stats=None):
+    '''
+    Runs the action selected on the command line. Nothing AWS related is imported until an
+    action needs it, so --help and validate start without loading boto3.
+    :return boolean: False if the action failed
+    '''
+    config_cache = None
+    if (args.config or args.validate) and not args.no_config_cache:
+        import utilities.Validation as Validation
+        config_cache = ConfigCache.ConfigCache(args.config_cache, Validation.SCHEMA_VERSION)
+    try:
+        return _run(args, stats, config_cache)
+    finally:
+        if config_cache is not None:
+            config_cache.save()
+
+
+def _run(args, stats, config_cache):
+    '''
+    Runs the action, loading config files through config_cache when given
+    :return boolean:
+    '''
+    if args.output and args.output != '-' and not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    if args.validate or 'validate' in args.action:
+        import utilities.Validation as Validation
+        if not Validation.validate_config_paths(args.validate or args.config, args.workers, logger, config_cache):
+            return False
+        if 'validate' in args.action:
+            return True
+
+    if 'tags' in args.action and args.cached:
+        if not os.path.isfile(args.tag_index):
+            logger.error("No tag index at {}; run TAGS without --cached first".format(args.tag_index))
+            return False
+        _print_buckets(TagUtils.TagIndex.load(args.tag_index).query(args.has_tag, args.missing_tag))
+        return True
+
+    if 'analytics-report' in args.action and args.analytics_dir:
+        import utilities.AnalyticsReport as AnalyticsReport
+        aggregate = AnalyticsReport.read_directory(args.analytics_dir, args.workers)
+        sys.stdout.write(AnalyticsReport.format_report(aggregate, args.max_retrieval_ratio) + '\n')
+        return True
+
+    if 'query' in args.action:
+        return _query(args)
+
+    if 'log-report' in args.action and not args.region:
+        return _log_report(args, None)
+
+    if 'estimate-lifecycle' in args.action and args.config and args.inventory:
+        # Rules and objects are both local
+        return _estimate_lifecycle(args, None)
+
+    from s3util.Manager import S3Manager
+
+    standardparameters = FileUtils.load_yaml(args.standardconfig, logger) if args.standardconfig else None
+    standardlogparameters = FileUtils.load_yaml(args.standardlogconfig, logger) if args.standardlogconfig else None
+    fingerprints = None
+    if args.action[0] in ('create', 'update', 'watch'):
+        fingerprints = Fingerprints.FingerprintStore(args.fingerprints)
+    journal = None
+    if args.action[0] in ('create', 'update', 'retrieve-config'):
+        journal_file = args.journal or Journal.default_journal_file(
+            (args.action[0], os.path.abspath(args.config) if args.config else None, args.bucketname, args.all,
+             args.profile, args.role_arn))
+        if args.resume and not os.path.isfile(journal_file):
+            logger.warn("No journal at {}; nothing to resume, running in full".format(journal_file))
+        journal = Journal.Journal(journal_file, resume=args.resume)
+    config_output = FileUtils.ConfigOutput(args.output, args.output_file, args.output_format, append=args.resume)
+    manager = S3Manager(profile=args.profile, standardparameters=standardparameters,
+                        standardlogparameters=standardlogparameters, tags=args.tag, output=args.output,
+                        workers=args.workers, identity_cache_ttl=args.identity_cache_ttl, logger=logger,
+                        max_pool_connections=args.max_pool_connections, max_rate=args.max_rate,
+                        stats=stats, fingerprints=fingerprints, force=args.force, journal=journal,
+                        role_arn=args.role_arn, read_only=args.action[0] == 'audit', config_cache=config_cache,
+                        config_output=config_output)
+    try:
+        return _run_action(args, manager)
+    finally:
+        manager.close()
+        config_output.close()
+        if fingerprints is not None:
+            # Buckets applied before a failure keep their fingerprints
+            fingerprints.save()
+        if journal is not None:
+            journal.close()
+
+
+def _run_action(args, manager):
+    '''
+    Runs an action that needs AWS
+    :return boolean: False if the action failed
+    '''
+    from s3util.Manager import merge_tags
+    import utilities.Validation as Validation
+
+    if 'test' in args.action:
+        parameters = Validation.open_and_validate_config(args.config, logger)
+        print(TagUtils.is_tag_in_tagset('Stacks', parameters['bucket-tags']['TagSet']))
+
+    elif 'create-logging-bucket' in args.action:
+        if args.all_regions:
+            return manager.create_logging_buckets(manager.enabled_regions())
+        if args.region == None:
+            logger.error("No Region Specified [--region] or [--all-regions]")
+            return True
+        regions = args.region.split(',')
+        if len(regions) > 1:
+            return manager.create_logging_buckets(regions)
+        manager.create_logging_bucket(regions[0])
+
+    elif 'retrieve-config' in args.action:
+        if args.all:
+            return manager.retrieve_all()
+        elif args.bucketname == None:
+            logger.error("No Bucket Specified [--bucketname] or [--all]")
+        else:
+            manager.retrieve(args.bucketname)
+
+    elif 'audit' in args.action:
+        if manager.standardparameters is None:
+            logger.error("No Standard Configuration Provided [--standardconfig]")
+            return False
+        return manager.audit(args.bucketname.split(',') if args.bucketname else None)
+
+    elif 'tags' in args.action:
+        regions = args.region.split(',') if args.region else None
+        index = manager.tag_index(regions)
+        index.save(args.tag_index)
+        _print_buckets(index.query(args.has_tag, args.missing_tag))
+
+    elif 'estimate-lifecycle' in args.action:
+        return _estimate_lifecycle(args, manager)
+
+    elif 'analytics-report' in args.action:
+        import utilities.AnalyticsReport as AnalyticsReport
+        if args.region == None:
+            logger.error("No Region Specified [--region] or [--analytics-dir]")
+            return False
+        aggregate = manager.analytics_aggregate(args.region.split(','), args.bucketname)
+        sys.stdout.write(AnalyticsReport.format_report(aggregate, args.max_retrieval_ratio) + '\n')
+
+    elif 'log-report' in args.action:
+        return _log_report(args, manager)
+
+    elif 'watch' in args.action:
+        return _watch(args, manager)
+
+    elif 'refresh' in args.action:
+        snapshot = Snapshot.Snapshot(args.snapshot)
+        try:
+            return manager.refresh_snapshot(snapshot, args.max_age)
+        finally:
+            snapshot.close()
+
+    elif args.config and Fleet.is_fleet(args.config) and args.action[0] in ('create', 'update', 'plan'):
+        return manager.run_fleet(args.action[0], args.config)
+
+    else:
+        parameters = {}
+        if args.config:
+            parameters = Validation.open_and_validate_config(args.config, logger)
+        if args.bucketname:
+            parameters['bucket-name'] = args.bucketname
+        if args.region:
+            parameters['region'] = args.region
+        merge_tags(parameters, args.tag)
+
+        if 'create' in args.action:
+            manager.create(parameters)
+        elif 'update' in args.action:
+            manager.update(parameters)
+        elif 'plan' in args.action:
+            manager.plan(parameters)
+        elif 'config' in args.action:
+            if args.standardconfig == None:
+                logger.error("No Standard Configuration Provided [--standardconfig]")
+                return True
+            manager.apply_standard_config(parameters, manager.standardparameters)
+    return True
+
+
+def _estimate_lifecycle(args, manager):
+    '''
+    Estimates a config's lifecycle rules, or the bucket's current ones, against the
+    objects in inventory files or the live bucket listing
+    :return boolean:
+    '''
+    import json
+    import stdconfig.Evaluation as Evaluation
+    import utilities.LifecycleEstimate as LifecycleEstimate
+    import utilities.Validation as Validation
+
+    bucket_name = args.bucketname
+    if args.config:
+        parameters = Validation.open_and_validate_config(args.config, logger)
+        if parameters is None:
+            return False
+        bucket_name = bucket_name or parameters['bucket-name']
+        if args.standardconfig:
+            # Estimate the rules update would apply
+            Evaluation.evaluate_lifecycle_policy(parameters, FileUtils.load_yaml(args.standardconfig, logger), None)
+        lifecycle = parameters.get('life-cycle-rules')
+        if not isinstance(lifecycle, (dict, type(None))):
+            lifecycle = json.loads(lifecycle)
+    elif bucket_name is None:
+        logger.error("No Bucket Specified [--bucketname] or [--config]")
+        return False
+    else:
+        lifecycle = manager.lifecycle(bucket_name)
+
+    if not lifecycle:
+        logger.error("No lifecycle rules to estimate for {}".format(bucket_name))
+        return False
+
+    if args.inventory:
+        chunks = (chunk for path in args.inventory
+                  for chunk in LifecycleEstimate.inventory_chunks(
+                      path, args.inventory_schema or LifecycleEstimate.DEFAULT_INVENTORY_SCHEMA))
+    else:
+        logger.info("Listing objects of {}".format(bucket_name))
+        chunks = manager.object_chunks(bucket_name)
+    try:
+        estimate = LifecycleEstimate.LifecycleEstimate(lifecycle).consume(chunks)
+    except ValueError as e:
+        # An inventory that cannot be read, e.g. Parquet without pyarrow
+        logger.error("{}".format(e))
+        return False
+    sys.stdout.write(estimate.format_report() + '\n')
+    return True
+
+
+def _log_report(args, manager):
+    '''
+    Reports on the access logs under --log-dir, downloading new ones first when a manager
+    is given. With --log-state only logs newer than the last run are read.
+    :return boolean:
+    '''
+    import utilities.AccessLogReport as AccessLogReport
+
+    if args.log_dir is None:
+        logger.error("No Log Directory Specified [--log-dir]")
+        return False
+    state = AccessLogReport.load_state(args.log_state) if args.log_state else None
+    processed = state['processed'] if state else None
+    if manager is not None:
+        manager.download_access_logs(args.region.split(','), args.log_dir, processed, args.bucketname)
+    aggregate, processed = AccessLogReport.read_directory(args.log_dir, args.workers, args.prefix_depth, processed)
+    if state:
+        aggregate = AccessLogReport.merge(state['aggregate'], aggregate)
+        AccessLogReport.save_state(args.log_state, {'processed': processed, 'aggregate': aggregate})
+    if args.bucketname:
+        aggregate = dict((name, totals) for name, totals in aggregate.items() if name == args.bucketname)
+    sys.stdout.write(AccessLogReport.format_report(aggregate, args.top) + '\n')
+    return True
+
+
+def _watch(args, manager):
+    '''
+    Brings every bucket of --config up to date, then applies each batch of changed config
+    files until interrupted. Buckets whose evaluated config is unchanged are skipped by
+    fingerprint, so edits that change nothing cost no AWS calls.
+    :return boolean:
+    '''
+    import signal
+    import stdconfig.Template as Template
+    import utilities.Watcher as Watcher
+
+    if args.config is None:
+        logger.error("No Config Directory Specified [--config]")
+        return False
+    standard_files = dict((os.path.abspath(path), name) for path, name in
+                          ((args.standardconfig, 'standardparameters'),
+                           (args.standardlogconfig, 'standardlogparameters')) if path)
+    watcher = Watcher.ConfigWatcher(args.config, list(standard_files), args.interval, args.debounce, logger)
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, _stop)
+
+    try:
+        manager.run_fleet('update', args.config)
+        manager.fingerprints.save()
+        logger.info("Watching {} for changes".format(args.config))
+        for changed, removed in watcher.changes():
+            for path in removed:
+                logger.warn("{} was removed; its bucket is left as it is".format(path))
+            config_files = [path for path in changed if path not in standard_files]
+            for path in changed:
+                if path in standard_files:
+                    parameters = FileUtils.load_yaml(path, logger)
+                    if parameters is None:
+                        logger.error("Keeping the previous standard configuration")
+                        continue
+                    setattr(manager, standard_files[path], Template.compile_standard(parameters))
+                    # Every bucket evaluates to something new
+                    config_files = sorted(path for path in watcher.scan() if path not in standard_files)
+            if config_files:
+                manager.apply_configs('update', config_files)
+                manager.fingerprints.save()
+                if manager.config_cache is not None:
+                    manager.config_cache.save()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching {}".format(args.config))
+    finally:
+        watcher.close()
+    return True
+
+
+def _query(args):
+    '''
+    Answers a question about the fleet from the snapshot REFRESH keeps
+    :return boolean:
+    '''
+    if not os.path.isfile(args.snapshot):
+        logger.error("No Snapshot at {}; run REFRESH first".format(args.snapshot))
+        return False
+    import sqlite3
+    snapshot = Snapshot.Snapshot(args.snapshot)
+    try:
+        if args.sql:
+            for row in snapshot.sql(args.sql):
+                FileUtils.write_json_line(row)
+        else:
+            _print_buckets(snapshot.query(args.has_tag, args.missing_tag, args.has_sid, args.missing_sid,
+                                          args.missing_section, args.region.split(',') if args.region else ()))
+    except sqlite3.Error as e:
+        logger.error("Query failed: {}".format(e))
+        return False
+    finally:
+        snapshot.close()
+    return True
+
+
+def _print_buckets(bucket_names):
+    for bucket_name in bucket_names:
+        sys.stdout.write(bucket_name + '\n')
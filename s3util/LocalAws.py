@@ -0,0 +1,303 @@
+'''
+In-process stand-in for the S3 and STS control plane.
+
+Hooks botocore's ``before-send`` event so requests are answered locally after
+going through the real serializer, parser, retry handler and event hooks.
+Configuration documents are stored exactly as they were PUT and echoed back
+on GET, since S3 uses the same XML shape for both directions.
+'''
+import io
+import json
+import random
+import re
+import threading
+import time
+
+from xml.sax.saxutils import escape
+
+try:
+    from urllib.parse import urlparse, parse_qsl, unquote
+except ImportError:
+    from urlparse import urlparse, parse_qsl
+    from urllib import unquote
+
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import EndpointConnectionError
+
+ACCOUNT_ID = '123456789012'
+
+# Regions DescribeRegions reports as enabled for the account
+REGIONS = ('us-east-1', 'us-west-2', 'eu-west-1')
+
+SUBRESOURCES = ('lifecycle', 'policy', 'logging', 'tagging', 'analytics', 'metrics', 'location')
+
+MISSING_CODES = {
+    'lifecycle': 'NoSuchLifecycleConfiguration',
+    'policy': 'NoSuchBucketPolicy',
+    'tagging': 'NoSuchTagSet',
+    'analytics': 'NoSuchConfiguration',
+    'metrics': 'NoSuchConfiguration',
+}
+
+
+class _RawBody(object):
+    def __init__(self, content):
+        self._content = io.BytesIO(content)
+
+    def stream(self, **kwargs):
+        yield self._content.read()
+
+    def read(self, amt=None, **kwargs):
+        return self._content.read(amt)
+
+
+def _error(code, status, message=''):
+    body = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Error><Code>{0}</Code><Message>{1}</Message><RequestId>local</RequestId></Error>'
+            .format(code, message or code))
+    return status, body
+
+
+class LocalAws(object):
+    '''
+    State and behaviour of the stand-in.
+
+    :param latency: seconds slept before answering each request
+    :param throttle_rate: probability (0-1) of answering with 503 SlowDown
+    :param sustained_rate: requests per second answered before S3 starts answering SlowDown,
+                           as a token bucket holding one second of requests (0 for no limit)
+    :param regions: regions EC2 DescribeRegions answers with
+    :param unreachable: fail every request as if the endpoint could not be connected to
+    '''
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, sustained_rate=0, account_id=ACCOUNT_ID, seed=None,
+                 regions=REGIONS, unreachable=False):
+        self.latency = latency
+        self.unreachable = unreachable
+        self.regions = regions
+        self.throttle_rate = throttle_rate
+        self.sustained_rate = float(sustained_rate)
+        self._tokens = self.sustained_rate
+        self._refilled = time.time()
+        self.account_id = account_id
+        self.buckets = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def install(self, emitter):
+        '''Registers the stand-in on a botocore session, or a client's ``meta.events``.'''
+        if hasattr(emitter, 'get_component'):
+            emitter = emitter.get_component('event_emitter')
+        # Last, so client hooks such as the rate limiter run before the request is answered
+        emitter.register_last('before-send', self._handle)
+
+    def add_bucket(self, name, region='us-east-1'):
+        with self._lock:
+            self.buckets[name] = {'region': region, 'created': time.time(), 'config': {}}
+
+    def add_object(self, bucket_name, key, body):
+        with self._lock:
+            self.buckets[bucket_name].setdefault('objects', {})[key] = body
+
+    def call_count(self):
+        return sum(self.calls.values())
+
+    def _handle(self, request, event_name, **kwargs):
+        service, operation = event_name.split('.')[1:3]
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            throttled = self._random.random() < self.throttle_rate or self._over_rate()
+        if self.latency:
+            time.sleep(self.latency)
+        if self.unreachable:
+            raise EndpointConnectionError(endpoint_url=request.url)
+        if throttled:
+            status, body = _error('SlowDown', 503, 'Please reduce your request rate.')
+        elif service == 'sts':
+            status, body = self._sts(operation, request)
+        elif service == 'ec2':
+            status, body = self._ec2(operation)
+        elif service == 'resource-groups-tagging-api':
+            status, body = self._tagging(operation, request)
+        else:
+            status, body = self._s3(operation, request)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        return AWSResponse(request.url, status, {'x-amz-request-id': 'local'}, _RawBody(body))
+
+    def _over_rate(self):
+        if not self.sustained_rate:
+            return False
+        now = time.time()
+        self._tokens = min(self.sustained_rate, self._tokens + (now - self._refilled) * self.sustained_rate)
+        self._refilled = now
+        if self._tokens < 1.0:
+            return True
+        self._tokens -= 1.0
+        return False
+
+    def _sts(self, operation, request):
+        if operation == 'AssumeRole':
+            # Keys handed out for a role carry its account, so later calls can be told apart
+            body = request.body or b''
+            if isinstance(body, bytes):
+                body = body.decode('utf-8')
+            role_arn = dict(parse_qsl(body))['RoleArn']
+            expiration = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() + 3600))
+            return 200, ('<AssumeRoleResponse><AssumeRoleResult><Credentials>'
+                         '<AccessKeyId>ASIA{0}</AccessKeyId><SecretAccessKey>local</SecretAccessKey>'
+                         '<SessionToken>local</SessionToken><Expiration>{1}</Expiration></Credentials>'
+                         '<AssumedRoleUser><Arn>{2}/s3-util</Arn><AssumedRoleId>LOCAL:s3-util</AssumedRoleId>'
+                         '</AssumedRoleUser></AssumeRoleResult></AssumeRoleResponse>').format(
+                role_arn.split(':')[4], expiration, role_arn)
+        if operation != 'GetCallerIdentity':
+            return _error('InvalidAction', 400)
+        authorization = request.headers.get('Authorization', '')
+        if isinstance(authorization, bytes):
+            authorization = authorization.decode('utf-8')
+        credential = re.search(r'Credential=ASIA(\d{12})', authorization)
+        account_id = credential.group(1) if credential else self.account_id
+        return 200, ('<GetCallerIdentityResponse><GetCallerIdentityResult>'
+                     '<Arn>arn:aws:iam::{0}:user/local</Arn><UserId>LOCAL</UserId>'
+                     '<Account>{0}</Account></GetCallerIdentityResult>'
+                     '<ResponseMetadata><RequestId>local</RequestId></ResponseMetadata>'
+                     '</GetCallerIdentityResponse>').format(account_id)
+
+    def _ec2(self, operation):
+        if operation != 'DescribeRegions':
+            return _error('InvalidAction', 400)
+        return 200, ('<DescribeRegionsResponse><requestId>local</requestId><regionInfo>{0}</regionInfo>'
+                     '</DescribeRegionsResponse>').format(''.join(
+                         '<item><regionName>{0}</regionName><regionEndpoint>ec2.{0}.amazonaws.com</regionEndpoint>'
+                         '<optInStatus>opt-in-not-required</optInStatus></item>'.format(region)
+                         for region in self.regions))
+
+    def _tagging(self, operation, request):
+        '''GetResources for S3 buckets, paginated, answering only for buckets in the client's region'''
+        if operation != 'GetResources':
+            return _error('InvalidAction', 400)
+        region = urlparse(request.url).netloc.split('.')[1]
+        body = request.body or b'{}'
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        params = json.loads(body)
+        start = int(params.get('PaginationToken') or 0)
+        per_page = params.get('ResourcesPerPage', 50)
+        with self._lock:
+            tagged = []
+            for name in sorted(self.buckets):
+                bucket = self.buckets[name]
+                if bucket['region'] != region or 'tagging' not in bucket['config']:
+                    continue
+                tags = re.findall(r'<Tag><Key>(.*?)</Key><Value>(.*?)</Value></Tag>', bucket['config']['tagging'])
+                tagged.append({'ResourceARN': 'arn:aws:s3:::' + name,
+                               'Tags': [{'Key': key, 'Value': value} for key, value in tags]})
+        page = tagged[start:start + per_page]
+        token = str(start + per_page) if start + per_page < len(tagged) else ''
+        return 200, json.dumps({'ResourceTagMappingList': page, 'PaginationToken': token})
+
+    def _s3(self, operation, request):
+        url = urlparse(request.url)
+        host = url.netloc.split(':')[0]
+        path = url.path.lstrip('/')
+        match = re.match(r'^(.+)\.s3[.-]', host)
+        if match:
+            bucket_name, object_key = match.group(1), path
+        else:
+            bucket_name, _, object_key = path.partition('/')
+        object_key = unquote(object_key)
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        subresource = next((s for s in SUBRESOURCES if s in query), None)
+        body = request.body or b''
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+
+        if operation == 'ListBuckets':
+            return 200, self._list_buckets()
+
+        with self._lock:
+            bucket = self.buckets.get(bucket_name)
+            if operation == 'CreateBucket':
+                if bucket is not None:
+                    return _error('BucketAlreadyOwnedByYou', 409)
+                region = re.search(r'<LocationConstraint>(.*?)</LocationConstraint>', body)
+                self.buckets[bucket_name] = {'region': region.group(1) if region else 'us-east-1',
+                                             'created': time.time(), 'config': {}}
+                return 200, ''
+            if bucket is None:
+                return _error('NoSuchBucket', 404)
+            if operation == 'HeadBucket':
+                return 200, ''
+            if operation in ('PutObject', 'GetObject', 'HeadObject', 'DeleteObject', 'ListObjectsV2'):
+                return self._object(operation, bucket, object_key, query, body)
+            if subresource == 'location':
+                region = bucket['region']
+                return 200, '<LocationConstraint>{0}</LocationConstraint>'.format(
+                    '' if region == 'us-east-1' else region)
+            key = subresource
+            if subresource in ('analytics', 'metrics'):
+                key = (subresource, query.get('id'))
+            if request.method == 'PUT':
+                bucket['config'][key] = body
+                return 200, ''
+            if request.method == 'DELETE':
+                bucket['config'].pop(key, None)
+                return 204, ''
+            if key in bucket['config']:
+                return 200, bucket['config'][key]
+            if subresource == 'logging':
+                return 200, '<BucketLoggingStatus xmlns="http://s3.amazonaws.com/doc/2006-03-01/"/>'
+            return _error(MISSING_CODES.get(subresource, 'NotImplemented'), 404)
+
+    def _object(self, operation, bucket, object_key, query, body):
+        objects = bucket.setdefault('objects', {})
+        if operation == 'PutObject':
+            objects[object_key] = body
+            return 200, ''
+        if operation == 'DeleteObject':
+            objects.pop(object_key, None)
+            return 204, ''
+        if operation == 'ListObjectsV2':
+            prefix = query.get('prefix', '')
+            delimiter = query.get('delimiter')
+            start_after = query.get('start-after', '')
+            entries = []
+            for key in sorted(objects):
+                if not key.startswith(prefix) or key <= start_after:
+                    continue
+                if delimiter and delimiter in key[len(prefix):]:
+                    # Keys below a delimiter roll up into one CommonPrefixes entry
+                    common = key[:key.index(delimiter, len(prefix)) + len(delimiter)]
+                    if not entries or entries[-1] != (common, None):
+                        entries.append((common, None))
+                else:
+                    entries.append((key, objects[key]))
+            start = int(query.get('continuation-token') or 0)
+            page_size = int(query.get('max-keys') or 1000)
+            page = entries[start:start + page_size]
+            truncated = start + page_size < len(entries)
+            contents = ''.join('<Contents><Key>{0}</Key><LastModified>2017-01-01T00:00:00.000Z</LastModified>'
+                               '<Size>{1}</Size><StorageClass>STANDARD</StorageClass></Contents>'
+                               .format(escape(key), len(body.encode('utf-8')))
+                               if body is not None else
+                               '<CommonPrefixes><Prefix>{0}</Prefix></CommonPrefixes>'.format(escape(key))
+                               for key, body in page)
+            return 200, ('<ListBucketResult><KeyCount>{0}</KeyCount><IsTruncated>{1}</IsTruncated>{2}{3}'
+                         '</ListBucketResult>').format(
+                len(page), 'true' if truncated else 'false',
+                '<NextContinuationToken>{0}</NextContinuationToken>'.format(start + page_size) if truncated else '',
+                contents)
+        if object_key not in objects:
+            return _error('NoSuchKey', 404)
+        return 200, objects[object_key] if operation == 'GetObject' else ''
+
+    def _list_buckets(self):
+        with self._lock:
+            names = sorted(self.buckets)
+        entries = ''.join('<Bucket><Name>{0}</Name><CreationDate>2017-01-01T00:00:00.000Z</CreationDate></Bucket>'
+                          .format(name) for name in names)
+        return ('<ListAllMyBucketsResult><Owner><ID>local</ID></Owner>'
+                '<Buckets>{0}</Buckets></ListAllMyBucketsResult>'.format(entries))
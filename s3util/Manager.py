@@ -0,0 +1,918 @@
+import botocore.exceptions
+import json
+import logging
+import os
+import shutil
+import stdconfig.Audit as Audit
+import stdconfig.Evaluation as Evaluation
+import stdconfig.Template as Template
+import sys
+import threading
+import time
+import utilities.Fingerprints as Fingerprints
+import utilities.Fleet as Fleet
+import utilities.Plan as Plan
+import utilities.TagUtils as TagUtils
+import utilities.Validation as Validation
+import utilities.FileUtils as FileUtils
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from s3util.Session import AwsSession, ClientPool
+from utilities.RateLimiter import AdaptiveRateLimiter
+
+# Lifecycle applied to logging buckets when no standard log config is given
+default_logging_lifecycle = Template.Template(yaml.safe_load("""
+Rules:
+- AbortIncompleteMultipartUpload:
+    DaysAfterInitiation: 7
+  Expiration:
+    Days: 400
+  ID: STANDARD-CONFIG-BUCKET-NAME
+  Prefix: ''
+  Status: Enabled
+  Transitions:
+    - Days: 90
+      StorageClass: GLACIER
+    - Days: 30
+      StorageClass: STANDARD_IA
+"""))
+
+# What audit checks logging buckets against when no standard log config is given
+default_logging_standard = Template.StandardConfig({'life-cycle-rules': default_logging_lifecycle.document})
+
+
+# Sections in the order update writes them, with the method writing each
+APPLY_STEPS = (
+    ('bucket-security-policy', '_apply_bucket_policy'),
+    ('life-cycle-rules', '_apply_lifecycle_policy'),
+    ('logging-rules', '_apply_bucket_logging'),
+    ('bucket-tags', '_apply_bucket_tags'),
+    ('bucket-analytics', '_apply_bucket_analytics_configuration'),
+    ('bucket-metrics', '_apply_bucket_metrics_configuration'),
+)
+
+
+# Sections fetch retrieves from a live bucket, with the method retrieving each (None when not set)
+FETCH_STEPS = (
+    ('life-cycle-rules', '_get_lifecycle'),
+    ('bucket-security-policy', '_get_policy'),
+    ('logging-rules', '_get_logging'),
+    ('bucket-tags', '_get_tags'),
+    ('bucket-analytics', '_get_analytics'),
+    ('bucket-metrics', '_get_metrics'),
+)
+
+# Error codes the getters take to mean the bucket has no such configuration; any other
+# error (access denied, throttling, ...) fails the fetch rather than reading as not set
+NOT_CONFIGURED_CODES = frozenset(['NoSuchLifecycleConfiguration', 'NoSuchBucketPolicy', 'NoSuchTagSet',
+                                  'NoSuchConfiguration'])
+
+
+def _not_configured(error):
+    return error.response.get('Error', {}).get('Code') in NOT_CONFIGURED_CODES
+
+
+def merge_tags(parameters, tags):
+    '''
+    Merges tags (e.g. given with --tag) into the bucket parameters, preferring them
+    over the tags in the config
+    :return:
+    '''
+    if tags:
+        if 'bucket-tags' in parameters:
+            # Prefer user input; cli tags not found in yml are added
+            TagUtils.TagSet(parameters['bucket-tags']['TagSet']).update(tags)
+
+        else:
+            parameters['bucket-tags'] = {'TagSet': [dict(tag) for tag in tags]}
+
+
+class S3Manager(object):
+    '''
+    Creates, updates, evaluates and retrieves S3 bucket configurations.
+
+    :param profile: AWS profile as stored in ~/.aws/credentials
+    :param role_arn: role to assume with the profile's credentials, to work in another account
+    :param standardparameters: standard configuration applied to every bucket (dict or Template.StandardConfig)
+    :param standardlogparameters: standard configuration applied to logging buckets
+    :param tags: list of {'Key': , 'Value': } merged into every bucket config
+    :param output: directory evaluated and retrieved configs are written to, '-' for stdout
+    :param config_output: FileUtils.ConfigOutput to write them to instead, e.g. a single file or
+                          json; the caller closes it
+    :param workers: number of buckets processed concurrently in fleet runs
+    :param identity_cache_ttl: seconds the account ID may be reused from the on-disk cache
+    :param pool: ClientPool to draw clients from; by default one is created for this manager
+    :param max_pool_connections: HTTP connections per client (default workers * 7, at least 10)
+    :param max_rate: S3 requests per second shared by all workers, reduced while S3 throttles (0 for no limit)
+    :param stats: CallStats recording the API calls the manager makes
+    :param fingerprints: FingerprintStore; update skips buckets whose rendered config matches the
+                         one last applied, and create and update record what they apply. The
+                         caller saves it.
+    :param force: with fingerprints, update every bucket and only record the fingerprints
+    :param journal: Journal the steps finished for each bucket are recorded in; steps it already
+                    holds (from an interrupted run being resumed) are not repeated
+    :param read_only: refuse every AWS call that would change something, as audit does
+    :param config_cache: ConfigCache fleet runs and validation load config files through, so
+                         unchanged files are not parsed again. The caller saves it.
+    '''
+
+    def __init__(self, profile=None, standardparameters=None, standardlogparameters=None, tags=None,
+                 output=None, workers=10, identity_cache_ttl=0, logger=None, pool=None,
+                 max_pool_connections=None, max_rate=0, stats=None, fingerprints=None, force=False,
+                 journal=None, role_arn=None, read_only=False, config_cache=None, config_output=None):
+        self.logger = logger or logging.getLogger(__name__)
+        # Standard configs are compiled once; each bucket then only renders them
+        self.standardparameters = Template.compile_standard(standardparameters)
+        self.standardlogparameters = Template.compile_standard(standardlogparameters)
+        self.tags = tags or []
+        self.output = output
+        self.config_output = config_output or FileUtils.ConfigOutput(output)
+        self.workers = workers
+        if pool is None:
+            # Size the connection pool so fleet workers and their concurrent
+            # sub-resource fetches don't queue for sockets
+            pool = ClientPool(max_pool_connections=max_pool_connections or max(10, workers * 7),
+                              rate_limiter=AdaptiveRateLimiter(max_rate) if max_rate else None,
+                              stats=stats, read_only=read_only)
+        self.aws = AwsSession(profile, pool, identity_cache_ttl=identity_cache_ttl, role_arn=role_arn)
+        self.account = self.aws.account
+        self.fingerprints = fingerprints
+        self.force = force
+        self.journal = journal
+        self.config_cache = config_cache
+        self._unchanged = []
+
+        # Logging buckets known to exist this run, so fleet workers check each region's once;
+        # the lock serializes creation when several workers find one missing at once
+        self._logging_buckets = set()
+        self._logging_bucket_lock = threading.Lock()
+        # Keeps plans from concurrent fleet workers from interleaving on stdout
+        self._output_lock = threading.Lock()
+        self._subresource_executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self.aws.client('s3')
+
+    def regional_client(self, region):
+        '''
+        Client for the bucket's own region, so writes go straight to its endpoint
+        instead of being redirected from the default one
+        '''
+        return self.aws.client('s3', region)
+
+    @property
+    def subresource_executor(self):
+        # Sub-resource GETs for retrieve-config; separate from the fleet pool so a bucket
+        # worker waiting on its sub-resources can never starve them of threads
+        with self._executor_lock:
+            if self._subresource_executor is None:
+                self._subresource_executor = ThreadPoolExecutor(max_workers=max(7, self.workers * 7))
+            return self._subresource_executor
+
+    def close(self):
+        '''
+        Stops the sub-resource threads; they are started again if the manager is used after
+        :return:
+        '''
+        with self._executor_lock:
+            executor, self._subresource_executor = self._subresource_executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    # Fleet runs
+
+    def run_fleet(self, action, config):
+        '''
+        Applies create, update or plan to every config file in a directory or glob on a bounded
+        thread pool sharing one session and client. Each bucket succeeds or fails on its own.
+        :return boolean: True if every bucket succeeded
+        '''
+        config_files = Fleet.expand_config_paths(config)
+        if not config_files:
+            self.logger.error("No config files found: {}".format(config))
+            return False
+        return self.apply_configs(action, config_files)
+
+    def apply_configs(self, action, config_files):
+        '''
+        Applies create, update or plan to each of the config files, as run_fleet does
+        :return boolean: True if every bucket succeeded
+        '''
+        self.logger.info("Running {} on {} buckets with {} workers".format(action, len(config_files), self.workers))
+
+        def _apply(config_file):
+            parameters = Validation.open_and_validate_config(config_file, self.logger, self.config_cache)
+            if parameters is None:
+                return False
+            merge_tags(parameters, self.tags)
+            if action == 'create':
+                return self.create(parameters)
+            if action == 'plan':
+                return self.plan(parameters)
+            return self.update(parameters)
+
+        start = time.time()
+        del self._unchanged[:]
+        results = Fleet.run_fleet(config_files, _apply, self.workers, self.logger)
+        if self._unchanged:
+            self.logger.info("Skipped {} buckets unchanged since their config was last applied".format(
+                len(self._unchanged)))
+        self._log_throttling()
+        return Fleet.log_summary(results, time.time() - start, self.logger)
+
+    def _log_throttling(self):
+        limiter = self.aws.pool.rate_limiter
+        if limiter is not None and limiter.throttled:
+            self.logger.warn("S3 throttled {} requests; request rate settled at {:.1f}/s".format(
+                limiter.throttled, limiter.rate))
+
+    def validate_configs(self, config):
+        '''
+        Checks every config file in a file, directory or glob against the schema
+        :return boolean: True if every config is valid
+        '''
+        return Validation.validate_config_paths(config, self.workers, self.logger, self.config_cache)
+
+    # Bucket operations
+
+    def bucket_exists(self, bucket_name):
+        '''
+        HEADs the bucket; unlike Bucket.load() this does not list every bucket in the account
+        :return boolean:
+        '''
+        try:
+            self.client.head_bucket(Bucket=bucket_name)
+            return True
+        except botocore.exceptions.ClientError:
+            return False
+
+    def create(self, parameters):
+        '''
+        This creates a bucket based on defaults or config
+        :return:
+        '''
+
+        if self._journaled(parameters['bucket-name'], 'created'):
+            self.logger.info("Already created before the run was interrupted: {}".format(parameters['bucket-name']))
+            return self.update(parameters, diff=False)
+
+        # Check if Bucket Already Exists
+        if self.bucket_exists(parameters['bucket-name']):
+            self.logger.warn("Bucket Already Exists ({})".format(parameters['bucket-name']))
+            return False
+        self.logger.info("Creating {}".format(parameters['bucket-name']))
+
+        # S3 assumes US-Standard unless otherwise specified and does not accept us-east-1 as an option
+        s3client = self.regional_client(parameters['region'])
+        if parameters['region'] == 'us-east-1':
+            bucket = s3client.create_bucket(Bucket=parameters['bucket-name'])
+        else:
+            bucket = s3client.create_bucket(Bucket=parameters['bucket-name'],
+                                            CreateBucketConfiguration={'LocationConstraint': parameters['region']})
+        self._journal(parameters['bucket-name'], 'created')
+
+        # Nothing to compare against on a new bucket
+        return self.update(parameters, diff=False)
+
+    def update(self, parameters, diff=True):
+        '''
+        This updates a bucket based on defaults or config. With diff the live state is
+        fetched first and only the sections that differ from it are written. Buckets whose
+        rendered config matches the fingerprint last recorded for them are skipped without
+        calling AWS.
+        :return:
+        '''
+        if self.standardparameters != None:
+            self.evaluate_standard_config(parameters, self.standardparameters)
+            self.save_config(parameters)
+
+        bucket_name = parameters['bucket-name']
+        fingerprint = None
+        if self.fingerprints is not None or self.journal is not None:
+            # The account only changes the rendered config through the standard's placeholders
+            account_id = None
+            if self.standardparameters is not None and self.standardparameters.uses_account():
+                account_id = self.account.account_id
+            fingerprint = Fingerprints.fingerprint(parameters, self.standardparameters, account_id)
+        # New buckets (diff False) always get their full config
+        if self.fingerprints is not None and diff and not self.force and \
+                self.fingerprints.matches(bucket_name, fingerprint):
+            self.logger.info("Unchanged since last applied: {}".format(bucket_name))
+            self._unchanged.append(bucket_name)
+            return True
+
+        if self._journaled(bucket_name, 'updated', fingerprint):
+            self.logger.info("Already updated before the run was interrupted: {}".format(bucket_name))
+            return True
+
+        planned = self._journaled(bucket_name, 'planned', fingerprint)
+        if planned:
+            # The sections still to write were worked out before the interruption
+            sections = planned['sections']
+            self.logger.info("Resuming {}: {}".format(bucket_name, ', '.join(
+                section for section in sections if not self._journaled(bucket_name, section, fingerprint))))
+        else:
+            # Check if Bucket Already Exists
+            if not self.bucket_exists(bucket_name):
+                self.logger.warn("Bucket Error ({}) bucket does not exist or is not accessible".format(bucket_name))
+                return False
+            self.logger.info("Updating: {}".format(bucket_name))
+
+            if diff:
+                live = self.fetch(bucket_name, parameters['region'], self.regional_client(parameters['region']))
+                sections = [change.section for change in Plan.diff(parameters, live)]
+                if not sections:
+                    self.logger.info("No changes: {}".format(bucket_name))
+                    self._record_fingerprint(parameters, fingerprint)
+                    self._journal(bucket_name, 'updated', fingerprint)
+                    return True
+                self.logger.info("Changing {}: {}".format(bucket_name, ', '.join(sections)))
+            else:
+                sections = [section for section in Plan.SECTIONS if section in parameters]
+            self._journal(bucket_name, 'planned', fingerprint, sections=sections)
+
+        for section, apply in APPLY_STEPS:
+            if section in sections and not self._journaled(bucket_name, section, fingerprint):
+                getattr(self, apply)(parameters)
+                self._journal(bucket_name, section, fingerprint)
+
+        self._record_fingerprint(parameters, fingerprint)
+        self._journal(bucket_name, 'updated', fingerprint)
+
+    def _record_fingerprint(self, parameters, fingerprint):
+        if self.fingerprints is not None:
+            self.fingerprints.record(parameters['bucket-name'], fingerprint)
+
+    def _journaled(self, bucket_name, step, fingerprint=None):
+        if self.journal is None:
+            return None
+        return self.journal.completed(bucket_name, step, fingerprint)
+
+    def _journal(self, bucket_name, step, fingerprint=None, **details):
+        if self.journal is not None:
+            self.journal.record(bucket_name, step, fingerprint, **details)
+
+    def plan(self, parameters):
+        '''
+        Evaluates the config, compares it with the live bucket and prints the
+        sections update would write. Makes no changes, in AWS or on disk.
+        :return:
+        '''
+        if self.standardparameters != None:
+            self.evaluate_standard_config(parameters, self.standardparameters)
+
+        if self.bucket_exists(parameters['bucket-name']):
+            live = self.fetch(parameters['bucket-name'], parameters['region'],
+                              self.regional_client(parameters['region']))
+        else:
+            self.logger.warn("Bucket {} does not exist; plan shows the full config".format(parameters['bucket-name']))
+            live = {}
+
+        plan = Plan.format_plan(parameters, Plan.diff(parameters, live))
+        with self._output_lock:
+            sys.stdout.write(plan + '\n')
+            sys.stdout.flush()
+
+    # Retrieval
+
+    def get_bucket_region(self, bucket_name, s3client=None):
+        location = (s3client or self.client).get_bucket_location(Bucket=bucket_name)['LocationConstraint']
+        # S3 reports US-Standard as no constraint and old Ireland buckets as EU
+        if location == None:
+            return 'us-east-1'
+        if location == 'EU':
+            return 'eu-west-1'
+        return location
+
+    def _get_lifecycle(self, s3client, bucket_name):
+        try:
+            return {'Rules': s3client.get_bucket_lifecycle_configuration(Bucket=bucket_name)['Rules']}
+        except botocore.exceptions.ClientError as e:
+            if not _not_configured(e):
+                raise
+            self.logger.info("No Lifecycle Attached ({})".format(bucket_name))
+
+    def _get_policy(self, s3client, bucket_name):
+        try:
+            return json.loads(s3client.get_bucket_policy(Bucket=bucket_name)['Policy'])
+        except botocore.exceptions.ClientError as e:
+            if not _not_configured(e):
+                raise
+            self.logger.info("No Bucket Policy Attached ({})".format(bucket_name))
+
+    def _get_logging(self, s3client, bucket_name):
+        logging_configuration = s3client.get_bucket_logging(Bucket=bucket_name).get('LoggingEnabled')
+        if logging_configuration is None:
+            self.logger.info("No Logging Policy Attached ({})".format(bucket_name))
+            return None
+        return {'LoggingEnabled': logging_configuration}
+
+    def _get_tags(self, s3client, bucket_name):
+        try:
+            return {'TagSet': s3client.get_bucket_tagging(Bucket=bucket_name)['TagSet']}
+        except botocore.exceptions.ClientError as e:
+            if not _not_configured(e):
+                raise
+            self.logger.info("No Tagging Policy Attached ({})".format(bucket_name))
+
+    def _get_analytics(self, s3client, bucket_name):
+        try:
+            return s3client.get_bucket_analytics_configuration(Bucket=bucket_name,
+                                                               Id='EntireBucketAnalytics')['AnalyticsConfiguration']
+        except botocore.exceptions.ClientError as e:
+            if not _not_configured(e):
+                raise
+            self.logger.info("No Analytics Config Attached ({})".format(bucket_name))
+
+    def _get_metrics(self, s3client, bucket_name):
+        try:
+            return s3client.get_bucket_metrics_configuration(Bucket=bucket_name,
+                                                             Id='EntireBucket')['MetricsConfiguration']
+        except botocore.exceptions.ClientError as e:
+            if not _not_configured(e):
+                raise
+            self.logger.info("No Metrics Config Attached ({})".format(bucket_name))
+
+    def fetch(self, bucket_name, region=None, s3client=None, sections=None):
+        '''
+        Retrieves the configuration of an existing S3 bucket. Every sub-resource is
+        requested concurrently; sections the bucket does not have are left out, and any
+        other error retrieving a section is raised.
+        :param sections: sections to retrieve, by default all of them
+        :return dict:
+        '''
+        s3client = s3client or self.client
+        self.logger.info("Pulling Config for Bucket: {}".format(bucket_name))
+        if region is None:
+            region = self.get_bucket_region(bucket_name, s3client)
+        state = {'bucket-name': bucket_name, 'region': region}
+
+        futures = [(section, self.subresource_executor.submit(getattr(self, method), s3client, bucket_name))
+                   for section, method in FETCH_STEPS if sections is None or section in sections]
+        for section, future in futures:
+            value = future.result()
+            if value is not None:
+                state[section] = value
+        return state
+
+    def retrieve(self, bucket_name, region=None, s3client=None):
+        '''
+        Retrieves the configuration from an existing S3 bucket and ouputs a yaml config file
+        describing the bucket
+        :return:
+        '''
+        self.save_config(self.fetch(bucket_name, region, s3client))
+
+    def retrieve_all(self):
+        '''
+        Retrieves the configuration of every bucket in the account. Buckets are grouped by
+        region and fetched through that region's client; each config is written out as soon
+        as it completes so only the in-flight buckets are held in memory.
+        :return boolean: True if every bucket was retrieved
+        '''
+        start = time.time()
+        bucket_names = [bucket['Name'] for bucket in self.client.list_buckets()['Buckets']]
+        # Retrieved configs only count for the output they were written to
+        destination = self.config_output.destination
+        retrieved = set(name for name in bucket_names if self._journaled(name, 'retrieved', destination))
+        if retrieved:
+            self.logger.info("Skipping {} buckets retrieved before the run was interrupted".format(len(retrieved)))
+            bucket_names = [name for name in bucket_names if name not in retrieved]
+        self.logger.info("Retrieving {} buckets with {} workers".format(len(bucket_names), self.workers))
+
+        results = []
+        located = []
+        for bucket_name, region, error in Fleet.bounded_map(self.get_bucket_region, bucket_names, self.workers):
+            if error is not None:
+                self.logger.error("{}: {}".format(bucket_name, error))
+                results.append(Fleet.FleetResult(bucket_name, False, str(error), 0.0))
+            else:
+                located.append((region, bucket_name))
+
+        def _retrieve(item):
+            region, bucket_name = item
+            self.retrieve(bucket_name, region, self.regional_client(region))
+            self._journal(bucket_name, 'retrieved', destination)
+
+        results.extend(Fleet.run_fleet(sorted(located), _retrieve, self.workers, self.logger,
+                                       name=lambda item: item[1]))
+        self._log_throttling()
+        return Fleet.log_summary(results, time.time() - start, self.logger)
+
+    # Snapshot
+
+    def refresh_snapshot(self, snapshot, max_age=0):
+        '''
+        Brings a Snapshot up to date with the account. Buckets are listed once, buckets no
+        longer in the account are dropped, and only the sections fetched more than max_age
+        seconds ago, or never, are fetched again; regions already known are not looked up.
+        :param max_age: seconds a fetched section stays fresh; 0 to fetch everything
+        :return boolean: True if every stale bucket was fetched
+        '''
+        start = time.time()
+        bucket_names = [bucket['Name'] for bucket in self.client.list_buckets()['Buckets']]
+        removed = snapshot.remove_missing(bucket_names)
+        if removed:
+            self.logger.info("Dropped {} buckets no longer in the account".format(len(removed)))
+        stale = snapshot.stale_sections(bucket_names, max_age)
+        regions = snapshot.regions()
+        self.logger.info("Refreshing {} of {} buckets with {} workers".format(len(stale), len(bucket_names),
+                                                                            self.workers))
+
+        def _refresh(bucket_name):
+            region = regions.get(bucket_name) or self.get_bucket_region(bucket_name)
+            fetched = time.time()
+            return fetched, self.fetch(bucket_name, region, self.regional_client(region), stale[bucket_name])
+
+        results = []
+        for bucket_name, outcome, error in Fleet.bounded_map(_refresh, sorted(stale), self.workers):
+            if error is not None:
+                self.logger.error("{}: {}".format(bucket_name, error))
+                results.append(Fleet.FleetResult(bucket_name, False, str(error), 0.0))
+                continue
+            fetched, state = outcome
+            snapshot.store(state, stale[bucket_name], fetched)
+            results.append(Fleet.FleetResult(bucket_name, True, None, 0.0))
+        snapshot.commit()
+        self._log_throttling()
+        return Fleet.log_summary(results, time.time() - start, self.logger)
+
+    # Audit
+
+    def audit(self, bucket_names=None):
+        '''
+        Checks the live configuration of buckets against the standard configuration without
+        changing anything. Buckets are fetched concurrently and evaluated in memory; each
+        bucket's violations are written to stdout as a line of json as soon as it is checked.
+        Logging buckets are checked against the standard log configuration, or only for the
+        default logging lifecycle when none is given.
+        :param bucket_names: buckets to audit; by default every bucket in the account
+        :return boolean: True if every bucket was audited and none violates the standard
+        '''
+        start = time.time()
+        if bucket_names is None:
+            bucket_names = [bucket['Name'] for bucket in self.client.list_buckets()['Buckets']]
+        self.logger.info("Auditing {} buckets with {} workers".format(len(bucket_names), self.workers))
+
+        def _audit(bucket_name):
+            region = self.get_bucket_region(bucket_name)
+            live = self.fetch(bucket_name, region, self.regional_client(region))
+            if bucket_name == self.account.logging_bucket_name(region):
+                standardparameters = self.standardlogparameters or default_logging_standard
+            else:
+                standardparameters = self.standardparameters
+            return region, Audit.audit_config(live, standardparameters, self.account)
+
+        results = []
+        noncompliant = 0
+        for bucket_name, outcome, error in Fleet.bounded_map(_audit, bucket_names, self.workers):
+            if error is not None:
+                self.logger.error("{}: {}".format(bucket_name, error))
+                FileUtils.write_json_line({'bucket': bucket_name, 'error': str(error)})
+                results.append(Fleet.FleetResult(bucket_name, False, str(error), 0.0))
+                continue
+            region, violations = outcome
+            if violations:
+                noncompliant += 1
+            FileUtils.write_json_line({'bucket': bucket_name, 'region': region, 'compliant': not violations,
+                                       'violations': violations})
+            results.append(Fleet.FleetResult(bucket_name, True, None, 0.0))
+        self.logger.info("{} of {} buckets audited violate the standard configuration".format(
+            noncompliant, len(results)))
+        self._log_throttling()
+        return Fleet.log_summary(results, time.time() - start, self.logger) and not noncompliant
+
+    # Tags
+
+    def tag_index(self, regions=None):
+        '''
+        Builds a tag index of every bucket in the account from one ListBuckets and the
+        paginated GetResources tagging API (up to 100 buckets per call, regions queried
+        concurrently) instead of a GetBucketTagging per bucket
+        :param regions: regions to query; by default every region the tagging API is offered in
+        :return TagUtils.TagIndex:
+        '''
+        index = TagUtils.TagIndex()
+        for bucket in self.client.list_buckets()['Buckets']:
+            index.add(bucket['Name'], {})
+        if regions is None:
+            regions = self.aws.session.get_available_regions('resourcegroupstaggingapi')
+
+        def _region_tags(region):
+            tagging = self.aws.client('resourcegroupstaggingapi', region)
+            found = []
+            for page in tagging.get_paginator('get_resources').paginate(ResourceTypeFilters=['s3'],
+                                                                        ResourcesPerPage=100):
+                for resource in page['ResourceTagMappingList']:
+                    # arn:aws:s3:::bucket-name
+                    found.append((resource['ResourceARN'].split(':::', 1)[-1], resource['Tags']))
+            return found
+
+        for region, found, error in Fleet.bounded_map(_region_tags, regions, self.workers):
+            if error is not None:
+                # Typically a region that is not enabled for the account
+                self.logger.warn("Skipping tags in {}: {}".format(region, error))
+                continue
+            for bucket_name, tags in found:
+                if bucket_name in index.buckets:
+                    index.add(bucket_name, tags)
+        self.logger.info("Indexed tags of {} buckets across {} regions".format(len(index.buckets), len(regions)))
+        return index
+
+    # Lifecycle estimates
+
+    def lifecycle(self, bucket_name):
+        '''
+        :return dict: the bucket's current LifecycleConfiguration, None if it has none
+        '''
+        return self._get_lifecycle(self.regional_client(self.get_bucket_region(bucket_name)), bucket_name)
+
+    def object_chunks(self, bucket_name, prefix=''):
+        '''
+        Streams the bucket's objects page by page as LifecycleEstimate chunks; only
+        the chunk being counted is held in memory
+        :return generator:
+        '''
+        import utilities.LifecycleEstimate as LifecycleEstimate
+        s3client = self.regional_client(self.get_bucket_region(bucket_name))
+        pages = s3client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix)
+        return LifecycleEstimate.listing_chunks(pages)
+
+    # Storage Class Analysis
+
+    def analytics_aggregate(self, regions, bucket_name=None):
+        '''
+        Streams the Storage Class Analysis exports from the logging bucket of each region
+        (<logging bucket>/_analytics/<bucket>/...), reading objects concurrently
+        :param bucket_name: only read the exports of this bucket
+        :return dict: AnalyticsReport aggregate
+        '''
+        import utilities.AnalyticsReport as AnalyticsReport
+        exports = []
+        for region in regions:
+            logging_bucket_name = self.account.logging_bucket_name(region)
+            s3client = self.regional_client(region)
+            prefix = '_analytics/' + (bucket_name + '/' if bucket_name else '')
+            for page in s3client.get_paginator('list_objects_v2').paginate(Bucket=logging_bucket_name, Prefix=prefix):
+                for entry in page.get('Contents', []):
+                    if entry['Key'].endswith('.csv'):
+                        exported = entry['Key'][len('_analytics/'):].split('/')[0]
+                        exports.append((s3client, logging_bucket_name, entry['Key'], exported))
+        self.logger.info("Reading {} analytics exports".format(len(exports)))
+
+        def _read(export):
+            s3client, logging_bucket_name, key, exported = export
+            body = s3client.get_object(Bucket=logging_bucket_name, Key=key)['Body']
+            return AnalyticsReport.read_stream(body.iter_lines(), exported)
+
+        aggregate = AnalyticsReport.new_aggregate()
+        for export, partial, error in Fleet.bounded_map(_read, exports, self.workers):
+            if error is not None:
+                self.logger.error("{}: {}".format(export[2], error))
+                continue
+            AnalyticsReport.merge(aggregate, partial)
+        return aggregate
+
+    # Server access logs
+
+    def download_access_logs(self, regions, directory, processed=None, bucket_name=None):
+        '''
+        Copies the access logs in the logging bucket of each region (<logging bucket>/<bucket>/...)
+        to the same layout under directory. Keys at or before a folder's last processed log are
+        not listed again, and files already downloaded with the same size are skipped.
+        :param processed: folder -> last log key already read, as kept by AccessLogReport
+        :param bucket_name: only download the logs of this bucket
+        :return int: number of files downloaded
+        '''
+        processed = processed or {}
+        logs = []
+        for region in regions:
+            logging_bucket_name = self.account.logging_bucket_name(region)
+            s3client = self.regional_client(region)
+            if bucket_name:
+                folders = [bucket_name + '/']
+            else:
+                folders = [common['Prefix']
+                           for page in s3client.get_paginator('list_objects_v2').paginate(
+                               Bucket=logging_bucket_name, Delimiter='/')
+                           for common in page.get('CommonPrefixes', [])
+                           if not common['Prefix'].startswith('_')]
+            for folder in folders:
+                pages = s3client.get_paginator('list_objects_v2').paginate(
+                    Bucket=logging_bucket_name, Prefix=folder, StartAfter=processed.get(folder.rstrip('/'), ''))
+                for page in pages:
+                    for entry in page.get('Contents', []):
+                        path = os.path.join(directory, *entry['Key'].split('/'))
+                        if not (os.path.exists(path) and os.path.getsize(path) == entry['Size']):
+                            logs.append((s3client, logging_bucket_name, entry['Key'], path))
+        self.logger.info("Downloading {} access log files".format(len(logs)))
+
+        def _download(log):
+            s3client, logging_bucket_name, key, path = log
+            if not os.path.isdir(os.path.dirname(path)):
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    # Another worker made it first
+                    pass
+            body = s3client.get_object(Bucket=logging_bucket_name, Key=key)['Body']
+            # Written aside and renamed, so an interrupted run never leaves a partial log behind
+            temp_path = path + '.part'
+            try:
+                with open(temp_path, 'wb') as log_file:
+                    shutil.copyfileobj(body, log_file)
+                os.rename(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        downloaded = 0
+        for log, _, error in Fleet.bounded_map(_download, logs, self.workers):
+            if error is not None:
+                self.logger.error("{}: {}".format(log[2], error))
+                continue
+            downloaded += 1
+        return downloaded
+
+    # Evaluation
+
+    def evaluate_standard_config(self, parameters, standardparameters):
+        '''
+        Evaluates the bucket parameters against a standard configuration in memory and
+        validates the result; nothing is written
+        :return dict: the evaluated parameters
+        '''
+        self.logger.info("Evaluating Bucket Parameters Against Standard Configuration")
+        Evaluation.evaluate_config(parameters, standardparameters, self.account)
+        Validation.validate_config(parameters, self.logger)
+        return parameters
+
+    def apply_standard_config(self, parameters, standardparameters):
+        '''
+        Evaluates the bucket parameters against a standard configuration and persists the
+        evaluated config once
+        :return dict: the evaluated parameters
+        '''
+        self.evaluate_standard_config(parameters, standardparameters)
+        self.save_config(parameters)
+        return parameters
+
+    def save_config(self, parameters):
+        '''
+        Writes an evaluated or retrieved config to the run's output
+        :return:
+        '''
+        self.config_output.write(parameters)
+
+    # Logging buckets
+
+    def enabled_regions(self):
+        '''
+        :return list: regions enabled for the account, opt-in regions only once opted in
+        '''
+        ec2 = self.aws.client('ec2', 'us-east-1')
+        return sorted(region['RegionName'] for region in ec2.describe_regions()['Regions'])
+
+    def create_logging_buckets(self, regions):
+        '''
+        Creates and configures the logging bucket of every region concurrently; each region
+        succeeds or fails on its own
+        :return boolean: True if every region succeeded
+        '''
+        self.logger.info("Creating logging buckets in {} regions with {} workers".format(len(regions), self.workers))
+        start = time.time()
+        results = Fleet.run_fleet(regions, self.create_logging_bucket, self.workers, self.logger)
+        self._log_throttling()
+        return Fleet.log_summary(results, time.time() - start, self.logger)
+
+    def ensure_logging_bucket(self, region):
+        '''
+        Creates the region's logging bucket unless it exists. Buckets found or created are
+        remembered for the rest of the run, so only the first bucket update per region checks.
+        '''
+        logging_bucket_name = self.account.logging_bucket_name(region)
+        if logging_bucket_name in self._logging_buckets:
+            return
+        with self._logging_bucket_lock:
+            # Another worker may have found or created it while we waited
+            if logging_bucket_name in self._logging_buckets:
+                return
+            if self.bucket_exists(logging_bucket_name):
+                self._logging_buckets.add(logging_bucket_name)
+            else:
+                self.create_logging_bucket(region)
+
+    def create_logging_bucket(self, region):
+        '''
+        Creates a logging bucket
+        :return:
+        '''
+
+        logging_bucket_name = self.account.logging_bucket_name(region)
+        s3client = self.regional_client(region)
+
+        # Check if Bucket Already Exists
+        if logging_bucket_name in self._logging_buckets or self.bucket_exists(logging_bucket_name):
+            self.logger.warn("Bucket Already Exists ({})".format(logging_bucket_name))
+
+        else:
+            self.logger.info("Creating Log Bucket {}".format(logging_bucket_name))
+            # S3 assumes US-Standard unless otherwise specified and does not accept us-east-1 as an option
+            if region == 'us-east-1':
+                bucket = s3client.create_bucket(Bucket=logging_bucket_name, ACL='log-delivery-write')
+            else:
+                bucket = s3client.create_bucket(Bucket=logging_bucket_name, ACL='log-delivery-write',
+                                                CreateBucketConfiguration={'LocationConstraint': region})
+        self._logging_buckets.add(logging_bucket_name)
+
+        # Apply Logging Bucket Policy
+        if self.standardlogparameters == None:
+            policy = default_logging_lifecycle.render(bucket_name=logging_bucket_name)
+            s3client.put_bucket_lifecycle_configuration(Bucket=logging_bucket_name,
+                                                        LifecycleConfiguration=dict(policy))
+        else:
+            parameters = {'bucket-name': logging_bucket_name}
+            parameters['region'] = region
+            self.apply_standard_config(parameters, self.standardlogparameters)
+            return self.update(parameters)
+
+    # Apply steps
+
+    def _apply_bucket_policy(self, parameters):
+        s3client = self.regional_client(parameters['region'])
+        try:
+            s3client.put_bucket_policy(Bucket=parameters['bucket-name'],
+                                       Policy=parameters['bucket-security-policy'])
+        except:
+            s3client.put_bucket_policy(Bucket=parameters['bucket-name'],
+                                       Policy=json.dumps(parameters['bucket-security-policy']))
+
+    def _apply_lifecycle_policy(self, parameters):
+        '''
+        Loads lifecycle policy from config
+
+        accepts LifecycleConfiguration as a string or json object.
+        :param parameters:
+        :return:
+        '''
+        s3client = self.regional_client(parameters['region'])
+        try:
+            s3client.put_bucket_lifecycle_configuration(Bucket=parameters['bucket-name'],
+                                                        LifecycleConfiguration=json.loads(parameters['life-cycle-rules'])
+                                                        )
+        except:
+            s3client.put_bucket_lifecycle_configuration(Bucket=parameters['bucket-name'],
+                                                        LifecycleConfiguration=parameters['life-cycle-rules']
+                                                        )
+
+    def _apply_bucket_logging(self, parameters):
+        s3client = self.regional_client(parameters['region'])
+        self.ensure_logging_bucket(parameters['region'])
+
+        try:
+            s3client.put_bucket_logging(Bucket=parameters['bucket-name'],
+                                        BucketLoggingStatus=json.loads(parameters['logging-rules'])
+                                        )
+        except TypeError:
+            s3client.put_bucket_logging(Bucket=parameters['bucket-name'],
+                                        BucketLoggingStatus=parameters['logging-rules'])
+
+    def _apply_bucket_tags(self, parameters):
+        s3client = self.regional_client(parameters['region'])
+        try:
+            tagset = json.loads(parameters['bucket-tags']['TagSet'])
+        except TypeError:
+            tagset = parameters['bucket-tags']['TagSet']
+
+        # Filter out empty tags
+        tagset = list(e for e in tagset if e['Value'])
+
+        s3client.put_bucket_tagging(Bucket=parameters['bucket-name'],
+                                    Tagging={'TagSet': tagset})
+
+    def _apply_bucket_analytics_configuration(self, parameters):
+        s3client = self.regional_client(parameters['region'])
+        try:
+            s3client.put_bucket_analytics_configuration(Bucket=parameters['bucket-name'],
+                                                        Id=parameters['bucket-analytics']['Id'],
+                                                        AnalyticsConfiguration=json.loads(parameters['bucket-analytics'])
+                                                        )
+        except TypeError:
+            s3client.put_bucket_analytics_configuration(Bucket=parameters['bucket-name'],
+                                                        Id=parameters['bucket-analytics']['Id'],
+                                                        AnalyticsConfiguration=dict(parameters['bucket-analytics']))
+
+    def _apply_bucket_metrics_configuration(self, parameters):
+        s3client = self.regional_client(parameters['region'])
+        try:
+            s3client.put_bucket_metrics_configuration(Bucket=parameters['bucket-name'],
+                                                      Id=parameters['bucket-metrics']['Id'],
+                                                      MetricsConfiguration=json.loads(parameters['bucket-metrics'])
+                                                      )
+        except TypeError:
+            s3client.put_bucket_metrics_configuration(Bucket=parameters['bucket-name'],
+                                                      Id=parameters['bucket-metrics']['Id'],
+                                                      MetricsConfiguration=parameters['bucket-metrics'])
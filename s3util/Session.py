@@ -0,0 +1,146 @@
+import threading
+import utilities.AccountContext as AccountContext
+
+# Attempts botocore makes per call before giving up, throttling included
+DEFAULT_MAX_ATTEMPTS = 10
+
+# Operations a read-only pool refuses to send, by name prefix
+WRITE_OPERATION_PREFIXES = ('Put', 'Delete', 'Create', 'Restore', 'Copy', 'Upload', 'Complete', 'Abort')
+
+
+def _refuse_writes(model, **kwargs):
+    if model.name.startswith(WRITE_OPERATION_PREFIXES):
+        raise Exception("Refusing to call {} in a read-only run".format(model.name))
+
+
+class ClientPool(object):
+    '''
+    boto3 sessions and clients shared by a run, one session per profile and one client per
+    (service, profile, region). Nothing is imported or created until an AWS call is first
+    needed, so actions that stay offline never load boto3.
+
+    :param max_pool_connections: HTTP connections each client keeps open
+    :param rate_limiter: AdaptiveRateLimiter every S3 client takes its request tokens from
+    :param max_attempts: botocore attempts per call, retries included
+    :param stats: CallStats recording every call made through the pool's clients
+    :param read_only: clients refuse every call that would change something, before it is sent
+    '''
+
+    def __init__(self, max_pool_connections=10, rate_limiter=None, max_attempts=DEFAULT_MAX_ATTEMPTS, stats=None,
+                 read_only=False):
+        self.max_pool_connections = max_pool_connections
+        self.rate_limiter = rate_limiter
+        self.stats = stats
+        self.read_only = read_only
+        self.max_attempts = max_attempts
+        self._sessions = {}
+        self._clients = {}
+        # boto3 sessions are not thread safe; session and client creation is serialized
+        self._lock = threading.RLock()
+
+    def session(self, profile=None, role_arn=None):
+        '''
+        Returns the session of a profile, or of a role assumed with the profile's credentials
+        '''
+        with self._lock:
+            key = (profile, role_arn)
+            if key not in self._sessions:
+                import boto3
+                if role_arn is None:
+                    self._sessions[key] = boto3.Session(profile_name=profile)
+                else:
+                    self._sessions[key] = _assumed_role_session(self.session(profile), role_arn)
+            return self._sessions[key]
+
+    def client(self, service_name, profile=None, region=None, role_arn=None):
+        '''
+        Returns the client for a service, profile, region and role, created once per pool.
+        Clients are thread safe and their connection pool is sized for the fleet workers.
+        '''
+        with self._lock:
+            key = (service_name, profile, region, role_arn)
+            if key not in self._clients:
+                import botocore.config
+                config = botocore.config.Config(max_pool_connections=self.max_pool_connections,
+                                                retries={'max_attempts': self.max_attempts, 'mode': 'standard'})
+                client = self.session(profile, role_arn).client(service_name, region_name=region, config=config)
+                if self.rate_limiter is not None and service_name == 's3':
+                    self.rate_limiter.attach(client.meta.events)
+                if self.stats is not None:
+                    self.stats.attach(client.meta.events)
+                if self.read_only:
+                    client.meta.events.register('before-call', _refuse_writes)
+                self._clients[key] = client
+            return self._clients[key]
+
+
+class MemoryTransport(ClientPool):
+    '''
+    ClientPool whose clients are answered in memory by s3util.LocalAws instead of AWS, for
+    tests and benchmarks. Requests still go through botocore's serializer, parser, retries
+    and the pool's hooks; nothing leaves the process.
+
+    :param aws: LocalAws holding the buckets; by default an empty one
+    '''
+
+    def __init__(self, aws=None, **kwargs):
+        super(MemoryTransport, self).__init__(**kwargs)
+        if aws is None:
+            from s3util.LocalAws import LocalAws
+            aws = LocalAws()
+        self.aws = aws
+
+    def session(self, profile=None, role_arn=None):
+        with self._lock:
+            key = (profile, role_arn)
+            if key not in self._sessions:
+                import boto3
+                session = boto3.Session(aws_access_key_id='local', aws_secret_access_key='local',
+                                        region_name='us-east-1')
+                self.aws.install(session._session)
+                self._sessions[key] = session
+            return self._sessions[key]
+
+
+def _assumed_role_session(base_session, role_arn):
+    '''
+    A session whose credentials come from assuming role_arn with the base session's.
+    They are fetched on first use and refreshed before they expire, as botocore does for
+    profiles configured with role_arn, so runs may outlast the role's session duration.
+    '''
+    import boto3
+    import botocore.credentials
+    import botocore.session
+    fetcher = botocore.credentials.AssumeRoleCredentialFetcher(
+        client_creator=base_session._session.create_client,
+        source_credentials=base_session._session.get_credentials(),
+        role_arn=role_arn,
+        extra_args={'RoleSessionName': 's3-util'})
+    role_session = botocore.session.Session()
+    if base_session.region_name:
+        role_session.set_config_variable('region', base_session.region_name)
+    # botocore has no public setter for credentials that refresh themselves
+    role_session._credentials = botocore.credentials.DeferredRefreshableCredentials(
+        method='assume-role', refresh_using=fetcher.fetch_credentials)
+    return boto3.Session(botocore_session=role_session)
+
+
+class AwsSession(object):
+    '''
+    The clients of one profile, or of a role assumed from it, drawn from a ClientPool
+    that may be shared with other profiles.
+    '''
+
+    def __init__(self, profile=None, pool=None, identity_cache_ttl=0, role_arn=None):
+        self.profile = profile
+        self.role_arn = role_arn
+        self.pool = pool or ClientPool()
+        # Account ID and logging bucket names, resolved through STS once for the whole run
+        self.account = AccountContext.AccountContext(self, role_arn or profile, cache_ttl=identity_cache_ttl)
+
+    @property
+    def session(self):
+        return self.pool.session(self.profile, self.role_arn)
+
+    def client(self, service_name, region=None):
+        return self.pool.client(service_name, self.profile, region, self.role_arn)
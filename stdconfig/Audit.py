@@ -0,0 +1,119 @@
+import json
+import stdconfig.Template as Template
+import utilities.TagUtils as TagUtils
+
+# Every audit_* function checks the live configuration of a bucket, as returned by
+# S3Manager.fetch, against one standard rule and returns its violations. Nothing is
+# changed; the standard sections are rendered for the bucket the way Evaluation does.
+
+
+def _violation(rule, section, message, **details):
+    return dict(details, rule=rule, section=section, message=message)
+
+
+def _document(value):
+    # Sections may hold json text or the parsed document
+    try:
+        return json.loads(value)
+    except TypeError:
+        return value
+
+
+def audit_config(live, standardparameters, context):
+    '''
+    Checks a bucket's live configuration against every standard rule
+    :return list: violations, each a dict with rule, section and message
+    '''
+    standardparameters = Template.compile_standard(standardparameters)
+    violations = []
+    violations += audit_bucket_policy(live, standardparameters, context)
+    violations += audit_lifecycle_policy(live, standardparameters, context)
+    violations += audit_bucket_logging(live, standardparameters, context)
+    violations += audit_bucket_tags(live, standardparameters, context)
+    violations += audit_bucket_analytics_configuration(live, standardparameters, context)
+    violations += audit_bucket_metrics_configuration(live, standardparameters, context)
+    return violations
+
+
+def audit_bucket_policy(live, standardparameters, context):
+    '''Every Sid of the standard policy is present, unless the bucket carries its exception tag'''
+    if 'bucket-security-policy' not in standardparameters:
+        return []
+    policy = _document(live.get('bucket-security-policy')) or {'Statement': []}
+    existing_statements = set(statement['Sid'] for statement in policy['Statement'] if 'Sid' in statement)
+    tags = TagUtils.TagSet(live.get('bucket-tags', {}).get('TagSet', []))
+
+    standardpolicy = standardparameters.render('bucket-security-policy', bucket_name=live['bucket-name'],
+                                               account_id=context.account_id)
+    violations = []
+    for standardstatement in standardpolicy['Statement']:
+        sid = standardstatement.get('Sid')
+        if sid is None or sid in existing_statements:
+            continue
+        if sid == 'RequiredSecureTransport' and 'exception-https' in tags:
+            continue
+        if sid == 'RequiredEncryptedPutObject' and 'exception-encryption' in tags:
+            continue
+        violations.append(_violation('required-policy-statement', 'bucket-security-policy',
+                                     "Bucket policy has no {} statement".format(sid), sid=sid))
+    return violations
+
+
+def audit_lifecycle_policy(live, standardparameters, context):
+    '''An enabled lifecycle rule aborts incomplete multipart uploads'''
+    if 'life-cycle-rules' not in standardparameters:
+        return []
+    policy = _document(live.get('life-cycle-rules'))
+    if not policy:
+        return [_violation('lifecycle-rules', 'life-cycle-rules', "Bucket has no lifecycle configuration")]
+    if not any('AbortIncompleteMultipartUpload' in rule and rule.get('Status') == 'Enabled'
+               for rule in policy.get('Rules', [])):
+        return [_violation('abort-incomplete-multipart-upload', 'life-cycle-rules',
+                           "No enabled lifecycle rule aborts incomplete multipart uploads")]
+    return []
+
+
+def audit_bucket_logging(live, standardparameters, context):
+    '''Access logs go to the account's logging bucket for the region, under the standard prefix'''
+    if 'logging-rules' not in standardparameters:
+        # Logging buckets do not log themselves
+        return []
+    logging_rules = _document(live.get('logging-rules'))
+    if not logging_rules or 'LoggingEnabled' not in logging_rules:
+        return [_violation('logging-enabled', 'logging-rules', "Access logging is disabled")]
+    expected = standardparameters.render('logging-rules', bucket_name=live['bucket-name'],
+                                         logging_bucket_name=context.logging_bucket_name(live['region']))
+    violations = []
+    for field in ('TargetBucket', 'TargetPrefix'):
+        actual = logging_rules['LoggingEnabled'].get(field)
+        wanted = expected['LoggingEnabled'].get(field)
+        if wanted is not None and actual != wanted:
+            violations.append(_violation('logging-target', 'logging-rules',
+                                         "Logging {} is {} instead of {}".format(field, actual, wanted),
+                                         expected=wanted, actual=actual))
+    return violations
+
+
+def audit_bucket_tags(live, standardparameters, context):
+    '''Every tag of the standard TagSet is present with a value'''
+    if 'bucket-tags' not in standardparameters:
+        return []
+    tags = TagUtils.TagSet(live.get('bucket-tags', {}).get('TagSet', []))
+    standardtags = standardparameters.render('bucket-tags', bucket_name=live['bucket-name'])['TagSet']
+    return [_violation('required-tag', 'bucket-tags', "Required tag {} is missing".format(tag['Key']), tag=tag['Key'])
+            for tag in standardtags if not tags.get(tag['Key'])]
+
+
+def audit_bucket_analytics_configuration(live, standardparameters, context):
+    '''Storage class analysis is configured'''
+    if 'bucket-analytics' in standardparameters and not live.get('bucket-analytics'):
+        return [_violation('analytics-configuration', 'bucket-analytics',
+                           "Storage class analysis is not configured")]
+    return []
+
+
+def audit_bucket_metrics_configuration(live, standardparameters, context):
+    '''Request metrics are configured'''
+    if 'bucket-metrics' in standardparameters and not live.get('bucket-metrics'):
+        return [_violation('metrics-configuration', 'bucket-metrics', "Request metrics are not configured")]
+    return []
@@ -1,11 +1,32 @@
-import boto3
 import json
-import utilities.FileUtils as FileUtils
+import stdconfig.Template as Template
 import utilities.TagUtils as TagUtils
 
+# Every evaluate_* function takes the run's utilities.AccountContext.AccountContext,
+# which resolves the account ID once instead of calling STS per step, and only when a
+# standard section uses it. They only update parameters in memory; the caller persists
+# the result once.
+# standardparameters is a Template.StandardConfig (a loaded dict is compiled on use),
+# so placeholders are filled in by rendering rather than json text replacement.
 
 
-def evaluate_bucket_policy(parameters,standardparameters):
+def evaluate_config(parameters,standardparameters,context):
+    '''
+    Applies every standard configuration rule to the bucket parameters
+    :return dict: the evaluated parameters
+    '''
+    standardparameters = Template.compile_standard(standardparameters)
+    evaluate_bucket_tags(parameters, standardparameters, context)
+    evaluate_bucket_policy(parameters, standardparameters, context)
+    evaluate_lifecycle_policy(parameters, standardparameters, context)
+    evaluate_bucket_logging(parameters, standardparameters, context)
+    evaluate_bucket_analytics_configuration(parameters, standardparameters, context)
+    evaluate_bucket_metrics_configuration(parameters, standardparameters, context)
+    return parameters
+
+
+def evaluate_bucket_policy(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
 
     #Required policies
     RequiredSecureTransport = False
@@ -20,24 +41,20 @@ def evaluate_bucket_policy(parameters,standardparameters):
         value = '{"Version":"2012-10-17","Statement":[]}'
         policy = json.loads(value)
 
-    acct = boto3.client('sts').get_caller_identity().get('Account')
-    existing_statements = set()
-    for statement in policy['Statement']:
-        for attribute, value in statement.iteritems():
-            if attribute == 'Sid':
-                existing_statements.add(value)
-
-    for standardstatement in standardparameters['bucket-security-policy']['Statement']:
-        for attribute, value in standardstatement.iteritems():
-            if (attribute == 'Sid' and value not in existing_statements):
-                if (value == 'RequiredSecureTransport' and TagUtils.is_tag_in_tagset('exception-https', parameters['bucket-tags']['TagSet'])):
-                    continue
-                if (value == 'RequiredEncryptedPutObject' and TagUtils.is_tag_in_tagset('exception-encryption', parameters['bucket-tags']['TagSet'])):
-                    continue
-                value = json.dumps(standardstatement)
-                value = value.replace('STANDARD-CONFIG-BUCKET-NAME', parameters['bucket-name'])
-                value = value.replace('STANDARD-CONFIG-ACCOUNT-ID', acct)
-                policy['Statement'].append(json.loads(value))
+    existing_statements = set(statement['Sid'] for statement in policy['Statement'] if 'Sid' in statement)
+
+    standardpolicy = standardparameters.render('bucket-security-policy', bucket_name=parameters['bucket-name'],
+                                               **standardparameters.account_values('bucket-security-policy', context,
+                                                                                   parameters['region']))
+    tags = TagUtils.TagSet(parameters['bucket-tags']['TagSet'])
+    for standardstatement in standardpolicy['Statement']:
+        value = standardstatement.get('Sid')
+        if (value is not None and value not in existing_statements):
+            if (value == 'RequiredSecureTransport' and 'exception-https' in tags):
+                continue
+            if (value == 'RequiredEncryptedPutObject' and 'exception-encryption' in tags):
+                continue
+            policy['Statement'].append(standardstatement)
 
     # Only include bucket policy if there are any statements
     if len(policy['Statement']) > 0:
@@ -45,26 +62,20 @@ def evaluate_bucket_policy(parameters,standardparameters):
     else:
         parameters.pop('bucket-security-policy', None)
 
-    FileUtils.save_file(parameters)
-
-
-def evaluate_bucket_analytics_configuration(parameters,standardparameters):
-    # Get Profile Account Number
-    acct = boto3.client('sts').get_caller_identity().get('Account')
-    value = json.dumps(standardparameters['bucket-analytics'])
-    value = value.replace('STANDARD-CONFIG-BUCKET-NAME',parameters['bucket-name'])
-    logging_bucket_name = acct + '-bucket-logs-' + parameters['region']
-    value = value.replace('STANDARD-CONFIG-LOGGING-BUCKET-NAME', logging_bucket_name)
 
-    # No Storage
-    value = value.replace('null', '{}')
-    parameters['bucket-analytics'] = json.loads(value)
+def evaluate_bucket_analytics_configuration(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
 
-    FileUtils.save_file(parameters)
+    # Nulls (no storage class settings) are rendered as {}
+    parameters['bucket-analytics'] = standardparameters.render('bucket-analytics',
+                                                               bucket_name=parameters['bucket-name'],
+                                                               **standardparameters.account_values(
+                                                                   'bucket-analytics', context, parameters['region']))
 
 
-def evaluate_lifecycle_policy(parameters,standardparameters):
-    policy = {}
+def evaluate_lifecycle_policy(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
+    standardpolicy = standardparameters.render('life-cycle-rules', bucket_name=parameters['bucket-name'])
 
     if 'life-cycle-rules' in parameters:
         try:
@@ -72,22 +83,17 @@ def evaluate_lifecycle_policy(parameters,standardparameters):
         except TypeError:
             policy = parameters['life-cycle-rules']
     else:
-        value = json.dumps(standardparameters['life-cycle-rules']).replace('STANDARD-CONFIG-BUCKET-NAME'
-                                                                                 , parameters['bucket-name'])
-        policy = json.loads(value)
+        policy = standardpolicy
 
     # Test for multi-part upload policy
     if 'AbortIncompleteMultipartUpload' not in policy['Rules']:
-        value = json.dumps(standardparameters['life-cycle-rules']['Rules'][0]['AbortIncompleteMultipartUpload'])
-        value = value.replace('STANDARD-CONFIG-BUCKET-NAME',parameters['bucket-name'])
-        policy['Rules'][0]['AbortIncompleteMultipartUpload'] = json.loads(value)
+        policy['Rules'][0]['AbortIncompleteMultipartUpload'] = standardpolicy['Rules'][0]['AbortIncompleteMultipartUpload']
 
         parameters['life-cycle-rules'] = policy
 
-        FileUtils.save_file(parameters)
 
-
-def evaluate_bucket_logging(parameters,standardparameters):
+def evaluate_bucket_logging(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
     # If logging not enabled, apply standard logging
     if 'logging-rules' not in standardparameters:
         # Probably doing a logging bucket
@@ -96,44 +102,32 @@ def evaluate_bucket_logging(parameters,standardparameters):
 #    if 'logging-rules' not in parameters:
 # Always overwrite existing logging configuration
     if True:
-        acct = boto3.client('sts').get_caller_identity().get('Account')
-        logging_bucket_name = acct + '-bucket-logs-' + parameters['region']
-
-        value = json.dumps(standardparameters['logging-rules'])
-        value = value.replace('STANDARD-CONFIG-LOGGING-BUCKET-NAME', logging_bucket_name)
-        value = value.replace('STANDARD-CONFIG-BUCKET-NAME', parameters['bucket-name'])
+        parameters['logging-rules'] = standardparameters.render('logging-rules',
+                                                                bucket_name=parameters['bucket-name'],
+                                                                **standardparameters.account_values(
+                                                                    'logging-rules', context, parameters['region']))
 
-        parameters['logging-rules'] = json.loads(value)
 
-        FileUtils.save_file(parameters)
+def evaluate_bucket_tags(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
+    standardtags = standardparameters.render('bucket-tags', bucket_name=parameters['bucket-name'])['TagSet']
 
-
-def evaluate_bucket_tags(parameters,standardparameters):
-
-    # If logging not enabled, apply standard logging
+    # If no tags given, apply standard tags
     if 'bucket-tags' not in parameters:
         parameters['bucket-tags'] = {}
-        value = json.dumps(standardparameters['bucket-tags']['TagSet'])
-        policy = json.loads(value)
+        policy = standardtags
     else:
         # Add required Tags if Missing
         policy = parameters['bucket-tags']['TagSet']
-
-        for standard in standardparameters['bucket-tags']['TagSet']:
-            for tag in policy:
-                if standard['Key'] == tag['Key']:
-                    break
-            else:
-                policy.append(standard)
+        TagUtils.TagSet(policy).add_missing(standardtags)
 
     parameters['bucket-tags']['TagSet'] = policy
-    FileUtils.save_file(parameters)
 
 
-def evaluate_bucket_metrics_configuration(parameters,standardparameters):
+def evaluate_bucket_metrics_configuration(parameters,standardparameters,context):
+    standardparameters = Template.compile_standard(standardparameters)
     if 'bucket-metrics' not in parameters:
-        value = json.dumps(standardparameters['bucket-metrics'])
-        policy = json.loads(value)
-        parameters['bucket-metrics'] = policy
-    FileUtils.save_file(parameters)
+        parameters['bucket-metrics'] = standardparameters.render('bucket-metrics',
+                                                                 bucket_name=parameters['bucket-name'])
+
 
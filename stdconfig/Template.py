@@ -0,0 +1,151 @@
+import re
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+# Placeholder in a standard config -> keyword used to render it
+PLACEHOLDERS = {
+    'STANDARD-CONFIG-BUCKET-NAME': 'bucket_name',
+    'STANDARD-CONFIG-ACCOUNT-ID': 'account_id',
+    'STANDARD-CONFIG-LOGGING-BUCKET-NAME': 'logging_bucket_name',
+}
+
+_placeholder_re = re.compile('(' + '|'.join(sorted(PLACEHOLDERS, key=len, reverse=True)) + ')')
+
+# Keywords whose values come from the account, resolving its ID through STS
+ACCOUNT_VALUES = ('account_id', 'logging_bucket_name')
+
+
+def _placeholders(node):
+    # Keywords of the placeholders anywhere in a node
+    if isinstance(node, dict):
+        return set().union(*[_placeholders(value) for value in node.values()])
+    if isinstance(node, list):
+        return set().union(*[_placeholders(value) for value in node])
+    if isinstance(node, string_types):
+        return set(PLACEHOLDERS[name] for name in _placeholder_re.findall(node))
+    return set()
+
+
+def _compile(node, null_as_empty):
+    '''
+    Compiles a yaml/json node into (render, static). render(values) builds a fresh copy
+    of the node with placeholders substituted; static is True for scalars without any.
+    '''
+    if isinstance(node, dict):
+        children = [(key, _compile(value, null_as_empty)) for key, value in node.items()]
+        # Scalars without placeholders are copied from a prebuilt dict, only the
+        # remaining children are rendered per call
+        constant = dict((key, render(None)) for key, (render, static) in children if static)
+        dynamic = [(key, render) for key, (render, static) in children if not static]
+
+        def _render_dict(values):
+            rendered = dict(constant)
+            for key, render in dynamic:
+                rendered[key] = render(values)
+            return rendered
+        return _render_dict, False
+
+    if isinstance(node, list):
+        children = [_compile(value, null_as_empty) for value in node]
+        constant = [render(None) if static else None for render, static in children]
+        dynamic = [(i, render) for i, (render, static) in enumerate(children) if not static]
+
+        def _render_list(values):
+            rendered = list(constant)
+            for i, render in dynamic:
+                rendered[i] = render(values)
+            return rendered
+        return _render_list, False
+
+    if node is None and null_as_empty:
+        return (lambda values: {}), False
+
+    if isinstance(node, string_types):
+        pieces = _placeholder_re.split(node)
+        if len(pieces) > 1:
+            # Odd positions are placeholder names; unknown values are left in place
+            parts = [(piece, i % 2 == 1) for i, piece in enumerate(pieces) if piece]
+            return (lambda values: ''.join(values.get(PLACEHOLDERS[piece], piece) if is_placeholder else piece
+                                           for piece, is_placeholder in parts)), False
+
+    return (lambda values: node), True
+
+
+class Template(object):
+    '''
+    A config document compiled once, recording where each placeholder sits, so that
+    rendering it for a bucket is a structural copy with string substitution.
+    placeholders holds the keywords the document uses, e.g. {'bucket_name'}.
+    '''
+
+    def __init__(self, document, null_as_empty=False):
+        self.document = document
+        self.placeholders = _placeholders(document)
+        self._render, _ = _compile(document, null_as_empty)
+
+    def render(self, **values):
+        '''
+        Builds a new document with the given placeholders filled in,
+        e.g. render(bucket_name='my-bucket', account_id='123456789012')
+        '''
+        return self._render(values)
+
+
+class StandardConfig(object):
+    '''
+    A standard configuration with each section compiled into a Template. Reads behave
+    like the loaded yaml dict so it can be used wherever standardparameters was.
+    '''
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.sections = {}
+        for section, value in parameters.items():
+            # Storage class analysis with no settings is given as null but sent as {}
+            self.sections[section] = Template(value, null_as_empty=(section == 'bucket-analytics'))
+
+    def render(self, section, **values):
+        return self.sections[section].render(**values)
+
+    def account_values(self, section, context, region):
+        '''
+        The account specific values (account ID, logging bucket name) a section uses, so
+        the account ID is only resolved when a template needs it
+        :param context: AccountContext of the run
+        :return dict: keyword arguments for render
+        '''
+        placeholders = self.sections[section].placeholders
+        values = {}
+        if 'account_id' in placeholders:
+            values['account_id'] = context.account_id
+        if 'logging_bucket_name' in placeholders:
+            values['logging_bucket_name'] = context.logging_bucket_name(region)
+        return values
+
+    def uses_account(self):
+        '''
+        :return boolean: True if any section renders a value that comes from the account
+        '''
+        return any(name in template.placeholders for template in self.sections.values() for name in ACCOUNT_VALUES)
+
+    def __contains__(self, section):
+        return section in self.parameters
+
+    def __getitem__(self, section):
+        return self.parameters[section]
+
+    def get(self, section, default=None):
+        return self.parameters.get(section, default)
+
+
+def compile_standard(parameters):
+    '''
+    Compiles a loaded standard config; already compiled configs are returned as is
+    :return StandardConfig:
+    '''
+    if parameters is None or isinstance(parameters, StandardConfig):
+        return parameters
+    return StandardConfig(parameters)
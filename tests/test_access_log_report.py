@@ -0,0 +1,49 @@
+import unittest
+
+import utilities.AccessLogReport as AccessLogReport
+
+
+def bucket_with_keys(keys):
+    totals = AccessLogReport._new_bucket()
+    totals['keys'] = dict(keys)
+    totals['requests'] = sum(keys.values())
+    return {'bucket': totals}
+
+
+class TrimKeysTest(unittest.TestCase):
+    def setUp(self):
+        self.candidates = AccessLogReport.HOT_KEY_CANDIDATES
+        AccessLogReport.HOT_KEY_CANDIDATES = 2
+
+    def tearDown(self):
+        AccessLogReport.HOT_KEY_CANDIDATES = self.candidates
+
+    def test_trim_counts_dropped_requests(self):
+        aggregate = AccessLogReport._trim_keys(bucket_with_keys({'a': 5, 'b': 3, 'c': 2, 'd': 1}))
+        self.assertEqual(aggregate['bucket']['keys'], {'a': 5, 'b': 3})
+        self.assertEqual(aggregate['bucket']['dropped_key_requests'], 3)
+
+    def test_merge_sums_dropped_requests(self):
+        aggregate = AccessLogReport._trim_keys(bucket_with_keys({'a': 5, 'b': 3, 'c': 2}))
+        AccessLogReport.merge(aggregate, bucket_with_keys({'c': 4, 'd': 1, 'e': 1}))
+        totals = aggregate['bucket']
+        self.assertEqual(totals['keys'], {'a': 5, 'c': 4})
+        self.assertEqual(totals['dropped_key_requests'], 2 + 3 + 1 + 1)
+        self.assertEqual(sum(totals['keys'].values()) + totals['dropped_key_requests'], totals['requests'])
+
+    def test_merge_state_without_dropped_requests(self):
+        saved = bucket_with_keys({'a': 1})
+        del saved['bucket']['dropped_key_requests']
+        aggregate = bucket_with_keys({'a': 2})
+        AccessLogReport.merge(saved, aggregate)
+        self.assertEqual(saved['bucket']['dropped_key_requests'], 0)
+
+    def test_report_marks_lower_bounds(self):
+        aggregate = AccessLogReport._trim_keys(bucket_with_keys({'a': 5, 'b': 3, 'c': 2}))
+        self.assertIn('lower bounds: 2 requests', AccessLogReport.format_report(aggregate))
+        untrimmed = bucket_with_keys({'a': 5})
+        self.assertNotIn('lower bounds', AccessLogReport.format_report(untrimmed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import copy
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+import utilities.Journal as Journal
+from s3util.LocalAws import LocalAws
+from s3util.Manager import S3Manager
+from s3util.Session import MemoryTransport
+
+LIFECYCLE = {'Rules': [{'ID': 'abort-uploads', 'Status': 'Enabled', 'Filter': {'Prefix': ''},
+                        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}}]}
+TAGS = {'TagSet': [{'Key': 'env', 'Value': 'prod'}]}
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal_file = os.path.join(self.directory, 'journals', 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resumed_journal_holds_finished_steps(self):
+        journal = Journal.Journal(self.journal_file)
+        journal.record('bucket-a', 'planned', 'fp1', sections=['bucket-tags'])
+        journal.record('bucket-a', 'bucket-tags', 'fp1')
+        journal.close()
+
+        resumed = Journal.Journal(self.journal_file, resume=True)
+        self.assertEqual(resumed.completed('bucket-a', 'planned', 'fp1')['sections'], ['bucket-tags'])
+        self.assertIsNotNone(resumed.completed('bucket-a', 'bucket-tags', 'fp1'))
+        self.assertIsNone(resumed.completed('bucket-a', 'updated', 'fp1'))
+        self.assertIsNone(resumed.completed('bucket-b', 'bucket-tags', 'fp1'))
+        resumed.close()
+
+    def test_steps_only_count_for_their_fingerprint(self):
+        journal = Journal.Journal(self.journal_file)
+        journal.record('bucket-a', 'updated', 'fp1')
+        journal.close()
+        resumed = Journal.Journal(self.journal_file, resume=True)
+        self.assertIsNone(resumed.completed('bucket-a', 'updated', 'fp2'))
+        resumed.close()
+
+    def test_journal_starts_empty_without_resume(self):
+        journal = Journal.Journal(self.journal_file)
+        journal.record('bucket-a', 'created')
+        journal.close()
+        fresh = Journal.Journal(self.journal_file)
+        self.assertIsNone(fresh.completed('bucket-a', 'created'))
+        fresh.close()
+        self.assertEqual(os.path.getsize(self.journal_file), 0)
+
+    def test_line_cut_short_is_skipped(self):
+        journal = Journal.Journal(self.journal_file)
+        journal.record('bucket-a', 'created')
+        journal.close()
+        with open(self.journal_file, 'a') as journal_file:
+            journal_file.write('{"bucket": "bucket-b", "st')
+        resumed = Journal.Journal(self.journal_file, resume=True)
+        self.assertIsNotNone(resumed.completed('bucket-a', 'created'))
+        resumed.close()
+
+    def test_default_journal_is_kept_per_run(self):
+        run = ('update', '/configs/team-a', None, False, None, None)
+        path = Journal.default_journal_file(run, self.directory)
+        self.assertEqual(os.path.dirname(path), self.directory)
+        self.assertEqual(path, Journal.default_journal_file(run, self.directory))
+        for other in (('create',) + run[1:], ('update', '/configs/team-b') + run[2:], run[:4] + ('prod', None)):
+            self.assertNotEqual(path, Journal.default_journal_file(other, self.directory))
+
+
+class ResumeTest(unittest.TestCase):
+    '''An update interrupted part way is resumed from its journal'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal_file = os.path.join(self.directory, 'journal.jsonl')
+        self.fake = LocalAws()
+        self.fake.add_bucket('example-bucket', 'us-east-1')
+        self.config = {'bucket-name': 'example-bucket', 'region': 'us-east-1',
+                       'life-cycle-rules': LIFECYCLE, 'bucket-tags': TAGS}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _manager(self, resume):
+        journal = Journal.Journal(self.journal_file, resume=resume)
+        return S3Manager(pool=MemoryTransport(self.fake), journal=journal, output=self.directory,
+                         logger=logging.getLogger('test'))
+
+    def test_update_resumes_with_the_unfinished_sections(self):
+        manager = self._manager(resume=False)
+
+        def interrupted(parameters):
+            raise KeyboardInterrupt()
+        manager._apply_bucket_tags = interrupted
+        with self.assertRaises(KeyboardInterrupt):
+            manager.update(copy.deepcopy(self.config))
+        manager.journal.close()
+        self.assertEqual(self.fake.calls.get('PutBucketLifecycleConfiguration'), 1)
+
+        self.fake.calls.clear()
+        manager = self._manager(resume=True)
+        self.assertIsNot(manager.update(copy.deepcopy(self.config)), False)
+        manager.journal.close()
+        # Sections were planned before the interruption: nothing is fetched again and only the
+        # tags still to write are written
+        self.assertNotIn('PutBucketLifecycleConfiguration', self.fake.calls)
+        self.assertNotIn('GetBucketLifecycleConfiguration', self.fake.calls)
+        self.assertEqual(self.fake.calls.get('PutBucketTagging'), 1)
+
+        self.fake.calls.clear()
+        manager = self._manager(resume=True)
+        manager.update(copy.deepcopy(self.config))
+        manager.journal.close()
+        self.assertNotIn('PutBucketTagging', self.fake.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
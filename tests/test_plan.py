@@ -0,0 +1,122 @@
+import json
+import unittest
+import utilities.Plan as Plan
+
+POLICY = {
+    'Version': '2012-10-17',
+    'Statement': [
+        {'Sid': 'RequiredSecureTransport', 'Effect': 'Deny', 'Principal': '*', 'Action': 's3:*',
+         'Resource': ['arn:aws:s3:::example/*', 'arn:aws:s3:::example'],
+         'Condition': {'Bool': {'aws:SecureTransport': False}}},
+        {'Sid': 'RequiredEncryptedPutObject', 'Effect': 'Deny', 'Principal': '*', 'Action': 's3:PutObject',
+         'Resource': 'arn:aws:s3:::example/*',
+         'Condition': {'Null': {'s3:x-amz-server-side-encryption': True}}},
+    ],
+}
+
+LIFECYCLE = {
+    'Rules': [
+        {'ID': 'archive', 'Status': 'Enabled', 'Filter': {'Prefix': ''},
+         'Transitions': [{'Days': 365, 'StorageClass': 'GLACIER'}, {'Days': 30, 'StorageClass': 'STANDARD_IA'}]},
+        {'ID': 'abort-uploads', 'Status': 'Enabled', 'Filter': {'Prefix': ''},
+         'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}},
+    ],
+}
+
+TAGS = {'TagSet': [{'Key': 'team', 'Value': 'storage'}, {'Key': 'env', 'Value': 'prod'}]}
+
+
+def _config(**sections):
+    config = {'bucket-name': 'example', 'region': 'us-east-1'}
+    config.update(sections)
+    return config
+
+
+def _reversed(document, key):
+    document = dict(document)
+    document[key] = list(reversed(document[key]))
+    return document
+
+
+class DiffTest(unittest.TestCase):
+
+    def test_unchanged_config_has_no_changes(self):
+        config = _config(**{'bucket-security-policy': POLICY, 'life-cycle-rules': LIFECYCLE, 'bucket-tags': TAGS})
+        self.assertEqual(Plan.diff(config, config), [])
+
+    def test_key_order_is_ignored(self):
+        desired = _config(**{'bucket-security-policy': POLICY})
+        live = {'bucket-security-policy': json.loads(json.dumps(POLICY, sort_keys=True))}
+        reordered = dict(reversed(list(live['bucket-security-policy'].items())))
+        self.assertEqual(Plan.diff(desired, {'bucket-security-policy': reordered}), [])
+
+    def test_list_order_is_ignored(self):
+        desired = _config(**{'bucket-security-policy': POLICY, 'life-cycle-rules': LIFECYCLE, 'bucket-tags': TAGS})
+        transitions_reversed = [dict(rule, Transitions=list(reversed(rule['Transitions'])))
+                                if 'Transitions' in rule else rule for rule in LIFECYCLE['Rules']]
+        live = {
+            'bucket-security-policy': _reversed(POLICY, 'Statement'),
+            'life-cycle-rules': {'Rules': list(reversed(transitions_reversed))},
+            'bucket-tags': _reversed(TAGS, 'TagSet'),
+        }
+        self.assertEqual(Plan.diff(desired, live), [])
+
+    def test_policy_values_compare_as_s3_returns_them(self):
+        # S3 returns booleans as strings and a single value in place of a one item list
+        live_policy = json.loads(json.dumps(POLICY))
+        live_policy['Statement'][0]['Condition']['Bool']['aws:SecureTransport'] = 'false'
+        live_policy['Statement'][1]['Action'] = ['s3:PutObject']
+        self.assertEqual(Plan.diff(_config(**{'bucket-security-policy': POLICY}),
+                                   {'bucket-security-policy': live_policy}), [])
+
+    def test_json_string_section_matches_dict(self):
+        desired = _config(**{'bucket-security-policy': json.dumps(POLICY), 'life-cycle-rules': json.dumps(LIFECYCLE)})
+        live = {'bucket-security-policy': POLICY, 'life-cycle-rules': LIFECYCLE}
+        self.assertEqual(Plan.diff(desired, live), [])
+        self.assertEqual(Plan.diff(_config(**live), {'bucket-security-policy': json.dumps(POLICY),
+                                                     'life-cycle-rules': json.dumps(LIFECYCLE)}), [])
+
+    def test_json_string_change_is_loaded(self):
+        changed = _reversed(TAGS, 'TagSet')
+        changed['TagSet'] = changed['TagSet'] + [{'Key': 'owner', 'Value': 'ops'}]
+        changes = Plan.diff(_config(**{'bucket-tags': json.dumps(changed)}), {'bucket-tags': TAGS})
+        self.assertEqual([change.section for change in changes], ['bucket-tags'])
+        self.assertEqual(changes[0].desired, changed)
+        self.assertEqual(changes[0].live, TAGS)
+
+    def test_section_missing_from_live_bucket_is_a_change(self):
+        changes = Plan.diff(_config(**{'life-cycle-rules': LIFECYCLE, 'bucket-tags': TAGS}), {'bucket-tags': TAGS})
+        self.assertEqual([change.section for change in changes], ['life-cycle-rules'])
+        self.assertIsNone(changes[0].live)
+
+    def test_section_missing_from_desired_config_is_left_alone(self):
+        live = {'bucket-security-policy': POLICY, 'life-cycle-rules': LIFECYCLE, 'bucket-tags': TAGS}
+        self.assertEqual(Plan.diff(_config(**{'bucket-tags': TAGS}), live), [])
+
+    def test_empty_tags_are_not_a_change(self):
+        desired = {'TagSet': TAGS['TagSet'] + [{'Key': 'cost-centre', 'Value': ''}]}
+        self.assertEqual(Plan.diff(_config(**{'bucket-tags': desired}), {'bucket-tags': TAGS}), [])
+
+    def test_changed_values_are_reported_in_apply_order(self):
+        live_lifecycle = json.loads(json.dumps(LIFECYCLE))
+        live_lifecycle['Rules'][1]['AbortIncompleteMultipartUpload']['DaysAfterInitiation'] = 1
+        live_policy = {'Version': '2012-10-17', 'Statement': POLICY['Statement'][:1]}
+        changes = Plan.diff(_config(**{'life-cycle-rules': LIFECYCLE, 'bucket-security-policy': POLICY}),
+                            {'life-cycle-rules': live_lifecycle, 'bucket-security-policy': live_policy})
+        self.assertEqual([change.section for change in changes], ['bucket-security-policy', 'life-cycle-rules'])
+
+
+class FormatPlanTest(unittest.TestCase):
+
+    def test_no_changes(self):
+        self.assertEqual(Plan.format_plan(_config(), []), 'example (us-east-1): no changes')
+
+    def test_changes_are_shown_as_a_diff(self):
+        plan = Plan.format_plan(_config(), Plan.diff(_config(**{'bucket-tags': TAGS}), {}))
+        self.assertIn('1 section(s) to change', plan)
+        self.assertIn('~ bucket-tags', plan)
+        self.assertIn('    +- Key: team', plan.splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
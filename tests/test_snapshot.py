@@ -0,0 +1,88 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import utilities.Snapshot as Snapshot
+
+SECURE_POLICY = {'Version': '2012-10-17', 'Statement': [
+    {'Sid': 'RequiredSecureTransport', 'Effect': 'Deny'}, {'Sid': 'RequiredEncryptedPutObject', 'Effect': 'Deny'}]}
+
+
+def _state(name, region='us-east-1', tags=None, policy=None, lifecycle=None):
+    state = {'bucket-name': name, 'region': region}
+    if tags is not None:
+        state['bucket-tags'] = {'TagSet': [{'Key': key, 'Value': value} for key, value in sorted(tags.items())]}
+    if policy is not None:
+        state['bucket-security-policy'] = policy
+    if lifecycle is not None:
+        state['life-cycle-rules'] = lifecycle
+    return state
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot = Snapshot.Snapshot(os.path.join(self.directory, 'snapshot.db'))
+        for state in (
+                _state('alpha', tags={'team': 'storage', 'env': 'prod'}, policy=SECURE_POLICY,
+                       lifecycle={'Rules': [{'ID': 'r', 'Status': 'Enabled'}]}),
+                _state('bravo', 'eu-west-1', tags={'team': 'web', 'env': 'dev'},
+                       policy={'Statement': [{'Sid': 'RequiredSecureTransport', 'Effect': 'Deny'}]}),
+                _state('charlie', 'eu-west-1', tags={'env': 'prod'}),
+                _state('delta')):
+            self.snapshot.store(state, Snapshot.SECTIONS, 1000.0)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.directory)
+
+    def test_every_bucket_without_conditions(self):
+        self.assertEqual(self.snapshot.query(), ['alpha', 'bravo', 'charlie', 'delta'])
+
+    def test_tags(self):
+        self.assertEqual(self.snapshot.query(has_tags=['team']), ['alpha', 'bravo'])
+        self.assertEqual(self.snapshot.query(has_tags=['env=prod']), ['alpha', 'charlie'])
+        self.assertEqual(self.snapshot.query(missing_tags=['team']), ['charlie', 'delta'])
+        self.assertEqual(self.snapshot.query(has_tags=['env=prod'], missing_tags=['team']), ['charlie'])
+        self.assertEqual(self.snapshot.query(has_tags=['env=staging']), [])
+
+    def test_policy_sids(self):
+        self.assertEqual(self.snapshot.query(has_sids=['RequiredSecureTransport']), ['alpha', 'bravo'])
+        self.assertEqual(self.snapshot.query(missing_sids=['RequiredEncryptedPutObject']),
+                         ['bravo', 'charlie', 'delta'])
+
+    def test_missing_sections_and_regions(self):
+        self.assertEqual(self.snapshot.query(missing_sections=['life-cycle-rules']), ['bravo', 'charlie', 'delta'])
+        self.assertEqual(self.snapshot.query(regions=['eu-west-1']), ['bravo', 'charlie'])
+        self.assertEqual(self.snapshot.query(regions=['eu-west-1'], missing_sections=['bucket-security-policy']),
+                         ['charlie'])
+
+    def test_refetched_sections_replace_the_old_ones(self):
+        self.snapshot.store(_state('alpha', tags={'team': 'storage'}), ['bucket-tags'], 2000.0)
+        self.assertEqual(self.snapshot.query(has_tags=['env=prod']), ['charlie'])
+        # Sections not fetched again are kept
+        self.assertEqual(self.snapshot.query(has_sids=['RequiredEncryptedPutObject']), ['alpha'])
+
+    def test_stale_sections(self):
+        self.snapshot.store(_state('alpha'), ['bucket-tags'], 5000.0)
+        stale = self.snapshot.stale_sections(['alpha', 'echo'], max_age=100, now=5050.0)
+        self.assertEqual(stale['alpha'], [section for section in Snapshot.SECTIONS if section != 'bucket-tags'])
+        self.assertEqual(stale['echo'], list(Snapshot.SECTIONS))
+        self.assertEqual(self.snapshot.stale_sections(['alpha'], max_age=0), {'alpha': list(Snapshot.SECTIONS)})
+
+    def test_remove_missing(self):
+        self.assertEqual(self.snapshot.remove_missing(['alpha', 'charlie']), ['bravo', 'delta'])
+        self.assertEqual(self.snapshot.query(), ['alpha', 'charlie'])
+        self.assertEqual(self.snapshot.query(has_tags=['team']), ['alpha'])
+
+    def test_sql_is_read_only(self):
+        rows = list(self.snapshot.sql('SELECT region, COUNT(*) AS buckets FROM buckets GROUP BY region ORDER BY region'))
+        self.assertEqual(rows, [{'region': 'eu-west-1', 'buckets': 2}, {'region': 'us-east-1', 'buckets': 2}])
+        with self.assertRaises(sqlite3.Error):
+            list(self.snapshot.sql('DELETE FROM buckets'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import os
+import unittest
+import yaml
+import stdconfig.Template as Template
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+VALUES = {'bucket_name': 'example-bucket', 'account_id': '123456789012',
+          'logging_bucket_name': '123456789012-bucket-logs-us-east-1'}
+
+
+def _load_standard(name):
+    with open(os.path.join(ROOT, name), 'r') as standard_file:
+        return yaml.safe_load(standard_file)
+
+
+def _render_round_trip(section, values):
+    # How sections were rendered before templates were compiled
+    value = json.dumps(section)
+    for placeholder, name in Template.PLACEHOLDERS.items():
+        if name in values:
+            value = value.replace(placeholder, values[name])
+    return json.loads(value)
+
+
+class TemplateTest(unittest.TestCase):
+
+    def test_standard_configs_render_as_the_json_round_trip(self):
+        for name in ('standard-config.yml', 'standard-logging-config.yml'):
+            standard = _load_standard(name)
+            compiled = Template.compile_standard(standard)
+            for section, document in standard.items():
+                if document is None:
+                    continue
+                self.assertEqual(compiled.render(section, **VALUES), _render_round_trip(document, VALUES),
+                                 '{} {}'.format(name, section))
+
+    def test_placeholders_inside_strings(self):
+        template = Template.Template({'Resource': ['arn:aws:s3:::STANDARD-CONFIG-BUCKET-NAME/*',
+                                                   'arn:aws:s3:::STANDARD-CONFIG-LOGGING-BUCKET-NAME'],
+                                      'Account': 'STANDARD-CONFIG-ACCOUNT-ID', 'Effect': 'Deny', 'Days': 7})
+        self.assertEqual(template.render(**VALUES),
+                         {'Resource': ['arn:aws:s3:::example-bucket/*',
+                                       'arn:aws:s3:::123456789012-bucket-logs-us-east-1'],
+                          'Account': '123456789012', 'Effect': 'Deny', 'Days': 7})
+
+    def test_placeholders_without_a_value_are_left_in_place(self):
+        document = {'TargetBucket': 'STANDARD-CONFIG-LOGGING-BUCKET-NAME', 'TargetPrefix': 'STANDARD-CONFIG-BUCKET-NAME/'}
+        rendered = Template.Template(document).render(bucket_name='example-bucket')
+        self.assertEqual(rendered, _render_round_trip(document, {'bucket_name': 'example-bucket'}))
+        self.assertEqual(rendered['TargetBucket'], 'STANDARD-CONFIG-LOGGING-BUCKET-NAME')
+
+    def test_every_render_is_a_new_document(self):
+        document = {'TagSet': [{'Key': 'name', 'Value': 'STANDARD-CONFIG-BUCKET-NAME'}, {'Key': 'env', 'Value': 'prod'}],
+                    'Static': {'Nested': ['a', 'b']}}
+        template = Template.Template(document)
+        first = template.render(bucket_name='first')
+        first['TagSet'].append({'Key': 'added', 'Value': 'x'})
+        first['Static']['Nested'].append('c')
+        second = template.render(bucket_name='second')
+        self.assertEqual(second, {'TagSet': [{'Key': 'name', 'Value': 'second'}, {'Key': 'env', 'Value': 'prod'}],
+                                  'Static': {'Nested': ['a', 'b']}})
+        self.assertEqual(document['TagSet'][0]['Value'], 'STANDARD-CONFIG-BUCKET-NAME')
+
+    def test_null_analytics_renders_as_empty(self):
+        compiled = Template.compile_standard({'bucket-analytics': None, 'bucket-metrics': None})
+        self.assertEqual(compiled.render('bucket-analytics', **VALUES), {})
+        self.assertIsNone(compiled.render('bucket-metrics', **VALUES))
+
+    def test_standard_config_reads_like_the_loaded_dict(self):
+        standard = _load_standard('standard-config.yml')
+        compiled = Template.compile_standard(standard)
+        self.assertIs(Template.compile_standard(compiled), compiled)
+        self.assertIsNone(Template.compile_standard(None))
+        for section in standard:
+            self.assertIn(section, compiled)
+            self.assertEqual(compiled[section], standard[section])
+        self.assertNotIn('no-such-section', compiled)
+        self.assertEqual(compiled.get('no-such-section', 'default'), 'default')
+
+
+class UnresolvedAccount(object):
+    '''AccountContext stand-in failing any use, as an STS call would be'''
+
+    @property
+    def account_id(self):
+        raise AssertionError("account ID resolved")
+
+    def logging_bucket_name(self, region):
+        raise AssertionError("logging bucket name resolved")
+
+
+class StaticAccount(object):
+    account_id = '123456789012'
+
+    def logging_bucket_name(self, region):
+        return self.account_id + '-bucket-logs-' + region
+
+
+class AccountValuesTest(unittest.TestCase):
+
+    def test_placeholders_used(self):
+        template = Template.Template({'Statement': [{'Resource': 'arn:aws:s3:::STANDARD-CONFIG-BUCKET-NAME/*'},
+                                                    {'Account': 'STANDARD-CONFIG-ACCOUNT-ID'}]})
+        self.assertEqual(template.placeholders, set(['bucket_name', 'account_id']))
+        self.assertEqual(Template.Template({'Days': 7}).placeholders, set())
+
+    def test_shipped_standard_config_uses_the_account(self):
+        self.assertTrue(Template.compile_standard(_load_standard('standard-config.yml')).uses_account())
+
+    def test_account_is_only_resolved_for_sections_using_it(self):
+        compiled = Template.compile_standard({
+            'bucket-security-policy': {'Statement': [{'Sid': 'x', 'Resource': 'arn:aws:s3:::STANDARD-CONFIG-BUCKET-NAME'}]},
+            'logging-rules': {'LoggingEnabled': {'TargetBucket': 'STANDARD-CONFIG-LOGGING-BUCKET-NAME',
+                                                 'TargetPrefix': 'STANDARD-CONFIG-BUCKET-NAME/'}},
+        })
+        self.assertTrue(compiled.uses_account())
+        self.assertEqual(compiled.account_values('bucket-security-policy', UnresolvedAccount(), 'us-east-1'), {})
+        self.assertEqual(compiled.account_values('logging-rules', StaticAccount(), 'eu-west-1'),
+                         {'logging_bucket_name': '123456789012-bucket-logs-eu-west-1'})
+
+    def test_evaluation_without_account_placeholders_never_resolves_the_account(self):
+        import stdconfig.Evaluation as Evaluation
+        standard = {
+            'bucket-security-policy': {'Version': '2012-10-17', 'Statement': [
+                {'Sid': 'RequiredSecureTransport', 'Effect': 'Deny', 'Resource': 'arn:aws:s3:::STANDARD-CONFIG-BUCKET-NAME/*'}]},
+            'life-cycle-rules': {'Rules': [{'ID': 'STANDARD-CONFIG-BUCKET-NAME', 'Status': 'Enabled',
+                                            'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}}]},
+            'bucket-tags': {'TagSet': [{'Key': 'name', 'Value': 'STANDARD-CONFIG-BUCKET-NAME'}]},
+            'bucket-analytics': None,
+            'bucket-metrics': {'Id': 'EntireBucket'},
+        }
+        self.assertFalse(Template.compile_standard(standard).uses_account())
+        evaluated = Evaluation.evaluate_config({'bucket-name': 'example-bucket', 'region': 'us-east-1'}, standard,
+                                               UnresolvedAccount())
+        self.assertEqual(evaluated['bucket-security-policy']['Statement'][0]['Resource'],
+                         'arn:aws:s3:::example-bucket/*')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import yaml
+import stdconfig.Evaluation as Evaluation
+import utilities.Validation as Validation
+from utilities.ConfigCache import ConfigCache
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class StaticAccount(object):
+    '''Stands in for AccountContext without calling STS'''
+    account_id = '123456789012'
+
+    def logging_bucket_name(self, region):
+        return self.account_id + '-bucket-logs-' + region
+
+
+def _config(**sections):
+    config = {'bucket-name': 'example-bucket', 'region': 'us-east-1'}
+    config.update(sections)
+    return config
+
+
+class SchemaTest(unittest.TestCase):
+
+    def assertValid(self, config):
+        self.assertEqual(Validation.config_errors(config), [])
+
+    def assertInvalid(self, config, location):
+        errors = Validation.config_errors(config)
+        # Errors are reported at the path of the failing node, e.g. bucket-tags.TagSet
+        paths = [error.split(':', 1)[0] for error in errors]
+        self.assertTrue(any(path == location or path.startswith(location + '.') for path in paths), errors)
+
+    def test_minimal_config(self):
+        self.assertValid(_config())
+
+    def test_evaluated_standard_config(self):
+        with open(os.path.join(ROOT, 'standard-config.yml'), 'r') as standard_file:
+            standard = yaml.safe_load(standard_file)
+        self.assertValid(Evaluation.evaluate_config(_config(), standard, StaticAccount()))
+
+    def test_sections_given_as_json_strings(self):
+        policy = {'Version': '2012-10-17', 'Statement': [{'Sid': 'Deny', 'Effect': 'Deny', 'Principal': '*',
+                                                          'Action': 's3:*', 'Resource': 'arn:aws:s3:::example-bucket'}]}
+        lifecycle = {'Rules': [{'ID': 'abort', 'Status': 'Enabled', 'Filter': {'Prefix': ''},
+                                'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}}]}
+        self.assertValid(_config(**{'bucket-security-policy': json.dumps(policy),
+                                    'life-cycle-rules': json.dumps(lifecycle),
+                                    'bucket-tags': {'TagSet': json.dumps([{'Key': 'env', 'Value': 'prod'}])}}))
+
+    def test_bucket_names(self):
+        for name in ('abc', 'example-bucket', 'logs.example.com', '123456789012-bucket-logs-us-east-1', 'a' * 63):
+            self.assertValid(_config(**{'bucket-name': name}))
+        for name in ('ab', 'a' * 64, 'Example-Bucket', 'example_bucket', '-example', 'example-', '.example',
+                     'example bucket'):
+            self.assertInvalid(_config(**{'bucket-name': name}), 'bucket-name')
+
+    def test_required_fields(self):
+        self.assertInvalid({'region': 'us-east-1'}, '(root)')
+        self.assertInvalid({'bucket-name': 'example-bucket'}, '(root)')
+        self.assertInvalid(_config(**{'bucket-tags': {}}), 'bucket-tags')
+        self.assertInvalid(_config(**{'bucket-analytics': {'StorageClassAnalysis': {}}}), 'bucket-analytics')
+
+    def test_policy_statements(self):
+        self.assertInvalid(_config(**{'bucket-security-policy': {'Statement': [{'Sid': 'x', 'Effect': 'Maybe'}]}}),
+                           'bucket-security-policy')
+        self.assertInvalid(_config(**{'bucket-security-policy': {'Version': '2012-10-17'}}), 'bucket-security-policy')
+
+    def test_lifecycle_rules(self):
+        rule = {'ID': 'archive', 'Status': 'Enabled', 'Transitions': [{'Days': 30, 'StorageClass': 'GLACIER'}]}
+        self.assertValid(_config(**{'life-cycle-rules': {'Rules': [rule]}}))
+        for bad in (dict(rule, Status='On'), dict(rule, Expiration={'Days': 0}),
+                    dict(rule, Transitions=[{'Days': 30, 'StorageClass': 'TAPE'}]),
+                    dict(rule, AbortIncompleteMultipartUpload={})):
+            self.assertInvalid(_config(**{'life-cycle-rules': {'Rules': [bad]}}), 'life-cycle-rules')
+        self.assertInvalid(_config(**{'life-cycle-rules': {'Rules': []}}), 'life-cycle-rules')
+
+    def test_tags(self):
+        self.assertValid(_config(**{'bucket-tags': {'TagSet': [{'Key': 'env', 'Value': ''}]}}))
+        for tag in ({'Key': '', 'Value': 'x'}, {'Key': 'k' * 129, 'Value': 'x'}, {'Key': 'env'},
+                    {'Key': 'env', 'Value': 'v' * 257}):
+            self.assertInvalid(_config(**{'bucket-tags': {'TagSet': [tag]}}), 'bucket-tags')
+
+    def test_logging_target(self):
+        self.assertInvalid(_config(**{'logging-rules': {'LoggingEnabled': {'TargetBucket': 'logs'}}}), 'logging-rules')
+
+    def test_schema_version_follows_the_schema(self):
+        schema = copy.deepcopy(Validation.SCHEMA)
+        schema['properties']['bucket-name']['maxLength'] = 255
+        self.assertNotEqual(Validation.SCHEMA_VERSION,
+                            Validation.hashlib.sha256(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest())
+
+
+class ParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as config_file:
+            config_file.write(text)
+        return path
+
+    def test_parse_config(self):
+        self.assertEqual(Validation.parse_config(b'bucket-name: example-bucket\nregion: us-east-1\n'),
+                         (_config(), []))
+        parameters, errors = Validation.parse_config(b'bucket-name: [unclosed\n')
+        self.assertIsNone(parameters)
+        self.assertTrue(errors[0].startswith('cannot load:'), errors)
+
+    def test_validate_files_reports_each_file(self):
+        good = self._write('good.yml', 'bucket-name: example-bucket\nregion: us-east-1\n')
+        bad = self._write('bad.yml', 'bucket-name: Bad_Name\nregion: us-east-1\n')
+        missing = os.path.join(self.directory, 'missing.yml')
+        results = dict(Validation.validate_files([good, bad, missing], 1))
+        self.assertEqual(results[good], [])
+        self.assertEqual(len(results[bad]), 1)
+        self.assertTrue(results[missing][0].startswith('cannot load:'), results[missing])
+
+    def test_cached_results_match_parsed_ones(self):
+        good = self._write('good.yml', 'bucket-name: example-bucket\nregion: us-east-1\n')
+        bad = self._write('bad.yml', 'bucket-name: Bad_Name\nregion: us-east-1\n')
+        cache = ConfigCache(os.path.join(self.directory, 'cache.json'), Validation.SCHEMA_VERSION)
+        parsed = dict(Validation.validate_files([good, bad], 1, cache))
+        self.assertEqual(sorted(cache.entries), sorted(os.path.abspath(path) for path in (good, bad)))
+        self.assertEqual(dict(Validation.validate_files([good, bad], 1, cache)), parsed)
+        self.assertEqual(Validation.load_config(good, cache), (_config(), []))
+
+
+if __name__ == '__main__':
+    unittest.main()
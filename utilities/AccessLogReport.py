@@ -0,0 +1,256 @@
+import calendar
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import utilities.FileUtils as FileUtils
+from concurrent.futures import ProcessPoolExecutor
+
+# bucket_owner bucket [time] remote_ip requester request_id operation key "request_uri" status error_code bytes_sent ...
+# Only the fields the report uses are captured; lines that do not match are skipped.
+LOG_LINE = re.compile(br'^\S+ (\S+) \[(\d\d/\w{3}/\d{4}:\d\d):\S+ [^\]]*\] \S+ \S+ \S+ (\S+) (\S+) "[^"]*" (\d{3}|-) (\S+) (\S+)',
+                      re.MULTILINE)
+
+MONTHS = dict((name, number) for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1))
+
+# Keys counted per bucket are cut back to this many after every file and merge, so memory
+# stays bounded however long the tail. A key cut and seen again counts from zero, so hot key
+# counts are lower bounds; the requests cut are kept per bucket as dropped_key_requests.
+HOT_KEY_CANDIDATES = 1000
+
+DEFAULT_PREFIX_DEPTH = 1
+DEFAULT_TOP = 10
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace')
+
+
+def _hour(stamp, hours):
+    # '06/Feb/2019:00' -> epoch seconds of the hour, cached as log files repeat the same few hours
+    hour = hours.get(stamp)
+    if hour is None:
+        day, month, rest = stamp.split(b'/')
+        year, clock = rest.split(b':')
+        hour = hours[stamp] = calendar.timegm((int(year), MONTHS[_text(month)], int(day), int(clock), 0, 0))
+    return hour
+
+
+def _prefix(key, depth):
+    parts = key.split('/', depth)
+    return '/'.join(parts[:depth]) + '/' if len(parts) > depth else ''
+
+
+def new_aggregate():
+    '''
+    Totals of one or more access log files, keyed by bucket. Plain dicts with string keys,
+    so workers can hand them back across processes and --log-state can save them as json.
+    :return dict:
+    '''
+    return {}
+
+
+def _new_bucket():
+    return {'requests': 0, 'client_errors': 0, 'server_errors': 0, 'bytes': 0,
+            'hours': {}, 'operations': {}, 'error_codes': {}, 'prefixes': {}, 'keys': {}, 'dropped_key_requests': 0}
+
+
+def add_matches(aggregate, matches, prefix_depth=DEFAULT_PREFIX_DEPTH):
+    '''
+    Adds the LOG_LINE matches of one log file to the aggregate
+    '''
+    hours = {}
+    for match in matches:
+        bucket_name, stamp, operation, key, status, error_code, bytes_sent = match.groups()
+        bucket_name = _text(bucket_name)
+        totals = aggregate.get(bucket_name)
+        if totals is None:
+            totals = aggregate[bucket_name] = _new_bucket()
+        sent = int(bytes_sent) if bytes_sent.isdigit() else 0
+        failed = status[:1] in (b'4', b'5')
+        totals['requests'] += 1
+        totals['bytes'] += sent
+        if failed:
+            totals['client_errors' if status[:1] == b'4' else 'server_errors'] += 1
+            error_code = _text(error_code)
+            totals['error_codes'][error_code] = totals['error_codes'].get(error_code, 0) + 1
+        hour = str(_hour(stamp, hours))
+        totals['hours'][hour] = totals['hours'].get(hour, 0) + 1
+        operation = _text(operation)
+        totals['operations'][operation] = totals['operations'].get(operation, 0) + 1
+        # Bucket level requests log '-' as the key
+        key = _text(key) if key != b'-' else ''
+        prefix_name = _prefix(key, prefix_depth)
+        prefix = totals['prefixes'].get(prefix_name)
+        if prefix is None:
+            prefix = totals['prefixes'][prefix_name] = [0, 0, 0]
+        prefix[0] += 1
+        prefix[1] += failed
+        prefix[2] += sent
+        if key:
+            totals['keys'][key] = totals['keys'].get(key, 0) + 1
+    return aggregate
+
+
+def _trim_keys(aggregate):
+    for totals in aggregate.values():
+        if len(totals['keys']) > HOT_KEY_CANDIDATES:
+            ranked = sorted(totals['keys'].items(), key=lambda item: -item[1])
+            totals['keys'] = dict(ranked[:HOT_KEY_CANDIDATES])
+            totals['dropped_key_requests'] = totals.get('dropped_key_requests', 0) + sum(
+                count for key, count in ranked[HOT_KEY_CANDIDATES:])
+    return aggregate
+
+
+def _add_counts(mine, other):
+    for name, count in other.items():
+        mine[name] = mine.get(name, 0) + count
+
+
+def merge(aggregate, other):
+    for bucket_name, totals in other.items():
+        mine = aggregate.get(bucket_name)
+        if mine is None:
+            aggregate[bucket_name] = totals
+            continue
+        for field in ('requests', 'client_errors', 'server_errors', 'bytes'):
+            mine[field] += totals[field]
+        # Saved by --log-state before dropped keys were counted
+        mine['dropped_key_requests'] = mine.get('dropped_key_requests', 0) + totals.get('dropped_key_requests', 0)
+        for field in ('hours', 'operations', 'error_codes', 'keys'):
+            _add_counts(mine[field], totals[field])
+        for name, counts in totals['prefixes'].items():
+            prefix = mine['prefixes'].setdefault(name, [0, 0, 0])
+            for i in range(3):
+                prefix[i] += counts[i]
+    return _trim_keys(aggregate)
+
+
+def read_file(path, prefix_depth=DEFAULT_PREFIX_DEPTH):
+    '''
+    Aggregates one log file. The file is memory mapped and scanned in place, so no
+    line is copied out of it unless it matches.
+    :return dict: aggregate
+    '''
+    aggregate = new_aggregate()
+    with open(path, 'rb') as log_file:
+        if os.fstat(log_file.fileno()).st_size == 0:
+            return aggregate
+        mapped = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            add_matches(aggregate, LOG_LINE.finditer(mapped), prefix_depth)
+        finally:
+            mapped.close()
+    return _trim_keys(aggregate)
+
+
+def _read_files(batch):
+    paths, prefix_depth = batch
+    aggregate = new_aggregate()
+    for path in paths:
+        merge(aggregate, read_file(path, prefix_depth))
+    return aggregate
+
+
+def log_files(directory, processed=None):
+    '''
+    Finds the log files under a directory laid out like the logging bucket, one folder per
+    bucket. S3 names log files by delivery time, so within a folder anything sorting after
+    the last processed name is new.
+    :param processed: folder -> relative path of the last file already read
+    :return list: (path, folder, relative path), sorted
+    '''
+    processed = processed or {}
+    files = []
+    for root, dirs, names in os.walk(directory):
+        # _analytics/ holds the Storage Class Analysis exports, not logs
+        dirs[:] = sorted(name for name in dirs if not name.startswith(('.', '_')))
+        for name in sorted(names):
+            # .part files are downloads still in progress, or left by a killed run
+            if name.startswith('.') or name.endswith('.part'):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            folder = relative.split('/', 1)[0] if '/' in relative else ''
+            if relative > processed.get(folder, ''):
+                files.append((path, folder, relative))
+    return files
+
+
+def read_directory(directory, workers, prefix_depth=DEFAULT_PREFIX_DEPTH, processed=None):
+    '''
+    Aggregates the log files under a directory that are newer than processed, spreading
+    them across a process pool; only the aggregates come back from the workers
+    :return tuple: (aggregate, processed updated with the files read)
+    '''
+    files = log_files(directory, processed)
+    processed = dict(processed or {})
+    for path, folder, relative in files:
+        processed[folder] = max(relative, processed.get(folder, ''))
+    paths = [path for path, folder, relative in files]
+    workers = min(workers, multiprocessing.cpu_count(), len(paths))
+    if workers <= 1:
+        return _read_files((paths, prefix_depth)), processed
+    # Round robin, so each worker gets a share of every folder
+    batches = [(paths[i::workers], prefix_depth) for i in range(workers)]
+    aggregate = new_aggregate()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_read_files, batches):
+            merge(aggregate, partial)
+    return aggregate, processed
+
+
+def load_state(state_file):
+    '''
+    :return dict: {'processed': folder -> last file read, 'aggregate': totals so far}
+    '''
+    if not os.path.exists(state_file):
+        return {'processed': {}, 'aggregate': new_aggregate()}
+    with open(state_file, 'r') as saved:
+        return json.load(saved)
+
+
+def save_state(state_file, state):
+    FileUtils.atomic_write(state_file, lambda saved: json.dump(state, saved, sort_keys=True))
+
+
+def _top(counts, top):
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top]
+
+
+def format_report(aggregate, top=DEFAULT_TOP):
+    '''
+    :return string: per bucket, request rates, errors and bytes sent, then the busiest
+                    prefixes and the hottest keys
+    '''
+    lines = []
+    for bucket_name in sorted(aggregate):
+        totals = aggregate[bucket_name]
+        hours = [int(hour) for hour in totals['hours']]
+        # Rates are taken over the hours the logs cover, first to last
+        span = (max(hours) - min(hours) + 3600) if hours else 3600
+        requests = totals['requests']
+        errors = totals['client_errors'] + totals['server_errors']
+        lines.append("{}: {} requests over {:.1f} days, {:.3f}/s average, {:.3f}/s busiest hour, "
+                     "{:.1%} errors (4xx {}, 5xx {}), {:.2f} GB sent".format(
+                         bucket_name, requests, span / 86400.0, requests / float(span),
+                         max(totals['hours'].values() or [0]) / 3600.0, errors / float(requests or 1),
+                         totals['client_errors'], totals['server_errors'], totals['bytes'] / 1024.0 ** 3))
+        lines.append("    operations   {}".format(', '.join(
+            "{} {}".format(name, count) for name, count in _top(totals['operations'], top))))
+        if totals['error_codes']:
+            lines.append("    error codes  {}".format(', '.join(
+                "{} {}".format(name, count) for name, count in _top(totals['error_codes'], top))))
+        prefixes = sorted(totals['prefixes'].items(), key=lambda item: (-item[1][0], item[0]))[:top]
+        for name, (prefix_requests, prefix_errors, prefix_bytes) in prefixes:
+            lines.append("    prefix {:<30} {:>10} requests {:>9.3f}/s {:>7.1%} errors {:>10.2f} GB".format(
+                name or '(bucket root)', prefix_requests, prefix_requests / float(span),
+                prefix_errors / float(prefix_requests), prefix_bytes / 1024.0 ** 3))
+        for key, count in _top(totals['keys'], top):
+            lines.append("    hot key {:>10}  {}".format(count, key))
+        if totals['keys'] and totals.get('dropped_key_requests'):
+            lines.append("    hot key counts are lower bounds: {} requests went to keys dropped from the count".format(
+                totals['dropped_key_requests']))
+    return '\n'.join(lines)
@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import threading
+import time
+import utilities.FileUtils as FileUtils
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.s3-util', 'identity-cache.json')
+
+logger = logging.getLogger(__name__)
+
+
+class AccountContext(object):
+    '''
+    Identity of the account a session runs as. The account ID is resolved through
+    STS at most once per run and, when cache_ttl is set, reused across runs from an
+    on-disk cache keyed by profile. Without a profile boto3's default credential chain
+    (environment, AWS_PROFILE, instance or task role) is used and the cache is keyed by
+    the access key it resolves to.
+
+    :param session: AwsSession the account belongs to
+    :param profile: profile or role ARN the session runs as, None for the default chain
+    '''
+
+    def __init__(self, session, profile=None, cache_ttl=0, cache_file=DEFAULT_CACHE_FILE):
+        self.session = session
+        self.profile = profile
+        self.cache_ttl = cache_ttl
+        self.cache_file = cache_file
+        self._account_id = None
+        self._lock = threading.Lock()
+
+    @property
+    def account_id(self):
+        with self._lock:
+            if self._account_id is None:
+                self._account_id = self._read_cache()
+            if self._account_id is None:
+                self._account_id = self.session.client('sts').get_caller_identity().get('Account')
+                self._write_cache()
+            return self._account_id
+
+    def logging_bucket_name(self, region):
+        return self.account_id + '-bucket-logs-' + region
+
+    def _cache_key(self):
+        if self.profile is not None:
+            return self.profile
+        # The default chain may find other credentials, and another account, on the next run
+        credentials = self.session.session.get_credentials()
+        if credentials is None:
+            return None
+        return 'access-key:' + credentials.access_key
+
+    def _read_cache(self):
+        if not self.cache_ttl:
+            return None
+        key = self._cache_key()
+        if key is None:
+            return None
+        try:
+            with open(self.cache_file, 'r') as cache:
+                entry = json.load(cache).get(key)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry is None or time.time() - entry['Timestamp'] > self.cache_ttl:
+            return None
+        return entry['Account']
+
+    def _write_cache(self):
+        if not self.cache_ttl:
+            return
+        key = self._cache_key()
+        if key is None:
+            return
+        try:
+            with open(self.cache_file, 'r') as cache:
+                entries = json.load(cache)
+        except (IOError, OSError, ValueError):
+            entries = {}
+        entries[key] = {'Account': self._account_id, 'Timestamp': time.time()}
+
+        try:
+            FileUtils.atomic_write(self.cache_file, lambda cache: json.dump(entries, cache))
+        except (IOError, OSError) as e:
+            # The account ID was resolved; only the next run pays for STS again
+            logger.debug("Cannot write identity cache {}: {}".format(self.cache_file, e))
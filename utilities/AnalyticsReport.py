@@ -0,0 +1,205 @@
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Monthly GB retrieved per GB stored below which an age band counts as infrequently accessed.
+# STANDARD_IA saves about $0.01 per GB-month and charges $0.01 per GB retrieved, so bands
+# under half the break even ratio move with room to spare.
+DEFAULT_MAX_RETRIEVAL_RATIO = 0.5
+
+# S3 does not transition objects to STANDARD_IA before they are 30 days old
+MIN_TRANSITION_DAYS = 30
+
+ANALYTICS_EXTENSIONS = ('.csv', '.csv.gz')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _band_start(object_age):
+    # ObjectAge is '000-014', '015-029', ... '730+', or 'ALL'
+    return int(object_age.split('-')[0].rstrip('+'))
+
+
+def new_aggregate():
+    '''
+    Totals of one or more Storage Class Analysis exports, keyed by (bucket, filter prefix).
+    Plain dicts, so workers can hand them back across processes and they merge cheaply.
+    :return dict:
+    '''
+    return {}
+
+
+def add_rows(aggregate, bucket_name, rows):
+    '''
+    Adds the rows of one export (csv.DictReader rows, header included in the file) to the aggregate
+    '''
+    for row in rows:
+        key = (bucket_name, row.get('Filter') or '')
+        group = aggregate.get(key)
+        if group is None:
+            group = aggregate[key] = {'dates': set(), 'bands': {}, 'labels': {}, 'recommended': None}
+        age = row.get('ObjectAge') or ''
+        if age == 'ALL':
+            # S3's own recommendation, kept from the newest export day
+            recommended = row.get('RecommendedObjectAgeForSIATransition')
+            if recommended and (group['recommended'] is None or row['Date'] >= group['recommended'][0]):
+                group['recommended'] = (row['Date'], recommended)
+            continue
+        if row.get('StorageClass') != 'STANDARD' or not age:
+            continue
+        group['dates'].add(row.get('Date'))
+        start = _band_start(age)
+        band = group['bands'].setdefault(start, [0.0, 0.0, 0.0])
+        band[0] += _number(row.get('Storage_MB'))
+        band[1] += _number(row.get('DataRetrieved_MB'))
+        band[2] += _number(row.get('GetRequestCount'))
+        group['labels'][start] = age
+    return aggregate
+
+
+def merge(aggregate, other):
+    for key, group in other.items():
+        mine = aggregate.get(key)
+        if mine is None:
+            aggregate[key] = group
+            continue
+        mine['dates'] |= group['dates']
+        for start, totals in group['bands'].items():
+            band = mine['bands'].setdefault(start, [0.0, 0.0, 0.0])
+            for i in range(3):
+                band[i] += totals[i]
+        mine['labels'].update(group['labels'])
+        if group['recommended'] and (mine['recommended'] is None or group['recommended'][0] >= mine['recommended'][0]):
+            mine['recommended'] = group['recommended']
+    return aggregate
+
+
+def _text_lines(stream):
+    # Exports are read line by line; bytes from S3 or gzip are decoded as they arrive
+    for line in stream:
+        if not isinstance(line, str):
+            line = line.decode('utf-8')
+        yield line
+
+
+def read_stream(stream, bucket_name):
+    '''
+    Aggregates one export read from a file object or an S3 object body
+    :return dict: aggregate
+    '''
+    return add_rows(new_aggregate(), bucket_name, csv.DictReader(_text_lines(stream)))
+
+
+def read_file(path, bucket_name):
+    '''
+    Aggregates one local export file
+    :return dict: aggregate
+    '''
+    if path.endswith('.gz'):
+        import gzip
+        stream = gzip.open(path, 'rb')
+    else:
+        stream = io.open(path, 'rb')
+    with stream:
+        return read_stream(stream, bucket_name)
+
+
+def _read_files(items):
+    aggregate = new_aggregate()
+    for path, bucket_name in items:
+        merge(aggregate, read_file(path, bucket_name))
+    return aggregate
+
+
+def export_files(directory):
+    '''
+    Finds the exports under a directory, as downloaded from the logging bucket's _analytics/
+    prefix. S3 writes each bucket's exports under a folder named after it; files directly in
+    the directory are attributed to the bucket named by the file.
+    :return list: (path, bucket name)
+    '''
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith(ANALYTICS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).split(os.sep)
+            bucket_name = relative[0] if len(relative) > 1 else name.split('.')[0]
+            files.append((path, bucket_name))
+    return files
+
+
+def read_directory(directory, workers):
+    '''
+    Aggregates every export under a directory, spreading the files across a process pool;
+    each file is streamed and only the aggregates come back
+    :return dict: aggregate
+    '''
+    files = export_files(directory)
+    workers = min(workers, multiprocessing.cpu_count(), len(files))
+    if workers <= 1:
+        return _read_files(files)
+    # One batch per worker and file order round robin, so large and small exports mix
+    batches = [files[i::workers] for i in range(workers)]
+    aggregate = new_aggregate()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(_read_files, batches):
+            merge(aggregate, partial)
+    return aggregate
+
+
+def recommend(group, max_ratio=DEFAULT_MAX_RETRIEVAL_RATIO):
+    '''
+    Picks the youngest age band from which every older band is retrieved less than
+    max_ratio times a month
+    :return tuple: (transition days or None, share of STANDARD storage that would move)
+    '''
+    starts = sorted(group['bands'])
+    total = sum(group['bands'][start][0] for start in starts)
+    candidate = None
+    for start in reversed(starts):
+        storage, retrieved = group['bands'][start][0], group['bands'][start][1]
+        if storage and retrieved * 30.0 / storage >= max_ratio:
+            break
+        candidate = start
+    if candidate is None or not total:
+        return None, 0.0
+    moved = sum(group['bands'][start][0] for start in starts if start >= candidate)
+    return max(candidate, MIN_TRANSITION_DAYS), moved / total
+
+
+def format_report(aggregate, max_ratio=DEFAULT_MAX_RETRIEVAL_RATIO):
+    '''
+    :return string: per bucket and prefix, storage and retrieval by object age and the
+                    recommended STANDARD_IA transition
+    '''
+    lines = []
+    for bucket_name, prefix in sorted(aggregate):
+        group = aggregate[(bucket_name, prefix)]
+        days = max(len(group['dates']), 1)
+        total = sum(band[0] for band in group['bands'].values()) / days
+        lines.append("{} (prefix '{}'): {:.1f} GB average in STANDARD over {} days".format(
+            bucket_name, prefix, total / 1024.0, len(group['dates'])))
+        for start in sorted(group['bands']):
+            storage, retrieved, gets = group['bands'][start]
+            ratio = retrieved * 30.0 / storage if storage else 0.0
+            lines.append("    age {:<8} {:>10.1f} GB  retrieved {:>9.1f} GB/month  ratio {:>6.2f}  GETs {:>10.0f}/month".format(
+                group['labels'][start], storage / days / 1024.0, retrieved * 30.0 / days / 1024.0, ratio,
+                gets * 30.0 / days))
+        transition_days, share = recommend(group, max_ratio)
+        aws = group['recommended'][1] if group['recommended'] else None
+        if transition_days is None:
+            advice = "keep in STANDARD, every age band retrieves at least {} times its size a month".format(max_ratio)
+        else:
+            advice = "Transition Days: {} to STANDARD_IA ({:.0%} of storage)".format(transition_days, share)
+        lines.append("    recommend {}{}".format(advice, "; S3 recommends {}".format(aws) if aws else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,248 @@
+import json
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+STATS_FORMATS = ('table', 'json', 'prometheus')
+
+_START_KEY = 's3util_call_start'
+
+
+class OperationStats(object):
+    '''Counters for one service operation, e.g. s3 PutBucketPolicy'''
+
+    def __init__(self, service, operation):
+        self.service = service
+        self.operation = operation
+        self.calls = 0
+        self.retries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.errors = {}
+
+    def record(self, elapsed, retries, error_code):
+        self.calls += 1
+        self.retries += retries
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.histogram[i] += 1
+                break
+        if error_code is not None:
+            self.errors[error_code] = self.errors.get(error_code, 0) + 1
+
+    def quantile(self, q):
+        '''
+        Estimates a latency quantile from the histogram (upper bound of its bucket)
+        :return float:
+        '''
+        target = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.max_time)
+        return self.max_time
+
+    def to_dict(self):
+        return {
+            'service': self.service,
+            'operation': self.operation,
+            'calls': self.calls,
+            'retries': self.retries,
+            'errors': dict(self.errors),
+            'total_seconds': round(self.total_time, 6),
+            'max_seconds': round(self.max_time, 6),
+            'latency_histogram': dict(('le_{}'.format(bound), count)
+                                      for bound, count in zip(LATENCY_BUCKETS, self.histogram)),
+        }
+
+
+class CallStats(object):
+    '''
+    Records every API call made through the clients it is attached to: call count,
+    latency histogram, retries and error codes per operation. Latency covers the whole
+    call as the caller sees it, retries and rate limiting included.
+    '''
+
+    def __init__(self):
+        self.started = time.time()
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def attach(self, events):
+        '''
+        Registers on a botocore client's event system
+        :return:
+        '''
+        events.register('before-call', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context[_START_KEY] = time.time()
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        metadata = parsed.get('ResponseMetadata', {})
+        error_code = parsed.get('Error', {}).get('Code')
+        if error_code is None and http_response.status_code >= 300:
+            error_code = str(http_response.status_code)
+        self._record(context, retries=metadata.get('RetryAttempts', 0), error_code=error_code, model=model)
+
+    def _after_call_error(self, exception, context, model=None, **kwargs):
+        # botocore emits this for connection errors and timeouts with neither model nor response
+        self._record(context, retries=0, error_code=type(exception).__name__, model=model,
+                     event_name=kwargs.get('event_name'))
+
+    def _record(self, context, retries, error_code, model=None, event_name=None):
+        elapsed = time.time() - context.get(_START_KEY, time.time())
+        if model is not None:
+            key = (model.service_model.service_name, model.name)
+        else:
+            # after-call-error.<service>.<Operation>
+            key = tuple((event_name or 'after-call-error.unknown.unknown').split('.')[1:3])
+        with self._lock:
+            if key not in self.operations:
+                self.operations[key] = OperationStats(*key)
+            self.operations[key].record(elapsed, retries, error_code)
+
+    def sorted_operations(self):
+        with self._lock:
+            return [self.operations[key] for key in sorted(self.operations)]
+
+    def to_table(self):
+        '''
+        :return string: one row per operation plus a total
+        '''
+        rows = [('SERVICE', 'OPERATION', 'CALLS', 'RETRIES', 'ERRORS', 'AVG ms', 'P95 ms', 'MAX ms', 'ERROR CODES')]
+        calls = retries = errors = 0
+        for stat in self.sorted_operations():
+            error_count = sum(stat.errors.values())
+            calls += stat.calls
+            retries += stat.retries
+            errors += error_count
+            rows.append((stat.service, stat.operation, str(stat.calls), str(stat.retries), str(error_count),
+                         '{:.1f}'.format(stat.total_time / stat.calls * 1000),
+                         '{:.1f}'.format(stat.quantile(0.95) * 1000),
+                         '{:.1f}'.format(stat.max_time * 1000),
+                         ' '.join('{}={}'.format(code, count) for code, count in sorted(stat.errors.items()))))
+        rows.append(('TOTAL', '', str(calls), str(retries), str(errors), '', '', '',
+                     'wall {:.2f}s'.format(time.time() - self.started)))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+                         for row in rows)
+
+    def to_dict(self):
+        return {'wall_seconds': round(time.time() - self.started, 6),
+                'operations': [stat.to_dict() for stat in self.sorted_operations()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Rebuilds stats from to_dict(), e.g. as handed back by a worker process
+        :return CallStats:
+        '''
+        stats = cls()
+        stats.started = time.time() - data['wall_seconds']
+        for entry in data['operations']:
+            stat = OperationStats(entry['service'], entry['operation'])
+            stat.calls = entry['calls']
+            stat.retries = entry['retries']
+            stat.errors = dict(entry['errors'])
+            stat.total_time = entry['total_seconds']
+            stat.max_time = entry['max_seconds']
+            stat.histogram = [entry['latency_histogram']['le_{}'.format(bound)] for bound in LATENCY_BUCKETS]
+            stats.operations[(stat.service, stat.operation)] = stat
+        return stats
+
+    def merge(self, other):
+        '''Adds the counts of another CallStats to these'''
+        for stat in other.sorted_operations():
+            key = (stat.service, stat.operation)
+            with self._lock:
+                mine = self.operations.get(key)
+                if mine is None:
+                    mine = self.operations[key] = OperationStats(*key)
+                mine.calls += stat.calls
+                mine.retries += stat.retries
+                mine.total_time += stat.total_time
+                mine.max_time = max(mine.max_time, stat.max_time)
+                mine.histogram = [a + b for a, b in zip(mine.histogram, stat.histogram)]
+                for code, count in stat.errors.items():
+                    mine.errors[code] = mine.errors.get(code, 0) + count
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        '''
+        :return string: Prometheus text exposition format
+        '''
+        return _prometheus([('', self)])
+
+    def render(self, format='table'):
+        if format == 'json':
+            return self.to_json()
+        if format == 'prometheus':
+            return self.to_prometheus()
+        return self.to_table()
+
+
+def render_accounts(stats_by_account, format='table'):
+    '''
+    Reports the stats of several accounts: a table per account followed by the total, json
+    keyed by account with the total, or prometheus series labelled with the account
+    :param stats_by_account: account label -> CallStats
+    :return string:
+    '''
+    total = CallStats()
+    for stats in stats_by_account.values():
+        total.merge(stats)
+        total.started = min(total.started, stats.started)
+    if format == 'json':
+        return json.dumps({'accounts': dict((account, stats.to_dict())
+                                            for account, stats in stats_by_account.items()),
+                           'total': total.to_dict()}, indent=2, sort_keys=True)
+    if format == 'prometheus':
+        return _prometheus([('account="{}",'.format(account), stats_by_account[account])
+                            for account in sorted(stats_by_account)])
+    return '\n\n'.join(['Account {}\n{}'.format(account, stats_by_account[account].to_table())
+                        for account in sorted(stats_by_account)] +
+                       ['All accounts\n' + total.to_table()])
+
+
+def _prometheus(labelled):
+    # Each metric family is written once, with the series of every (label prefix, stats) pair
+    series = [(prefix + _labels(stat), stat) for prefix, stats in labelled for stat in stats.sorted_operations()]
+    lines = ['# HELP s3util_api_calls_total API calls made, retries not counted separately',
+             '# TYPE s3util_api_calls_total counter']
+    for labels, stat in series:
+        lines.append('s3util_api_calls_total{{{}}} {}'.format(labels, stat.calls))
+    lines += ['# HELP s3util_api_retries_total Retried attempts',
+              '# TYPE s3util_api_retries_total counter']
+    for labels, stat in series:
+        lines.append('s3util_api_retries_total{{{}}} {}'.format(labels, stat.retries))
+    lines += ['# HELP s3util_api_errors_total Calls that failed, by error code',
+              '# TYPE s3util_api_errors_total counter']
+    for labels, stat in series:
+        for code, count in sorted(stat.errors.items()):
+            lines.append('s3util_api_errors_total{{{},code="{}"}} {}'.format(labels, code, count))
+    lines += ['# HELP s3util_api_call_duration_seconds Call latency including retries',
+              '# TYPE s3util_api_call_duration_seconds histogram']
+    for labels, stat in series:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, stat.histogram):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('s3util_api_call_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+        lines.append('s3util_api_call_duration_seconds_sum{{{}}} {:.6f}'.format(labels, stat.total_time))
+        lines.append('s3util_api_call_duration_seconds_count{{{}}} {}'.format(labels, stat.calls))
+    return '\n'.join(lines)
+
+
+def _labels(stat):
+    return 'service="{}",operation="{}"'.format(stat.service, stat.operation)
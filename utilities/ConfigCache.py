@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import threading
+import utilities.FileUtils as FileUtils
+
+DEFAULT_CONFIG_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.s3-util', 'config-cache.json')
+
+
+def file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ConfigCache(object):
+    '''
+    Parsed and validated config files, so runs over a large config repo only parse the
+    files that changed. An entry is used while the file's mtime and size are unchanged, or,
+    when they differ (e.g. after a git checkout), while its content hash still matches.
+    Configs are kept as json text, which loads far faster than yaml and hands every caller
+    its own copy. Shared by fleet workers; changes are kept in memory until save().
+
+    :param version: entries saved under another version (e.g. an older schema) are discarded
+    '''
+
+    def __init__(self, cache_file=DEFAULT_CONFIG_CACHE_FILE, version=None):
+        self.cache_file = cache_file
+        self.version = version
+        self._lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(cache_file, 'r') as saved:
+                cached = json.load(saved)
+            if cached.get('version') == version:
+                self.entries = cached['entries']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        self._changed = False
+
+    def get(self, path):
+        '''
+        :return tuple: (parameters, errors) as parsed and checked before, or None if the file changed
+        '''
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+            if (stat.st_mtime, stat.st_size) != (entry['mtime'], entry['size']):
+                with open(path, 'rb') as config_file:
+                    if file_digest(config_file.read()) != entry['sha256']:
+                        return None
+                with self._lock:
+                    entry['mtime'], entry['size'] = stat.st_mtime, stat.st_size
+                    self._changed = True
+        except (IOError, OSError):
+            return None
+        return json.loads(entry['config']), entry['errors']
+
+    def put(self, path, stamp, data, parameters, errors):
+        '''
+        Records a parsed config
+        :param stamp: (mtime, size) of the file, taken before data was read from it
+        :param data: the file's content as parsed
+        '''
+        try:
+            config = json.dumps(parameters, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            # Values json cannot hold, such as yaml dates, are parsed every run
+            return
+        with self._lock:
+            self.entries[os.path.abspath(path)] = {'mtime': stamp[0], 'size': stamp[1], 'sha256': file_digest(data),
+                                                   'config': config, 'errors': errors}
+            self._changed = True
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            FileUtils.atomic_write(self.cache_file, lambda cache: json.dump(
+                {'version': self.version, 'entries': self.entries}, cache, separators=(',', ':')))
+            self._changed = False
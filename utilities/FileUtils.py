@@ -1,7 +1,147 @@
+import json
+import os
+import sys
+import tempfile
+import threading
 import yaml
 
+# Keeps documents from concurrent fleet workers from interleaving on stdout
+_stdout_lock = threading.Lock()
 
-def save_file(parameters):
-    filename = parameters['bucket-name'] + '.yml'
-    with open(filename, 'w') as outfile:
-        yaml.safe_dump(parameters, outfile, default_flow_style=False)
\ No newline at end of file
+# libyaml's parser and emitter where PyYAML was built with it, several times faster than the
+# pure Python ones
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+OUTPUT_FORMATS = ('yaml', 'json')
+
+
+def load_yaml(file, logger):
+    '''
+    Loads a yaml file such as a standard configuration
+    :return dict: or None if the file cannot be read
+    '''
+    try:
+        with open(file, 'r') as yaml_file:
+            parameters = yaml.load(yaml_file, Loader=YamlLoader)
+    except:
+        logger.error("Error opening file: {0}".format(file))
+        return None
+
+    return parameters
+
+
+def format_config(parameters, output_format='yaml', explicit_start=True):
+    '''
+    :return string: the config as a yaml document, or as one line of json
+    '''
+    if output_format == 'json':
+        return json.dumps(parameters, sort_keys=True, default=str) + '\n'
+    return yaml.dump(parameters, Dumper=YamlDumper, default_flow_style=False, explicit_start=explicit_start)
+
+
+def atomic_write(path, write, mode=None):
+    '''
+    Writes a file through write(file) to a temporary file next to it that is then renamed
+    into place, so readers, concurrent runs included, see either the previous file or the
+    complete new one. Missing directories are created; the temporary file is removed if
+    writing fails.
+    :param write: function writing the content to the open file it is given
+    :param mode: permissions of the file, e.g. 0o644; by default only the owner can read it
+    '''
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Another worker or run made it first
+            if not os.path.isdir(directory):
+                raise
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            write(tmp)
+        if mode is not None:
+            os.chmod(tmp_name, mode)
+        os.rename(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def save_file(parameters, output_dir=None, output_format='yaml'):
+    '''
+    Writes the config to <output_dir>/<bucket-name>.yml (or .json), the current directory by default,
+    atomically: the file is either the previous config or the complete new one.
+    '''
+    extension = '.json' if output_format == 'json' else '.yml'
+    filename = os.path.join(output_dir or '.', parameters['bucket-name'] + extension)
+    document = format_config(parameters, output_format, explicit_start=False)
+    atomic_write(filename, lambda outfile: outfile.write(document), mode=0o644)
+
+
+def write_json_line(record):
+    '''
+    Writes a record to stdout as one line of json, so reports can be streamed and parsed line by line
+    '''
+    line = json.dumps(record, sort_keys=True, default=str) + '\n'
+    with _stdout_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def write_stdout(parameters, output_format='yaml'):
+    '''
+    Writes the config to stdout as a yaml document or a line of json, without touching the disk
+    '''
+    document = format_config(parameters, output_format)
+    with _stdout_lock:
+        sys.stdout.write(document)
+        sys.stdout.flush()
+
+
+class ConfigOutput(object):
+    '''
+    Where evaluated and retrieved configs are written: one file per bucket in a directory,
+    or a single stream, stdout or a file, each config is added to as soon as it is complete.
+    Streamed as json, every config is one line (newline-delimited json); as yaml, one
+    document. Consumers can then read fleet-wide results as they arrive, in bounded memory.
+    Shared by fleet workers.
+
+    :param output: directory, or - for stdout
+    :param output_file: file to stream every config to instead
+    :param output_format: yaml or json
+    :param append: with output_file, keep what an earlier run wrote, e.g. when resuming it
+    '''
+
+    def __init__(self, output=None, output_file=None, output_format='yaml', append=False):
+        self.output_format = output_format
+        self._file = None
+        self._lock = threading.Lock()
+        if output_file:
+            self.destination = os.path.abspath(output_file)
+            output_dir = os.path.dirname(self.destination)
+            if not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+            self._file = open(output_file, 'a' if append else 'w')
+        elif output == '-':
+            self.destination = '-'
+        else:
+            self.destination = os.path.abspath(output or '.')
+
+    def write(self, parameters):
+        if self._file is not None:
+            document = format_config(parameters, self.output_format)
+            with self._lock:
+                self._file.write(document)
+                self._file.flush()
+        elif self.destination == '-':
+            write_stdout(parameters, self.output_format)
+        else:
+            save_file(parameters, self.destination, self.output_format)
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
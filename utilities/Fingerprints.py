@@ -0,0 +1,66 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import utilities.FileUtils as FileUtils
+
+DEFAULT_FINGERPRINT_FILE = os.path.join(os.path.expanduser('~'), '.s3-util', 'fingerprints.json')
+
+
+def _canonical(document):
+    # Key order and whitespace never change the hash; values yaml loaded as dates and
+    # the like hash by their string form
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def fingerprint(parameters, standardparameters=None, account_id=None):
+    '''
+    Hash of a rendered bucket config together with the standard config it was evaluated
+    against and the account it is applied in
+    :param standardparameters: loaded or compiled standard config, None if none was applied
+    :return string: hex digest
+    '''
+    if standardparameters is not None:
+        # A compiled StandardConfig hashes by the document it was compiled from
+        standardparameters = getattr(standardparameters, 'parameters', standardparameters)
+    digest = hashlib.sha256()
+    for part in (parameters, standardparameters, account_id):
+        digest.update(hashlib.sha256(_canonical(part)).digest())
+    return digest.hexdigest()
+
+
+class FingerprintStore(object):
+    '''
+    Fingerprint of the config last applied successfully to each bucket, so runs can skip
+    buckets whose rendered config has not changed without calling AWS. Shared by fleet
+    workers; changes are kept in memory until save().
+    '''
+
+    def __init__(self, store_file=DEFAULT_FINGERPRINT_FILE):
+        self.store_file = store_file
+        self._lock = threading.Lock()
+        try:
+            with open(store_file, 'r') as saved:
+                self.entries = json.load(saved)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+        self._changed = False
+
+    def matches(self, bucket_name, bucket_fingerprint):
+        with self._lock:
+            entry = self.entries.get(bucket_name)
+        return entry is not None and entry['Fingerprint'] == bucket_fingerprint
+
+    def record(self, bucket_name, bucket_fingerprint):
+        with self._lock:
+            self.entries[bucket_name] = {'Fingerprint': bucket_fingerprint, 'Applied': time.time()}
+            self._changed = True
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            FileUtils.atomic_write(self.store_file,
+                                   lambda store: json.dump(self.entries, store, indent=1, sort_keys=True))
+            self._changed = False
@@ -0,0 +1,92 @@
+import glob
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+CONFIG_EXTENSIONS = ('.yml', '.yaml')
+
+FleetResult = namedtuple('FleetResult', ['name', 'ok', 'error', 'elapsed'])
+
+
+def is_fleet(config):
+    '''
+    True when the config argument names a directory or a glob rather than a single file
+    :return boolean:
+    '''
+    return os.path.isdir(config) or any(c in config for c in '*?[')
+
+
+def expand_config_paths(config):
+    '''
+    Expands a config directory or glob into a sorted list of config files
+    :return list:
+    '''
+    if os.path.isdir(config):
+        paths = [os.path.join(config, name) for name in os.listdir(config)
+                 if name.endswith(CONFIG_EXTENSIONS)]
+    else:
+        paths = [path for path in glob.glob(config) if os.path.isfile(path)]
+    return sorted(paths)
+
+
+def bounded_map(func, items, workers):
+    '''
+    Applies func to every item on a thread pool and yields (item, result, error)
+    as each one finishes. No more than twice the worker count is queued at once,
+    so arbitrarily long iterables are consumed lazily.
+    '''
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def _submit(count):
+            for item in items:
+                pending[executor.submit(func, item)] = item
+                count -= 1
+                if count == 0:
+                    break
+
+        _submit(workers * 2)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+            _submit(len(done))
+
+
+def run_fleet(items, func, workers, logger, name=lambda item: item):
+    '''
+    Runs func over items with bounded concurrency. func returns False or raises
+    to mark an item as failed; every item is reported on its own.
+    :return list of FleetResult:
+    '''
+    def _timed(item):
+        start = time.time()
+        return func(item), time.time() - start
+
+    results = []
+    for item, outcome, error in bounded_map(_timed, items, workers):
+        if error is not None:
+            logger.error("{}: {}".format(name(item), error))
+            results.append(FleetResult(name(item), False, str(error), 0.0))
+        else:
+            ok, elapsed = outcome
+            ok = ok is not False
+            results.append(FleetResult(name(item), ok, None if ok else 'failed, see log above', elapsed))
+    return results
+
+
+def log_summary(results, elapsed, logger):
+    '''
+    Logs a per-run summary followed by each failure
+    :return boolean: True if every item succeeded
+    '''
+    failed = [result for result in results if not result.ok]
+    logger.info("Fleet run complete: {} succeeded, {} failed in {:.1f}s".format(
+        len(results) - len(failed), len(failed), elapsed))
+    for result in failed:
+        logger.error("FAILED {}: {}".format(result.name, result.error))
+    return not failed
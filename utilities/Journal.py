@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Journals kept by default, one per run target
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.s3-util', 'journals')
+
+
+def default_journal_file(run, journal_dir=DEFAULT_JOURNAL_DIR):
+    '''
+    The journal of a run, named by a hash of what it covers, so a run of something else,
+    concurrent or made before the interrupted one is resumed, starts its own journal
+    instead of emptying the interrupted run's
+    :param run: tuple identifying the run, e.g. (action, config path, account)
+    :return string:
+    '''
+    key = json.dumps(list(run)).encode('utf-8')
+    return os.path.join(journal_dir, 'journal-{}.jsonl'.format(hashlib.sha256(key).hexdigest()[:16]))
+
+
+class Journal(object):
+    '''
+    Append-only record of the steps a run has finished for each bucket, one json line per
+    step, flushed as it is written so an interrupted run leaves every finished step behind.
+    A resumed run reads it back and skips those steps. Steps carry the fingerprint of the
+    config they were done for and only count while that still matches.
+
+    :param resume: keep the steps of the previous run; otherwise the journal starts empty
+    '''
+
+    def __init__(self, journal_file, resume=False):
+        self.journal_file = journal_file
+        self._lock = threading.Lock()
+        self._steps = {}
+        if resume:
+            self._load()
+        journal_dir = os.path.dirname(journal_file)
+        if journal_dir and not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        self._file = open(journal_file, 'a' if resume else 'w')
+
+    def _load(self):
+        try:
+            with open(self.journal_file, 'r') as saved:
+                for line in saved:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short when the run was killed
+                        continue
+                    self._steps[(entry['bucket'], entry['step'])] = entry
+        except (IOError, OSError):
+            pass
+
+    def completed(self, bucket_name, step, fingerprint=None):
+        '''
+        :return dict: the journal entry if the step was finished for this fingerprint, else None
+        '''
+        with self._lock:
+            entry = self._steps.get((bucket_name, step))
+        if entry is None or entry.get('fingerprint') != fingerprint:
+            return None
+        return entry
+
+    def record(self, bucket_name, step, fingerprint=None, **details):
+        entry = dict(details, bucket=bucket_name, step=step, fingerprint=fingerprint, time=time.time())
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self._lock:
+            self._steps[(bucket_name, step)] = entry
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
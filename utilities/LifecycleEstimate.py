@@ -0,0 +1,386 @@
+import bisect
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from urllib.parse import unquote_plus
+except ImportError:
+    from urllib import unquote_plus
+
+# Objects handed to the estimator at a time; memory stays bounded by this, not by the bucket size
+CHUNK_SIZE = 100000
+
+STORAGE_CLASSES = ('STANDARD', 'REDUCED_REDUNDANCY', 'STANDARD_IA', 'ONEZONE_IA', 'INTELLIGENT_TIERING',
+                   'GLACIER_IR', 'GLACIER', 'DEEP_ARCHIVE', 'OTHER')
+_CLASS_CODES = dict((storage_class, code) for code, storage_class in enumerate(STORAGE_CLASSES))
+_OTHER = _CLASS_CODES['OTHER']
+# Lifecycle transitions only move objects down this waterfall, never back up
+_CLASS_TIERS = {'STANDARD': 0, 'REDUCED_REDUNDANCY': 0, 'STANDARD_IA': 1, 'INTELLIGENT_TIERING': 1,
+                'ONEZONE_IA': 2, 'GLACIER_IR': 3, 'GLACIER': 4, 'DEEP_ARCHIVE': 5, 'OTHER': 6}
+
+# Days until expiry: <= 0 (now), <= 30, <= 90, <= 365, later; objects of rules without Expiration never expire
+EXPIRY_BINS = (0, 30, 90, 365)
+EXPIRY_LABELS = ('now', 'within 30 days', 'within 90 days', 'within 365 days', 'later', 'never')
+
+# Columns of an S3 Inventory CSV when no manifest.json is given
+DEFAULT_INVENTORY_SCHEMA = 'Bucket, Key, Size, LastModifiedDate, StorageClass'
+
+# Stands in for "never reached" when a rule action is set by Date rather than Days
+_NEVER = 10 ** 7
+
+
+def storage_class_code(storage_class):
+    return _CLASS_CODES.get(storage_class or 'STANDARD', _OTHER)
+
+
+# Listings share few distinct dates, so each day is parsed once
+_date_ordinals = {}
+
+
+def _date_ordinal(value):
+    day = value[:10]
+    ordinal = _date_ordinals.get(day)
+    if ordinal is None:
+        ordinal = datetime.date(int(day[0:4]), int(day[5:7]), int(day[8:10])).toordinal()
+        _date_ordinals[day] = ordinal
+    return ordinal
+
+
+class RuleEstimate(object):
+    '''
+    Totals for one lifecycle rule: objects and bytes by the state the rule leaves them in
+    (unchanged, each transition's storage class, expired) and their current storage class,
+    plus how soon they expire.
+    '''
+
+    def __init__(self, rule, today):
+        self.rule = rule
+        self.id = rule.get('ID', '')
+        self.enabled = rule.get('Status') == 'Enabled'
+        rule_filter = rule.get('Filter', {})
+        conditions = dict(rule_filter.get('And', {}), **dict((k, v) for k, v in rule_filter.items() if k != 'And'))
+        self.prefix = rule.get('Prefix', conditions.get('Prefix', '')) or ''
+        self.min_size = conditions.get('ObjectSizeGreaterThan')
+        self.max_size = conditions.get('ObjectSizeLessThan')
+        # Objects carry no tags in listings or inventories; tag filters are reported, not applied
+        self.ignored_tags = 'Tag' in conditions or 'Tags' in conditions
+
+        transitions = []
+        for transition in rule.get('Transitions', []):
+            transitions.append((self._threshold(transition, today), transition['StorageClass']))
+        transitions.sort()
+        self.transition_days = [days for days, storage_class in transitions]
+        self.states = ['unchanged'] + [storage_class for days, storage_class in transitions] + ['EXPIRED']
+
+        expiration = rule.get('Expiration', {})
+        self.expiration_days = None
+        self.expire_on = None
+        if 'Days' in expiration:
+            self.expiration_days = expiration['Days']
+        elif 'Date' in expiration:
+            self.expire_on = _date_ordinal(str(expiration['Date']))
+            self.expiration_days = 0 if today >= self.expire_on else _NEVER
+
+        shape = (len(self.states), len(STORAGE_CLASSES))
+        self.objects = [[0] * shape[1] for _ in range(shape[0])]
+        self.bytes = [[0] * shape[1] for _ in range(shape[0])]
+        self.expiry_objects = [0] * len(EXPIRY_LABELS)
+        self.expiry_bytes = [0] * len(EXPIRY_LABELS)
+
+    @staticmethod
+    def _threshold(action, today):
+        if 'Days' in action:
+            return action['Days']
+        return 0 if today >= _date_ordinal(str(action['Date'])) else _NEVER
+
+    def _state(self, age):
+        if self.expiration_days is not None and age >= self.expiration_days:
+            return len(self.states) - 1
+        return bisect.bisect_right(self.transition_days, age)
+
+    def _expiry_bin(self, age, today):
+        if self.expiration_days is None:
+            return len(EXPIRY_LABELS) - 1
+        left = self.expire_on - today if self.expire_on is not None else self.expiration_days - age
+        return bisect.bisect_left(EXPIRY_BINS, left)
+
+    def matches(self, key, size):
+        return (key.startswith(self.prefix) and (self.min_size is None or size > self.min_size) and
+                (self.max_size is None or size < self.max_size))
+
+    def add(self, size, age, storage_class, today):
+        state = self._state(age)
+        self.objects[state][storage_class] += 1
+        self.bytes[state][storage_class] += size
+        expiry = self._expiry_bin(age, today)
+        self.expiry_objects[expiry] += 1
+        self.expiry_bytes[expiry] += size
+
+    def add_arrays(self, keys, sizes, ages, classes, today):
+        '''numpy version of add for a whole chunk'''
+        mask = None
+        if self.prefix:
+            # numpy 2 moved the string functions to numpy.strings
+            mask = getattr(numpy, 'strings', numpy.char).startswith(keys, self.prefix)
+        if self.min_size is not None:
+            mask = (sizes > self.min_size) if mask is None else mask & (sizes > self.min_size)
+        if self.max_size is not None:
+            mask = (sizes < self.max_size) if mask is None else mask & (sizes < self.max_size)
+        if mask is not None:
+            sizes, ages, classes = sizes[mask], ages[mask], classes[mask]
+        if not len(sizes):
+            return
+
+        states = numpy.searchsorted(numpy.array(self.transition_days, dtype=numpy.int64), ages, side='right')
+        if self.expiration_days is not None:
+            states = numpy.where(ages >= self.expiration_days, len(self.states) - 1, states)
+        cells = len(self.states) * len(STORAGE_CLASSES)
+        index = states * len(STORAGE_CLASSES) + classes
+        objects = numpy.bincount(index, minlength=cells)
+        total_bytes = numpy.bincount(index, weights=sizes, minlength=cells)
+        for cell in numpy.nonzero(objects)[0]:
+            state, storage_class = divmod(int(cell), len(STORAGE_CLASSES))
+            self.objects[state][storage_class] += int(objects[cell])
+            self.bytes[state][storage_class] += int(round(total_bytes[cell]))
+
+        if self.expiration_days is None:
+            expiry = numpy.full(len(ages), len(EXPIRY_LABELS) - 1)
+        elif self.expire_on is not None:
+            expiry = numpy.full(len(ages), bisect.bisect_left(EXPIRY_BINS, self.expire_on - today))
+        else:
+            expiry = numpy.searchsorted(numpy.array(EXPIRY_BINS), self.expiration_days - ages, side='left')
+        objects = numpy.bincount(expiry, minlength=len(EXPIRY_LABELS))
+        total_bytes = numpy.bincount(expiry, weights=sizes, minlength=len(EXPIRY_LABELS))
+        for i in range(len(EXPIRY_LABELS)):
+            self.expiry_objects[i] += int(objects[i])
+            self.expiry_bytes[i] += int(round(total_bytes[i]))
+
+    def to_dict(self):
+        states = {}
+        for state, name in enumerate(self.states):
+            by_class = dict((STORAGE_CLASSES[code], {'objects': self.objects[state][code],
+                                                     'bytes': self.bytes[state][code]})
+                            for code in range(len(STORAGE_CLASSES)) if self.objects[state][code])
+            if by_class:
+                states[name] = by_class
+        return {'id': self.id, 'prefix': self.prefix, 'enabled': self.enabled, 'states': states,
+                'expiry': dict((label, {'objects': self.expiry_objects[i], 'bytes': self.expiry_bytes[i]})
+                               for i, label in enumerate(EXPIRY_LABELS) if self.expiry_objects[i])}
+
+
+class LifecycleEstimate(object):
+    '''
+    Estimates what a lifecycle configuration does to a bucket's objects today. Objects are
+    fed in chunks, so memory use does not grow with the number of objects; with numpy each
+    chunk is counted with array operations, otherwise object by object.
+
+    :param lifecycle: LifecycleConfiguration ({'Rules': [...]}), as in life-cycle-rules
+    :param today: date the estimate is made for (default today, UTC)
+    '''
+
+    def __init__(self, lifecycle, today=None):
+        self.today = (today or datetime.datetime.utcnow().date()).toordinal()
+        self.rules = [RuleEstimate(rule, self.today) for rule in lifecycle.get('Rules', [])]
+        self.objects = 0
+        self.bytes = 0
+
+    def add_chunk(self, keys, sizes, modified, classes):
+        '''
+        :param keys: object keys
+        :param sizes: sizes in bytes
+        :param modified: last modified dates as date ordinals
+        :param classes: storage class codes (storage_class_code)
+        '''
+        rules = [rule for rule in self.rules if rule.enabled]
+        if numpy is not None:
+            sizes = numpy.asarray(sizes, dtype=numpy.int64)
+            ages = self.today - numpy.asarray(modified, dtype=numpy.int64)
+            classes = numpy.asarray(classes, dtype=numpy.int64)
+            self.objects += len(sizes)
+            self.bytes += int(sizes.sum())
+            if any(rule.prefix for rule in rules):
+                keys = numpy.asarray(keys)
+            for rule in rules:
+                rule.add_arrays(keys, sizes, ages, classes, self.today)
+            return
+
+        for key, size, day, storage_class in zip(keys, sizes, modified, classes):
+            self.objects += 1
+            self.bytes += size
+            age = self.today - day
+            for rule in rules:
+                if rule.matches(key, size):
+                    rule.add(size, age, storage_class, self.today)
+
+    def consume(self, chunks):
+        for chunk in chunks:
+            self.add_chunk(*chunk)
+        return self
+
+    def to_dict(self):
+        return {'objects': self.objects, 'bytes': self.bytes, 'rules': [rule.to_dict() for rule in self.rules]}
+
+    def format_report(self):
+        '''
+        :return string: per rule, where matching objects end up and how soon they expire
+        '''
+        lines = ["Scanned {:,} objects, {}".format(self.objects, human_bytes(self.bytes))]
+        for rule in self.rules:
+            if not rule.enabled:
+                lines.append("Rule {} (prefix '{}'): disabled, not estimated".format(rule.id, rule.prefix))
+                continue
+            matched_objects = sum(sum(row) for row in rule.objects)
+            matched_bytes = sum(sum(row) for row in rule.bytes)
+            lines.append("Rule {} (prefix '{}'): {:,} objects, {}".format(
+                rule.id, rule.prefix, matched_objects, human_bytes(matched_bytes)))
+            if rule.ignored_tags:
+                lines.append("    tag filter not applied; counts include objects without the tags")
+            for state, name in enumerate(rule.states):
+                objects = sum(rule.objects[state])
+                if not objects:
+                    continue
+                size = sum(rule.bytes[state])
+                if name == 'unchanged':
+                    action = 'stay as they are'
+                elif name == 'EXPIRED':
+                    action = 'expire now'
+                else:
+                    # Objects already in the target class, or a colder one, are not moved
+                    moved = sum(rule.bytes[state][code] for code in range(len(STORAGE_CLASSES))
+                                if _CLASS_TIERS[STORAGE_CLASSES[code]] < _CLASS_TIERS.get(name, 0))
+                    action = 'in {} ({} moved)'.format(name, human_bytes(moved))
+                current = ', '.join('{} {}'.format(STORAGE_CLASSES[code], human_bytes(rule.bytes[state][code]))
+                                    for code in range(len(STORAGE_CLASSES)) if rule.objects[state][code])
+                lines.append("    {:>14,} objects {:>10} {} [now {}]".format(objects, human_bytes(size), action,
+                                                                          current))
+            expiry = ', '.join('{} {:,} ({})'.format(label, rule.expiry_objects[i], human_bytes(rule.expiry_bytes[i]))
+                               for i, label in enumerate(EXPIRY_LABELS) if rule.expiry_objects[i])
+            lines.append("    expiry: {}".format(expiry))
+        return '\n'.join(lines)
+
+
+def human_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if abs(size) < 1024.0:
+            return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(size)
+        size /= 1024.0
+    return '{:.1f} PiB'.format(size)
+
+
+# Sources; each yields (keys, sizes, modified ordinals, class codes) chunks
+
+def listing_chunks(pages, chunk_size=CHUNK_SIZE):
+    '''
+    Chunks from list_objects_v2 pages, read as they arrive
+    '''
+    keys, sizes, modified, classes = [], [], [], []
+    for page in pages:
+        for entry in page.get('Contents', []):
+            keys.append(entry['Key'])
+            sizes.append(entry['Size'])
+            modified.append(entry['LastModified'].date().toordinal())
+            classes.append(storage_class_code(entry.get('StorageClass')))
+        if len(keys) >= chunk_size:
+            yield keys, sizes, modified, classes
+            keys, sizes, modified, classes = [], [], [], []
+    if keys:
+        yield keys, sizes, modified, classes
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        if sys.version_info[0] >= 3:
+            return io.TextIOWrapper(gzip.open(path, 'rb'), newline='')
+        return gzip.open(path, 'rb')
+    if sys.version_info[0] >= 3:
+        return open(path, 'r', newline='')
+    return open(path, 'rb')
+
+
+def csv_chunks(path, schema=DEFAULT_INVENTORY_SCHEMA, chunk_size=CHUNK_SIZE):
+    '''
+    Chunks from an S3 Inventory CSV (optionally gzipped); columns follow the inventory's fileSchema
+    '''
+    columns = [column.strip() for column in schema.split(',')]
+    key_at, size_at = columns.index('Key'), columns.index('Size')
+    modified_at = columns.index('LastModifiedDate')
+    class_at = columns.index('StorageClass') if 'StorageClass' in columns else None
+
+    keys, sizes, modified, classes = [], [], [], []
+    with _open_text(path) as inventory:
+        for row in csv.reader(inventory):
+            # Delete markers and rows of objects without a size carry no bytes
+            if not row[size_at]:
+                continue
+            keys.append(unquote_plus(row[key_at]))
+            sizes.append(int(row[size_at]))
+            modified.append(_date_ordinal(row[modified_at]))
+            classes.append(storage_class_code(row[class_at] if class_at is not None else None))
+            if len(keys) >= chunk_size:
+                yield keys, sizes, modified, classes
+                keys, sizes, modified, classes = [], [], [], []
+    if keys:
+        yield keys, sizes, modified, classes
+
+
+def parquet_chunks(path, chunk_size=CHUNK_SIZE):
+    '''
+    Chunks from an S3 Inventory Parquet file, read a record batch at a time (requires pyarrow
+    and numpy)
+    '''
+    try:
+        if numpy is None:
+            raise ImportError("No module named numpy")
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ValueError("Reading Parquet inventories requires pyarrow and numpy ({}): {}".format(e, path))
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    columns = ['key', 'size', 'last_modified_date'] + (['storage_class'] if 'storage_class' in names else [])
+    epoch = datetime.date(1970, 1, 1).toordinal()
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        # Columns go straight to numpy arrays without building a python object per row;
+        # rows without a size (delete markers) carry no bytes
+        batch = batch.filter(pyarrow.compute.is_valid(batch.column(1)))
+        keys = batch.column(0).to_numpy(zero_copy_only=False).astype(str)
+        sizes = batch.column(1).to_numpy(zero_copy_only=False)
+        modified = batch.column(2).cast(pyarrow.date32()).to_numpy(zero_copy_only=False).astype('int64') + epoch
+        if 'storage_class' in columns:
+            encoded = batch.column(3).fill_null('STANDARD').dictionary_encode()
+            lookup = numpy.array([storage_class_code(value) for value in encoded.dictionary.to_pylist()] or [0])
+            classes = lookup[encoded.indices.to_numpy(zero_copy_only=False)]
+        else:
+            classes = numpy.zeros(len(sizes), dtype='int64')
+        yield keys, sizes, modified, classes
+
+
+def inventory_chunks(path, schema=DEFAULT_INVENTORY_SCHEMA, chunk_size=CHUNK_SIZE):
+    '''
+    Chunks from an S3 Inventory data file (.csv, .csv.gz, .parquet) or every data file listed in
+    a manifest.json, looked up by name next to the manifest
+    '''
+    if path.endswith('.json'):
+        with open(path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        schema = manifest.get('fileSchema', schema)
+        for data_file in manifest.get('files', []):
+            data_path = os.path.join(os.path.dirname(path), os.path.basename(data_file['key']))
+            for chunk in inventory_chunks(data_path, schema, chunk_size):
+                yield chunk
+    elif path.endswith('.parquet'):
+        for chunk in parquet_chunks(path, chunk_size):
+            yield chunk
+    else:
+        for chunk in csv_chunks(path, schema, chunk_size):
+            yield chunk
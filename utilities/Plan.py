@@ -0,0 +1,120 @@
+import difflib
+import json
+import yaml
+from collections import namedtuple
+
+# Config sections applied by update, in the order they are applied
+SECTIONS = [
+    'bucket-security-policy',
+    'life-cycle-rules',
+    'logging-rules',
+    'bucket-tags',
+    'bucket-analytics',
+    'bucket-metrics',
+]
+
+Change = namedtuple('Change', ['section', 'live', 'desired'])
+
+
+def _load(value):
+    # Sections may be given as a json string or as yaml
+    try:
+        return json.loads(value)
+    except TypeError:
+        return value
+
+
+def _stringify(value):
+    # S3 returns policy condition values as strings ("false", "true")
+    if isinstance(value, dict):
+        return dict((k, _stringify(v)) for k, v in value.items())
+    if isinstance(value, list):
+        values = [_stringify(v) for v in value]
+        return values[0] if len(values) == 1 else sorted(values, key=json.dumps)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+def _normalize_policy(policy):
+    policy = _stringify(policy)
+    statements = policy.get('Statement', [])
+    if isinstance(statements, dict):
+        statements = [statements]
+    policy['Statement'] = sorted(statements, key=lambda s: (s.get('Sid', ''), json.dumps(s, sort_keys=True)))
+    return policy
+
+
+def _normalize_lifecycle(lifecycle):
+    rules = []
+    for rule in lifecycle.get('Rules', []):
+        rule = dict(rule)
+        if 'Transitions' in rule:
+            rule['Transitions'] = sorted(rule['Transitions'], key=lambda t: t.get('Days', 0))
+        rules.append(rule)
+    return {'Rules': sorted(rules, key=lambda r: r.get('ID', ''))}
+
+
+def _normalize_tags(tags):
+    # Empty tags are never applied, so they cannot show up as a difference
+    return sorted((tag['Key'], tag['Value']) for tag in tags.get('TagSet', []) if tag['Value'])
+
+
+NORMALIZERS = {
+    'bucket-security-policy': _normalize_policy,
+    'life-cycle-rules': _normalize_lifecycle,
+    'bucket-tags': _normalize_tags,
+}
+
+
+def normalize(section, value):
+    '''
+    Puts a config section into a canonical form so that a desired config and the
+    state retrieved from S3 compare equal when they would apply the same settings
+    :return:
+    '''
+    if value is None:
+        return None
+    value = _load(value)
+    return NORMALIZERS.get(section, lambda v: v)(value)
+
+
+def diff(desired, live):
+    '''
+    Compares an evaluated config against the live state of the bucket. Only sections
+    present in the desired config are considered; update never removes a section.
+    :return list of Change:
+    '''
+    changes = []
+    for section in SECTIONS:
+        if section not in desired:
+            continue
+        if normalize(section, desired[section]) != normalize(section, live.get(section)):
+            changes.append(Change(section, live.get(section), _load(desired[section])))
+    return changes
+
+
+def _dump(value):
+    if value is None:
+        return []
+    return yaml.safe_dump(value, default_flow_style=False).splitlines()
+
+
+def format_plan(parameters, changes):
+    '''
+    Renders the changes for a bucket as a reviewable unified diff per section
+    :return string:
+    '''
+    if not changes:
+        return "{} ({}): no changes".format(parameters['bucket-name'], parameters['region'])
+
+    lines = ["{} ({}): {} section(s) to change".format(parameters['bucket-name'], parameters['region'],
+                                                      len(changes))]
+    for change in changes:
+        lines.append("~ {}".format(change.section))
+        for line in difflib.unified_diff(_dump(change.live), _dump(change.desired),
+                                         'live', 'desired', lineterm=''):
+            lines.append("    " + line)
+    return '\n'.join(lines)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+# Error codes S3 and STS answer with when a caller exceeds the sustainable request rate
+THROTTLE_CODES = frozenset(['SlowDown', 'Throttling', 'ThrottlingException', 'ThrottledException',
+                            'RequestLimitExceeded', 'TooManyRequestsException', 'RequestThrottled',
+                            'RequestThrottledException', 'ProvisionedThroughputExceededException'])
+
+
+class AdaptiveRateLimiter(object):
+    '''
+    Token bucket shared by every client of a run. Each HTTP attempt takes a token; when
+    the service throttles, the rate is cut by backoff_factor and then climbs back towards
+    max_rate by increase per successful call, so concurrent workers settle just under the
+    rate the API sustains instead of retrying into more throttling.
+
+    :param max_rate: requests per second the limiter never exceeds
+    :param burst: tokens that may accumulate while idle (defaults to one second's worth)
+    :param min_rate: floor the rate is never cut below
+    '''
+
+    def __init__(self, max_rate, burst=None, min_rate=1.0, backoff_factor=0.5, increase=None):
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = float(burst or max(1.0, self.max_rate))
+        self.backoff_factor = backoff_factor
+        # Regain the full rate after roughly max_rate successful calls
+        self.increase = increase if increase is not None else max(self.max_rate / 100.0, 0.1)
+        self.rate = self.max_rate
+        self.throttled = 0
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Blocks until a token is available
+        :return float: seconds spent waiting
+        '''
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            # Drop saved-up burst so the reduced rate applies at once
+            self._tokens = min(self._tokens, 0.0)
+
+    def attach(self, events):
+        '''
+        Registers the limiter on a botocore client's event system: every attempt, retries
+        included, waits for a token, and each response adjusts the rate
+        :return:
+        '''
+        events.register('before-send', self._before_send)
+        events.register('needs-retry', self._needs_retry)
+
+    def _before_send(self, **kwargs):
+        self.acquire()
+
+    def _needs_retry(self, response=None, caught_exception=None, **kwargs):
+        if response is None:
+            return
+        http_response, parsed = response
+        code = parsed.get('Error', {}).get('Code')
+        if code in THROTTLE_CODES or http_response.status_code in (429, 503):
+            self.on_throttle()
+        else:
+            self.on_success()
@@ -0,0 +1,193 @@
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_SNAPSHOT_FILE = os.path.join(os.path.expanduser('~'), '.s3-util', 'snapshot.db')
+
+# Config sections retrieve-config fetches for each bucket, kept in the snapshot
+SECTIONS = ('life-cycle-rules', 'bucket-security-policy', 'logging-rules', 'bucket-tags', 'bucket-analytics',
+            'bucket-metrics')
+
+# Stored buckets are committed in batches of this many, so an interrupted refresh keeps its progress
+COMMIT_EVERY = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    region TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_region ON buckets (region);
+CREATE TABLE IF NOT EXISTS sections (
+    bucket TEXT NOT NULL,
+    section TEXT NOT NULL,
+    document TEXT,
+    fetched REAL NOT NULL,
+    PRIMARY KEY (bucket, section)
+);
+CREATE TABLE IF NOT EXISTS tags (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (bucket, key)
+);
+CREATE INDEX IF NOT EXISTS tags_key ON tags (key, value);
+CREATE TABLE IF NOT EXISTS policy_sids (
+    bucket TEXT NOT NULL,
+    sid TEXT NOT NULL,
+    PRIMARY KEY (bucket, sid)
+);
+CREATE INDEX IF NOT EXISTS policy_sids_sid ON policy_sids (sid);
+'''
+
+
+class Snapshot(object):
+    '''
+    Local SQLite copy of the fetched configuration of every bucket in an account, so
+    questions about the fleet are answered offline. Every section (lifecycle, policy, ...)
+    is kept as json with the time it was fetched, or NULL when the bucket has none; tag
+    keys and policy Sids are indexed. Used from a single thread; fleet workers hand their
+    results back to it.
+
+    Tables: buckets(name, region), sections(bucket, section, document, fetched),
+    tags(bucket, key, value), policy_sids(bucket, sid)
+    '''
+
+    def __init__(self, snapshot_file=DEFAULT_SNAPSHOT_FILE):
+        self.snapshot_file = snapshot_file
+        snapshot_dir = os.path.dirname(snapshot_file)
+        if snapshot_dir and not os.path.isdir(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        self.db = sqlite3.connect(snapshot_file)
+        self.db.executescript(SCHEMA)
+        self._pending = 0
+
+    def regions(self):
+        '''
+        :return dict: bucket name -> region, for every bucket in the snapshot
+        '''
+        return dict(self.db.execute('SELECT name, region FROM buckets'))
+
+    def stale_sections(self, bucket_names, max_age=0, now=None):
+        '''
+        :param max_age: seconds a fetched section stays fresh; 0 for every section
+        :return dict: bucket name -> sections fetched longer than max_age ago or never, for
+                      every bucket with any
+        '''
+        cutoff = (now or time.time()) - max_age
+        fresh = {}
+        if max_age:
+            for bucket_name, section in self.db.execute('SELECT bucket, section FROM sections WHERE fetched > ?',
+                                                        (cutoff,)):
+                fresh.setdefault(bucket_name, set()).add(section)
+        stale = {}
+        for bucket_name in bucket_names:
+            sections = [section for section in SECTIONS if section not in fresh.get(bucket_name, ())]
+            if sections:
+                stale[bucket_name] = sections
+        return stale
+
+    def remove_missing(self, bucket_names):
+        '''
+        Drops buckets that are no longer in the account
+        :return list: names of the buckets dropped
+        '''
+        existing = set(bucket_names)
+        removed = [name for name, in self.db.execute('SELECT name FROM buckets') if name not in existing]
+        for name in removed:
+            for table, column in (('buckets', 'name'), ('sections', 'bucket'), ('tags', 'bucket'),
+                                  ('policy_sids', 'bucket')):
+                self.db.execute('DELETE FROM {} WHERE {} = ?'.format(table, column), (name,))
+        self.db.commit()
+        return removed
+
+    def store(self, state, sections, fetched):
+        '''
+        Records the sections of a bucket as fetched; sections state does not hold are
+        recorded as not set
+        :param state: bucket configuration as returned by S3Manager.fetch
+        :param sections: the sections that were fetched
+        :param fetched: time they were fetched
+        '''
+        bucket_name = state['bucket-name']
+        self.db.execute('INSERT OR REPLACE INTO buckets (name, region) VALUES (?, ?)', (bucket_name, state['region']))
+        for section in sections:
+            document = state.get(section)
+            self.db.execute('INSERT OR REPLACE INTO sections (bucket, section, document, fetched) VALUES (?, ?, ?, ?)',
+                            (bucket_name, section, None if document is None else json.dumps(document, sort_keys=True),
+                             fetched))
+        if 'bucket-tags' in sections:
+            self.db.execute('DELETE FROM tags WHERE bucket = ?', (bucket_name,))
+            self.db.executemany('INSERT OR REPLACE INTO tags (bucket, key, value) VALUES (?, ?, ?)',
+                                [(bucket_name, tag['Key'], tag['Value'])
+                                 for tag in (state.get('bucket-tags') or {}).get('TagSet', [])])
+        if 'bucket-security-policy' in sections:
+            self.db.execute('DELETE FROM policy_sids WHERE bucket = ?', (bucket_name,))
+            statements = (state.get('bucket-security-policy') or {}).get('Statement', [])
+            self.db.executemany('INSERT OR REPLACE INTO policy_sids (bucket, sid) VALUES (?, ?)',
+                                [(bucket_name, statement['Sid']) for statement in statements if 'Sid' in statement])
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self._pending = 0
+
+    def query(self, has_tags=(), missing_tags=(), has_sids=(), missing_sids=(), missing_sections=(), regions=()):
+        '''
+        Buckets matching every condition
+        :param has_tags: 'key' or 'key=value' strings
+        :param missing_tags: keys
+        :param has_sids: policy statement Sids the bucket policy has
+        :param missing_sids: policy statement Sids it lacks
+        :param missing_sections: sections the bucket has none of, e.g. life-cycle-rules
+        :param regions: regions the bucket is in
+        :return list: sorted bucket names
+        '''
+        clauses = []
+        values = []
+        for condition in has_tags:
+            key, separator, value = condition.partition('=')
+            if separator:
+                clauses.append('name IN (SELECT bucket FROM tags WHERE key = ? AND value = ?)')
+                values.extend([key, value])
+            else:
+                clauses.append('name IN (SELECT bucket FROM tags WHERE key = ?)')
+                values.append(key)
+        for key in missing_tags:
+            clauses.append('name NOT IN (SELECT bucket FROM tags WHERE key = ?)')
+            values.append(key)
+        for sid in has_sids:
+            clauses.append('name IN (SELECT bucket FROM policy_sids WHERE sid = ?)')
+            values.append(sid)
+        for sid in missing_sids:
+            clauses.append('name NOT IN (SELECT bucket FROM policy_sids WHERE sid = ?)')
+            values.append(sid)
+        for section in missing_sections:
+            clauses.append('name NOT IN (SELECT bucket FROM sections WHERE section = ? AND document IS NOT NULL)')
+            values.append(section)
+        if regions:
+            clauses.append('region IN ({})'.format(', '.join('?' * len(regions))))
+            values.extend(regions)
+        statement = 'SELECT name FROM buckets'
+        if clauses:
+            statement += ' WHERE ' + ' AND '.join(clauses)
+        return [name for name, in self.db.execute(statement + ' ORDER BY name', values)]
+
+    def sql(self, statement):
+        '''
+        Runs a read-only SQL statement against the snapshot
+        :return generator: one dict per row, keyed by column
+        '''
+        self.commit()
+        # Statements that would change the snapshot fail instead
+        self.db.execute('PRAGMA query_only = ON')
+        cursor = self.db.execute(statement)
+        columns = [column[0] for column in cursor.description or ()]
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    def close(self):
+        self.commit()
+        self.db.close()
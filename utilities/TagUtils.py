@@ -1,6 +1,122 @@
+import json
+import os
+import utilities.FileUtils as FileUtils
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser('~'), '.s3-util', 'tag-index.json')
+
+
+class TagSet(object):
+    '''
+    Keyed view over an S3 TagSet list ([{'Key': , 'Value': }, ...]). Lookups go through an
+    index instead of scanning the list; changes are made to the wrapped list in place, so
+    the config it came from keeps its plain list and tag order.
+    '''
+
+    def __init__(self, tags=None):
+        self.tags = tags if tags is not None else []
+        self._index = dict((tag['Key'], i) for i, tag in enumerate(self.tags))
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        return iter(self.tags)
+
+    def get(self, key, default=None):
+        if key not in self._index:
+            return default
+        return self.tags[self._index[key]]['Value']
+
+    def set(self, key, value):
+        '''Replaces the value of a tag, adding the tag if it is missing'''
+        if key in self._index:
+            self.tags[self._index[key]]['Value'] = value
+        else:
+            self._index[key] = len(self.tags)
+            self.tags.append({'Key': key, 'Value': value})
+
+    def update(self, tags):
+        '''Sets every tag in tags, overriding values already present'''
+        for tag in tags:
+            self.set(tag['Key'], tag['Value'])
+
+    def add_missing(self, tags):
+        '''Adds the tags whose keys are not present yet, keeping existing values'''
+        for tag in tags:
+            if tag['Key'] not in self._index:
+                self._index[tag['Key']] = len(self.tags)
+                self.tags.append(tag)
+
+    def to_dict(self):
+        return dict((tag['Key'], tag['Value']) for tag in self.tags)
+
+
 def is_tag_in_tagset(tag,tagset):
-    for value in tagset:
-        if tag == value['Key']:
-            return True
-    else:
-        return False
\ No newline at end of file
+    return tag in TagSet(tagset)
+
+
+class TagIndex(object):
+    '''
+    Tags of many buckets with an inverted index from tag key to the buckets carrying it,
+    so "which buckets have / lack tag X" is answered without touching AWS.
+    Buckets without tags are included so they show up as lacking every tag.
+    '''
+
+    def __init__(self):
+        self.buckets = {}
+        self._by_key = {}
+
+    def add(self, bucket_name, tags):
+        '''
+        :param tags: dict of key -> value, or an S3 TagSet list
+        '''
+        if isinstance(tags, list):
+            tags = TagSet(tags).to_dict()
+        self.buckets[bucket_name] = tags
+        for key in tags:
+            self._by_key.setdefault(key, set()).add(bucket_name)
+
+    def has_tag(self, key, value=None):
+        '''
+        :return list: sorted names of buckets with the tag (and value, if given)
+        '''
+        names = self._by_key.get(key, ())
+        if value is not None:
+            names = [name for name in names if self.buckets[name][key] == value]
+        return sorted(names)
+
+    def missing_tag(self, key):
+        '''
+        :return list: sorted names of buckets without the tag
+        '''
+        carrying = self._by_key.get(key, set())
+        return sorted(name for name in self.buckets if name not in carrying)
+
+    def query(self, has_tags=(), missing_tags=()):
+        '''
+        Buckets matching every condition
+        :param has_tags: 'key' or 'key=value' strings
+        :param missing_tags: keys
+        :return list: sorted bucket names
+        '''
+        names = set(self.buckets)
+        for condition in has_tags:
+            key, separator, value = condition.partition('=')
+            names &= set(self.has_tag(key, value if separator else None))
+        for key in missing_tags:
+            names &= set(self.missing_tag(key))
+        return sorted(names)
+
+    def save(self, index_file):
+        FileUtils.atomic_write(index_file, lambda index: json.dump(self.buckets, index, indent=1, sort_keys=True))
+
+    @classmethod
+    def load(cls, index_file):
+        index = cls()
+        with open(index_file, 'r') as saved:
+            for bucket_name, tags in json.load(saved).items():
+                index.add(bucket_name, tags)
+        return index
@@ -1,47 +1,326 @@
 
+import hashlib
+import json
+import multiprocessing
+import os
+import utilities.FileUtils as FileUtils
+import utilities.Fleet as Fleet
 import yaml
-from jsonschema import validate
-from jsonschema import ValidationError
+from concurrent.futures import ProcessPoolExecutor
+from jsonschema import Draft4Validator
 
-def open_and_validate_config(file, logger):
-    # Open Config File
+# Every section the tool applies; policy, lifecycle, logging and TagSet may also
+# be given as a json string
+SCHEMA = yaml.safe_load("""
+type: object
+properties:
+  bucket-name:
+    type: string
+    minLength: 3
+    maxLength: 63
+    pattern: '^[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]$'
+  region:
+    type: string
+  bucket-security-policy:
+    anyOf:
+    - $ref: '#/definitions/policy'
+    - type: string
+  life-cycle-rules:
+    anyOf:
+    - $ref: '#/definitions/lifecycle'
+    - type: string
+  logging-rules:
+    anyOf:
+    - $ref: '#/definitions/logging'
+    - type: string
+  bucket-tags:
+    type: object
+    properties:
+      TagSet:
+        anyOf:
+        - type: array
+          items:
+            $ref: '#/definitions/tag'
+        - type: string
+    required:
+    - TagSet
+  bucket-analytics:
+    type: object
+    properties:
+      Id:
+        type: string
+      StorageClassAnalysis:
+        type: object
+    required:
+    - Id
+  bucket-metrics:
+    type: object
+    properties:
+      Id:
+        type: string
+    required:
+    - Id
+required:
+- bucket-name
+- region
+definitions:
+  policy:
+    type: object
+    properties:
+      Version:
+        type: string
+      Statement:
+        type: array
+        items:
+          type: object
+          properties:
+            Sid:
+              type: string
+            Effect:
+              enum: [Allow, Deny]
+          required:
+          - Effect
+    required:
+    - Statement
+  lifecycle:
+    type: object
+    properties:
+      Rules:
+        type: array
+        minItems: 1
+        items:
+          type: object
+          properties:
+            ID:
+              type: string
+              maxLength: 255
+            Prefix:
+              type: string
+            Filter:
+              type: object
+            Status:
+              enum: [Enabled, Disabled]
+            Expiration:
+              type: object
+              properties:
+                Days:
+                  type: integer
+                  minimum: 1
+            Transitions:
+              type: array
+              items:
+                type: object
+                properties:
+                  Days:
+                    type: integer
+                    minimum: 0
+                  StorageClass:
+                    enum: [GLACIER, STANDARD_IA, ONEZONE_IA, INTELLIGENT_TIERING, DEEP_ARCHIVE, GLACIER_IR]
+                required:
+                - StorageClass
+            AbortIncompleteMultipartUpload:
+              type: object
+              properties:
+                DaysAfterInitiation:
+                  type: integer
+                  minimum: 1
+              required:
+              - DaysAfterInitiation
+          required:
+          - Status
+    required:
+    - Rules
+  logging:
+    type: object
+    properties:
+      LoggingEnabled:
+        type: object
+        properties:
+          TargetBucket:
+            type: string
+          TargetPrefix:
+            type: string
+        required:
+        - TargetBucket
+        - TargetPrefix
+  tag:
+    type: object
+    properties:
+      Key:
+        type: string
+        minLength: 1
+        maxLength: 128
+      Value:
+        type: string
+        maxLength: 256
+    required:
+    - Key
+    - Value
+""")
+
+# Compiled once; checking a config no longer re-parses the schema
+VALIDATOR = Draft4Validator(SCHEMA)
+
+# Configs cached as checked against another schema are checked again
+SCHEMA_VERSION = hashlib.sha256(json.dumps(SCHEMA, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Configs handed to each validation worker process at a time
+BATCH_SIZE = 64
+
+
+def read_config(file):
+    '''
+    :return tuple: ((mtime, size) taken before reading, the file's content as bytes)
+    '''
+    with open(file, 'rb') as config_file:
+        stat = os.fstat(config_file.fileno())
+        return (stat.st_mtime, stat.st_size), config_file.read()
+
+
+def parse_config(data):
+    '''
+    Parses the text of a config file and checks it against the schema
+    :return tuple: (parameters, errors); parameters is None if the text is not yaml
+    '''
     try:
-        with open(file, 'r') as config_file:
-            parameters = yaml.load(config_file)
-    except:
+        parameters = yaml.load(data, Loader=FileUtils.YamlLoader)
+    except yaml.YAMLError as e:
+        return None, ["cannot load: {}".format(e)]
+    return parameters, config_errors(parameters)
+
+
+def load_config(file, cache=None):
+    '''
+    Loads and checks a config file, from the ConfigCache when the file is unchanged
+    :return tuple: (parameters, errors); parameters is None if the file cannot be loaded
+    '''
+    if cache is not None:
+        cached = cache.get(file)
+        if cached is not None:
+            return cached
+    try:
+        stamp, data = read_config(file)
+    except (IOError, OSError) as e:
+        return None, ["cannot load: {}".format(e)]
+    parameters, errors = parse_config(data)
+    if cache is not None and parameters is not None:
+        cache.put(file, stamp, data, parameters, errors)
+    return parameters, errors
+
+
+def open_and_validate_config(file, logger, cache=None):
+    # Open Config File
+    parameters, errors = load_config(file, cache)
+    if parameters is None:
         logger.error("Error opening file: {0}".format(file))
         return None
     # Check if Valid Config File
-    if not validate_config(parameters,logger):
+    for error in errors:
+        logger.error("Config file Failed Validation: {}".format(error))
+    if errors:
         return None
 
     return parameters
 
 
+def config_errors(_yml):
+    '''
+    Checks a loaded config against the schema
+    :return list: one message per problem, empty if the config is valid
+    '''
+    errors = []
+    for error in sorted(VALIDATOR.iter_errors(_yml), key=lambda e: list(e.path)):
+        location = '.'.join(str(part) for part in error.path) or '(root)'
+        errors.append("{}: {}".format(location, error.message))
+    return errors
+
+
 def validate_config(_yml, logger):
     '''
     Validates config file for consistancy
     :return boolean:
     '''
-    schema = """
-    type: object
-    properties:
-      bucket-name:
-        type: string
-      region:
-        type: string
-      bucket-security-policy:
-        type: object
-      life-cycle:
-        type: object
-    required:
-      - bucket-name
-      - region
-    """
+    errors = config_errors(_yml)
+    for error in errors:
+        logger.error("Config file Failed Validation: {}".format(error))
+    return not errors
+
+
+def validate_file(file):
+    '''
+    Loads and checks a config file without logging
+    :return list: error messages, empty if the file is valid
+    '''
+    return load_config(file)[1]
+
+
+def _parse_file(file):
     try:
-        validate(_yml, yaml.load(schema))  # passes
-    except ValidationError as e:
-        logger.error("Config file Failed Validation: {}".format(str(e)))
+        stamp, data = read_config(file)
+    except (IOError, OSError) as e:
+        return file, None, None, None, ["cannot load: {}".format(e)]
+    parameters, errors = parse_config(data)
+    return file, stamp, data, parameters, errors
+
+
+def _validate_batch(files):
+    return [_parse_file(file) for file in files]
+
+
+def _parse_files(files, workers):
+    batches = [files[i:i + BATCH_SIZE] for i in range(0, len(files), BATCH_SIZE)]
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            for result in _validate_batch(batch):
+                yield result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_validate_batch, batches):
+            for result in results:
+                yield result
+
+
+def validate_files(files, workers, cache=None):
+    '''
+    Validates many config files across a process pool, in batches so the
+    per-task overhead stays small next to parsing. Files unchanged since the
+    ConfigCache recorded them are not parsed again; the others are recorded.
+    :return generator of (file, errors):
+    '''
+    if cache is not None:
+        misses = []
+        for file in files:
+            cached = cache.get(file)
+            if cached is None:
+                misses.append(file)
+            else:
+                yield file, cached[1]
+        files = misses
+    for file, stamp, data, parameters, errors in _parse_files(files, workers):
+        if cache is not None and parameters is not None:
+            cache.put(file, stamp, data, parameters, errors)
+        yield file, errors
+
+
+def validate_config_paths(config, workers, logger, cache=None):
+    '''
+    Checks every config file in a file, directory or glob against the schema across
+    a process pool and reports all errors found
+    :return boolean: True if every config is valid
+    '''
+    if config == None:
+        logger.error("No Config Specified [--config]")
         return False
+    config_files = Fleet.expand_config_paths(config) if Fleet.is_fleet(config) else [config]
+    workers = min(workers, multiprocessing.cpu_count())
 
-    return True
\ No newline at end of file
+    invalid = 0
+    for config_file, errors in validate_files(config_files, workers, cache):
+        if errors:
+            invalid += 1
+        for error in errors:
+            logger.error("{}: {}".format(config_file, error))
+    logger.info("Validated {} configs: {} valid, {} invalid".format(len(config_files), len(config_files) - invalid,
+                                                                  invalid))
+    return invalid == 0
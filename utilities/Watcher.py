@@ -0,0 +1,165 @@
+import ctypes
+import ctypes.util
+import glob
+import os
+import select
+import sys
+import time
+import utilities.Fleet as Fleet
+
+# inotify events meaning a file in a watched directory was written, added, renamed or removed
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+# With inotify the files are still rescanned this often, in case an event was missed
+INOTIFY_RESCAN_INTERVAL = 60
+
+
+class _Inotify(object):
+    '''
+    Minimal inotify through libc, used only to wake the watcher as soon as a file is written.
+    Raises AttributeError or OSError where the platform has no inotify.
+    '''
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self._watched = set()
+
+    def watch(self, directory):
+        if directory in self._watched:
+            return
+        path = directory if isinstance(directory, bytes) else directory.encode(sys.getfilesystemencoding())
+        if self._add_watch(self.fd, path, _WATCH_MASK) < 0:
+            raise OSError(ctypes.get_errno(), "Cannot watch {}".format(directory))
+        self._watched.add(directory)
+
+    def wait(self, timeout):
+        '''
+        Blocks until a watched directory changes or timeout seconds pass
+        :return boolean: True if woken by a change
+        '''
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        # Which files changed is found by rescanning; the events themselves are discarded
+        os.read(self.fd, 64 * 1024)
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher(object):
+    '''
+    Watches the config files of a directory or glob, and any other files a run depends on
+    such as the standard config, and hands out the files that changed. Changes are found by
+    comparing each file's mtime and size between scans. Where the platform has inotify it
+    wakes the scan as soon as a file is written and the watcher is idle otherwise; elsewhere
+    files are polled every interval seconds.
+
+    A batch is handed out once nothing has changed for debounce seconds, so a git pull
+    touching many files is applied as one. Files changing while a batch is being applied
+    are picked up by the next scan, so at most one batch is ever waiting.
+
+    :param config: config directory or glob, as given to run_fleet
+    :param extra_files: other files to watch
+    :param use_inotify: False to always poll
+    '''
+
+    def __init__(self, config, extra_files=(), interval=2.0, debounce=1.0, logger=None, use_inotify=True):
+        self.config = config
+        self.extra_files = [os.path.abspath(path) for path in extra_files]
+        self.interval = interval
+        self.debounce = debounce
+        self.logger = logger
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (AttributeError, OSError) as e:
+                if logger:
+                    logger.info("inotify unavailable ({}), polling every {}s".format(e, interval))
+        self._snapshot = self.scan()
+
+    def _paths(self):
+        return [os.path.abspath(path) for path in Fleet.expand_config_paths(self.config)] + self.extra_files
+
+    def _directories(self, paths):
+        directories = set(os.path.dirname(path) for path in paths)
+        if os.path.isdir(self.config):
+            directories.add(os.path.abspath(self.config))
+        else:
+            # New files matching the glob may appear next to the pattern
+            pattern_dir = os.path.dirname(os.path.abspath(self.config))
+            if not glob.has_magic(pattern_dir):
+                directories.add(pattern_dir)
+        return [directory for directory in directories if os.path.isdir(directory)]
+
+    def scan(self):
+        '''
+        :return dict: path -> (mtime, size) of every watched file that exists
+        '''
+        paths = self._paths()
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_mtime, stat.st_size)
+        if self._inotify is not None:
+            for directory in self._directories(paths):
+                try:
+                    self._inotify.watch(directory)
+                except OSError as e:
+                    if self.logger:
+                        self.logger.warn("{}".format(e))
+        return snapshot
+
+    def _wait(self, timeout):
+        if self._inotify is not None:
+            self._inotify.wait(timeout)
+        else:
+            time.sleep(timeout)
+
+    def _drain(self):
+        # Events for changes the last scan already saw
+        if self._inotify is not None:
+            while self._inotify.wait(0):
+                pass
+
+    def changes(self):
+        '''
+        Waits for changes and yields each debounced batch, forever
+        :return generator: (changed paths, removed paths), both sorted
+        '''
+        while True:
+            self._wait(INOTIFY_RESCAN_INTERVAL if self._inotify is not None else self.interval)
+            current = self.scan()
+            if current == self._snapshot:
+                continue
+            # Let a burst of writes settle before acting on it
+            while True:
+                time.sleep(self.debounce)
+                settled = self.scan()
+                if settled == current:
+                    break
+                current = settled
+            self._drain()
+            changed = sorted(path for path, stat in current.items() if self._snapshot.get(path) != stat)
+            removed = sorted(path for path in self._snapshot if path not in current)
+            self._snapshot = current
+            yield changed, removed
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()